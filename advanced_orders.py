@@ -3,8 +3,8 @@ Adaptive order reducing timing risk.
 """
 
 
-from datetime import datetime
 from constants import *
+from clock import MONOTONIC_CLOCK
 
 
 class AdaptiveOrder:
@@ -24,6 +24,7 @@ class AdaptiveOrder:
 
     # Max limits of order pending time for different modes in seconds
     TIME_LIMIT = {PATIENT: float('inf'), ACCELERATED: float('inf'), URGENT: float('inf'), PANIC: float('inf')}
+    NO_TIME_LIMIT = float('inf')
 
     def __init__(self,
                  contract,
@@ -37,9 +38,23 @@ class AdaptiveOrder:
                  accelerated_max_retry=3,
                  urgent_max_retry=0,
                  panic_max_retry=0,
-                 max_slippage=10):
-
+                 max_slippage=10,
+                 clock=MONOTONIC_CLOCK):
+        """
+        :param contract: Contract of the order.
+        :param buy_or_sell: BUY or SELL.
+        :param direction: DIRECTION_LONG or DIRECTION_SHORT.
+        :param order_qty: int. Total qty to fill.
+        :param order_price: float. Price of the first try, and reference of the max slippage.
+        :param order_tag: Tag of the submitted orders.
+        :param retry_step: int. Number of ticks the last price moves away from a pending order before it is retried.
+        :param patient_max_retry: int. Number of tries in PATIENT mode, and likewise for the other modes.
+        :param max_slippage: int. Number of ticks from order_price beyond which the order is cancelled.
+        :param clock: Clock of the order, the only time source of its pending times against TIME_LIMIT, e.g. the
+            strategy platform clock so backtests and replays time the order deterministically.
+        """
         self.contract = contract
+        self.clock = clock
         self.buy_or_sell = buy_or_sell
         self.direction = direction
         self.order_price = order_price
@@ -70,6 +85,34 @@ class AdaptiveOrder:
                 self._last_order_price, self._last_order_time, self.filled_qty, self.filled_price, self._price_bound,
                 self.retry_step))
 
+    def snapshot(self):
+        """
+        :return: tuple. Order parameters and states, restored by from_snapshot().
+        """
+        return (self.buy_or_sell, self.direction, self.order_price, self.order_qty, self.order_tag, self.retry_step,
+                self.state, self.filled_qty, self.filled_price, self._long_short, self._price_bound,
+                tuple(tuple(mode) for mode in self._order_mode_stack), self.last_order_id, self._last_order_time,
+                self._last_order_price, self._last_order_mode)
+
+    @classmethod
+    def from_snapshot(cls, contract, snapshot, clock=MONOTONIC_CLOCK):
+        """
+        :param snapshot: tuple returned by snapshot().
+        :param clock: Clock of the order. The pending time of a restored pending order restarts at the restore, as
+            clock times do not carry over processes.
+        :return: AdaptiveOrder in the state of the snapshot.
+        """
+        order = cls.__new__(cls)
+        order.contract = contract
+        order.clock = clock
+        (order.buy_or_sell, order.direction, order.order_price, order.order_qty, order.order_tag, order.retry_step,
+         order.state, order.filled_qty, order.filled_price, order._long_short, order._price_bound, order_mode_stack,
+         order.last_order_id, order._last_order_time, order._last_order_price, order._last_order_mode) = snapshot
+        order._order_mode_stack = [list(mode) for mode in order_mode_stack]
+        if order._last_order_time is not None:
+            order._last_order_time = clock.now_ns()
+        return order
+
     def on_tick(self):
         d = 1 - 2 * self._long_short
         last_price = self.contract.last
@@ -78,8 +121,7 @@ class AdaptiveOrder:
             if not self._order_mode_stack or d * (self.contract.last - self._price_bound) > 0:
                 self.state = self.CANCELLED
                 return ORDER_CANCELLED, None
-            midpoint_price = round(
-                round((self.contract.bid + self.contract.ask) / 2.0 / tick) * tick, self.contract.decimal)
+            midpoint_price = self.contract.round_price((self.contract.bid + self.contract.ask) / 2.0)
             if self._order_mode_stack[-1][0] == self.PATIENT:
                 order_price = (min, max)[self._long_short](last_price, midpoint_price)
                 if self._last_order_price is None and self.order_price is not None:  # first try w/ specified price
@@ -104,10 +146,11 @@ class AdaptiveOrder:
         elif self.state == self.REQ:
             return None, None
         elif self.state == self.PENDING:
-            time_delta = (datetime.utcnow() - self._last_order_time).total_seconds()
-            if (time_delta > self.TIME_LIMIT[self._last_order_mode] or
-                    d * (last_price - self._last_order_price) >= self.retry_step * tick or
-                    d * (last_price - self._price_bound) > 0):
+            time_limit = self.TIME_LIMIT[self._last_order_mode]
+            if (d * (last_price - self._last_order_price) >= self.retry_step * tick or
+                    d * (last_price - self._price_bound) > 0 or
+                    (time_limit != self.NO_TIME_LIMIT and  # the clock is only read for finite limits
+                     self.clock.now_ns() - self._last_order_time > time_limit * 1e9)):
                 return ORDER_OPEN, {'action': 'CANCEL', 'order_id': self.last_order_id}
             else:
                 return None, None
@@ -116,7 +159,7 @@ class AdaptiveOrder:
 
     def on_buysell_success(self, order_id, order_price):
         self.last_order_id = int(order_id)
-        self._last_order_time = datetime.utcnow()
+        self._last_order_time = self.clock.now_ns()
         self._last_order_price = order_price
         self._last_order_mode = self._order_mode_stack[-1][0]
         self.state = self.PENDING
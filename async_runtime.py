@@ -0,0 +1,163 @@
+"""
+Asyncio runtime of strategies: all events of all strategies are dispatched by callbacks on one event loop.
+"""
+
+
+import asyncio
+from threading import get_ident
+from time import perf_counter_ns
+from constants import *
+from events import EVENT_MARKETDATA
+from events import EventEngine
+from strategy import InvalidMarginFee
+from multi_strategy import MultiStrategyHost
+from utils import if_market_open
+
+
+class AsyncEventEngine(EventEngine):
+    """
+    Event engine dispatching on an asyncio event loop instead of a dedicated thread.
+    Events put in the loop thread are queued and dispatched in batches by a callback scheduled on the loop, yielding to
+    the loop between batches. Events put from other threads are handed over to the loop thread. The queue is unbounded.
+    """
+
+    def __init__(self, batch_size=512, logger=None, conflate=False):
+        super().__init__(batch_size=batch_size, logger=logger, conflate=conflate)
+        self._loop = None
+        self._loop_thread_id = None
+        self._scheduled = False
+
+    def start(self, loop=None):
+        """
+        Start dispatching on the loop. Called in the loop thread.
+        :param loop: asyncio event loop. The running loop if None.
+        """
+        if self._active:
+            return
+        self._loop = asyncio.get_running_loop() if loop is None else loop
+        self._loop_thread_id = get_ident()
+        self._active = True
+        if self._queue:
+            self._schedule()
+
+    def stop(self):
+        """
+        Stop dispatching after the queued events are processed.
+        """
+        if not self._active:
+            return
+        self.process_pending()
+        self._active = False
+
+    def put(self, event):
+        """
+        Put an event in the queue. Never blocks.
+        """
+        if self._loop_thread_id is not None and get_ident() != self._loop_thread_id:
+            self._loop.call_soon_threadsafe(self.put, event)
+            return
+        self._queue.append(event)
+        self.n_put += 1
+        if self._conflate and event.type_ == EVENT_MARKETDATA:
+            self._latest_ticks[event.even_param_.get(INSTRUMENT_SYMBOL)] = event
+        if self._active and not self._scheduled:
+            self._schedule()
+
+    def _schedule(self):
+        self._scheduled = True
+        self._loop.call_soon(self._dispatch)
+
+    def _dispatch(self):
+        self._scheduled = False
+        queue = self._queue
+        process = self._process_queued
+        for _ in range(min(len(queue), self._batch_size)):
+            process(queue.popleft())
+        if queue and self._active:
+            self._schedule()
+
+
+class AsyncStrategyRuntime(MultiStrategyHost):
+    """
+    Host of strategies on one asyncio event loop, without locks on the tick path.
+
+    Events are dispatched by AsyncEventEngine on the loop thread, so hosted strategies never run concurrently and
+    their active/suspend flags are read without thread_lock. The contract margin/commission fees of all strategies
+    are refreshed by a periodic task instead of on every tick. The platform workers cancelling untraded orders and
+    querying margin and commission rates are blocking, so the lead strategy runs them once for all symbols in the
+    loop executor.
+
+    start() and stop() are called in the loop thread, e.g.:
+        runtime.start()
+        ...
+        runtime.stop()
+        await runtime.wait_closed()
+    """
+
+    def __init__(self, margin_refresh_interval=1.0, logger=None, conflate=False):
+        """
+        :param margin_refresh_interval: float. Seconds between two refreshes of contract margin/commission fees.
+        :param logger: Logger of the runtime.
+        :param conflate: bool. If queued market data events are conflated by symbol, see EventEngine.
+        """
+        super().__init__(AsyncEventEngine(logger=logger, conflate=conflate), logger)
+        self.margin_refresh_interval = margin_refresh_interval
+        self._margin_ready = set()  # symbols of strategies with valid margin/commission fees
+        self._refresh_task = None
+        self._worker_futures = []
+
+    def __repr__(self):
+        return "AsyncStrategyRuntime: active={} symbols={}".format(self._active, sorted(self.strategies))
+
+    def _start_workers(self):
+        loop = asyncio.get_running_loop()
+        lead = self._lead
+        self._worker_futures = [
+            loop.run_in_executor(None, lead.cancel_untraded_orders),
+            loop.run_in_executor(None, lead.query_margin_commission_rate, list(self.strategies))
+        ]
+        self._refresh_margin_fees()
+        self._refresh_task = loop.create_task(self._refresh_margin_fees_periodically())
+
+    def stop(self):
+        """
+        Stop all strategies, the margin/commission refresh task and the event engine.
+        :return: None
+        """
+        if not self._active:
+            return
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        super().stop()
+        self._margin_ready = set()
+
+    async def wait_closed(self):
+        """
+        Wait for the platform workers to return after stop().
+        """
+        futures, self._worker_futures = self._worker_futures, []
+        await asyncio.gather(*futures, return_exceptions=True)
+
+    def _refresh_margin_fees(self):
+        for symbol, strategy in self.strategies.items():
+            try:
+                strategy._check_margin_fee()
+            except InvalidMarginFee:
+                self._margin_ready.discard(symbol)
+            else:
+                self._margin_ready.add(symbol)
+
+    async def _refresh_margin_fees_periodically(self):
+        while True:
+            await asyncio.sleep(self.margin_refresh_interval)
+            self._refresh_margin_fees()
+
+    def _on_tick(self, event):
+        symbol = event.even_param_[INSTRUMENT_SYMBOL]
+        strategy = self.strategies.get(symbol)
+        if strategy is None or not strategy.active or strategy.suspend or symbol not in self._margin_ready:
+            return
+        if not if_market_open(strategy.contract.trading_hours):
+            return
+        strategy._process_tick(event, perf_counter_ns() if strategy.latency is not None else None)
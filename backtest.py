@@ -0,0 +1,682 @@
+"""
+Event-driven backtesting of strategies on historical ticks.
+
+The strategy runs unmodified on top of BacktestPlatform, which provides the platform services with a local portfolio
+and a simulated exchange. Ticks are fed as EVENT_MARKETDATA events to Strategy.on_tick, and all events are processed
+synchronously in the calling thread.
+"""
+
+
+import csv
+import logging
+from threading import Condition, Lock
+from constants import *
+from events import EVENT_MARKETDATA, EVENT_TRADE, EVENT_STATUS
+from events import StrategyEvent, EventEngine
+from strategy import MetaStrategy, calc_fee
+from clock import EventClock, parse_time
+from tick_tracer import TickTracer
+from history import TradeHistory
+from latency import LatencyRecorder
+from metrics import StrategyMetrics
+
+
+DEFAULT_MARGIN_FEE = {
+    MARGIN_TYPE: FEE_TYPE_RATIO,
+    MARGIN_RATE: 0.1,
+    OPEN_COMM_TYPE: FEE_TYPE_RATIO,
+    OPEN_COMM_RATE: 0.0001,
+    CLOSE_COMM_TYPE: FEE_TYPE_RATIO,
+    CLOSE_COMM_RATE: 0.0001,
+    CLOSE_TODAY_COMM_TYPE: FEE_TYPE_RATIO,
+    CLOSE_TODAY_COMM_RATE: 0.0001
+}
+NO_PRICE_LIMIT = 1e9  # High limit price used when tick data has no exchange limits
+BACKTEST_ID = 'backtest'  # Account, portfolio and app id of backtests
+
+
+class SimOrder:
+    """
+    An order resting in the simulated exchange.
+    """
+    __slots__ = ("order_id", "action", "direction", "long_short", "price", "qty", "filled_qty", "create_time",
+                 "frozen_cash")
+
+    def __init__(self, order_id, action, direction, price, qty, create_time, frozen_cash=0.0):
+        self.order_id = order_id
+        self.action = action  # BUY/SELL
+        self.direction = direction  # DIRECTION_LONG/DIRECTION_SHORT
+        self.long_short = int(direction == DIRECTION_SHORT)
+        self.price = price
+        self.qty = qty
+        self.filled_qty = 0
+        self.create_time = create_time
+        self.frozen_cash = frozen_cash  # margin and commission reserved by a buy order
+
+    def __repr__(self):
+        return "SimOrder {}: {} {} price={} qty={} filled_qty={}".format(
+            self.order_id, ('buy', 'sell')[int(self.action == SELL)], self.direction, self.price, self.qty,
+            self.filled_qty)
+
+
+class BacktestPortfolio:
+    """
+    Local stand-in for the platform portfolio object of one account trading one contract.
+    Buy opens and sell closes a position in either long or short direction.
+    """
+
+    def __init__(self, principal, unit, margin_fee):
+        """
+        :param principal: float. Principal cash.
+        :param unit: float. Contract unit size.
+        :param margin_fee: dict. Margin and commission fee information by direction.
+        """
+        self.principal = principal
+        self.unit = unit
+        self.margin_fee = margin_fee
+        self.last_price = 0.0
+        self.position_qty = [0, 0]  # long/short position qty
+        self.cma_price = [0.0, 0.0]  # long/short cumulative moving average price
+        self.frozen_qty = [0, 0]  # long/short position qty held by pending sell orders
+        self.margin = [0.0, 0.0]  # long/short position margin
+        self.frozen_cash = 0.0  # cash reserved by pending buy orders
+        self.realized_gain = 0.0
+        self.commission = 0.0
+        self.order_ids = set()  # ids of orders whose final status is not processed yet
+
+    # --- Platform portfolio API --- #
+
+    def get_principal_by_this_running(self, account_id):
+        return self.principal
+
+    def get_remaining_cash(self, account_id):
+        return self.principal + self.gain() - self.margin[0] - self.margin[1] - self.frozen_cash
+
+    def get_gain_by_this_running(self, account_id):
+        return self.gain()
+
+    def get_traded_qty(self, account_id, instrument_id, direction, real_time=False):
+        long_short = int(direction == DIRECTION_SHORT)
+        return self.position_qty[long_short] - self.frozen_qty[long_short]
+
+    def query_all_order_ids(self):
+        return self.order_ids
+
+    def is_reset_for_accounts(self):
+        pass
+
+    def clear_all_accounts(self):
+        pass
+
+    # --- Bookkeeping --- #
+
+    def gain(self):
+        """
+        Realized and unrealized gain net of commission.
+        """
+        unrealized = ((self.last_price - self.cma_price[0]) * self.position_qty[0] -
+                      (self.last_price - self.cma_price[1]) * self.position_qty[1]) * self.unit
+        return self.realized_gain + unrealized - self.commission
+
+    def on_fill(self, order, price, qty):
+        """
+        Update position, margin and cash with a fill of an order.
+        """
+        fee = self.margin_fee[order.direction]
+        d = order.long_short
+        if order.action == BUY:
+            frozen = order.frozen_cash * qty / (order.qty - order.filled_qty)
+            order.frozen_cash -= frozen
+            self.frozen_cash -= frozen
+            position_qty = self.position_qty[d]
+            self.cma_price[d] = (self.cma_price[d] * position_qty + price * qty) / (position_qty + qty)
+            self.position_qty[d] = position_qty + qty
+            self.margin[d] += calc_fee(fee[MARGIN_TYPE], fee[MARGIN_RATE], price, qty, self.unit)
+            self.commission += calc_fee(fee[OPEN_COMM_TYPE], fee[OPEN_COMM_RATE], price, qty, self.unit)
+        else:
+            position_qty = self.position_qty[d]
+            self.realized_gain += (1 - 2 * d) * (price - self.cma_price[d]) * qty * self.unit
+            self.margin[d] *= float(position_qty - qty) / position_qty
+            self.position_qty[d] = position_qty - qty
+            self.frozen_qty[d] -= qty
+            if self.position_qty[d] == 0:
+                self.cma_price[d] = 0.0
+            self.commission += calc_fee(fee[CLOSE_COMM_TYPE], fee[CLOSE_COMM_RATE], price, qty, self.unit)
+
+    def on_order_accepted(self, order):
+        if order.action == BUY:
+            self.frozen_cash += order.frozen_cash
+        else:
+            self.frozen_qty[order.long_short] += order.qty
+        self.order_ids.add(order.order_id)
+
+    def on_order_cancelled(self, order):
+        if order.action == BUY:
+            self.frozen_cash -= order.frozen_cash
+            order.frozen_cash = 0.0
+        else:
+            self.frozen_qty[order.long_short] -= order.qty - order.filled_qty
+
+
+class BacktestBroker:
+    """
+    Simulated exchange filling limit orders when the last price reaches the order price.
+    Orders submitted on a tick can be filled from the next tick on, at the order price.
+    """
+
+    order_cls = SimOrder
+
+    def __init__(self, event_engine, portfolio, symbol, instrument_id):
+        self.event_engine = event_engine
+        self.portfolio = portfolio
+        self.symbol = symbol
+        self.instrument_id = instrument_id
+        self.orders = {}  # resting orders by order id
+        self.tick_time = None
+        self.n_orders = 0
+        self.n_trades = 0
+        self.n_cancels = 0
+        self._next_order_id = 1
+        self._next_trade_id = 1
+        self._max_buy_price = float('-inf')  # Highest resting buy price
+        self._min_sell_price = float('inf')  # Lowest resting sell price
+
+    def submit(self, event):
+        """
+        Accept or reject an order request.
+        :param event: StrategyEvent of EVENT_BUY or EVENT_SELL.
+        :return: dict. Buy/sell result in platform format.
+        """
+        param = event.even_param
+        action = param[ORDER_ACTION]
+        direction = param[DIRECTION]
+        price = param[PRICE]
+        qty = param[QTY]
+        portfolio = self.portfolio
+        if qty <= 0:
+            return {ORDER_ACCEPT_FLAG: False}
+        frozen_cash = 0.0
+        if action == BUY:
+            fee = portfolio.margin_fee[direction]
+            frozen_cash = (calc_fee(fee[MARGIN_TYPE], fee[MARGIN_RATE], price, qty, portfolio.unit) +
+                           calc_fee(fee[OPEN_COMM_TYPE], fee[OPEN_COMM_RATE], price, qty, portfolio.unit))
+            if frozen_cash > portfolio.get_remaining_cash(BACKTEST_ID):
+                return {ORDER_ACCEPT_FLAG: False}
+        elif qty > portfolio.get_traded_qty(BACKTEST_ID, self.instrument_id, direction):
+            return {ORDER_ACCEPT_FLAG: False}
+
+        order = self.order_cls(self._next_order_id, action, direction, price, qty, self.tick_time, frozen_cash)
+        self._next_order_id += 1
+        self.n_orders += 1
+        self.orders[order.order_id] = order
+        portfolio.on_order_accepted(order)
+        if action == BUY:
+            self._max_buy_price = max(self._max_buy_price, price)
+        else:
+            self._min_sell_price = min(self._min_sell_price, price)
+        return {
+            ORDER_ACCEPT_FLAG: True,
+            (BUY_ORDERS, SELL_ORDERS)[int(action == SELL)]: [{
+                ORDER_ID: order.order_id,
+                ORDER_ACTION: action,
+                DIRECTION: direction,
+                PRICE: price,
+                QTY: qty,
+                ORDER_CREATE_DATE: self.tick_time
+            }]
+        }
+
+    def cancel(self, cancel_param):
+        """
+        Cancel resting orders and put EVENT_STATUS events of cancelled orders.
+        :param cancel_param: dict. Parameters of EVENT_CANCEL.
+        """
+        orders = self._orders_to_cancel(cancel_param)
+        for order in orders:
+            self._cancel(order)
+        if orders:
+            self._update_price_bounds()
+
+    def _orders_to_cancel(self, cancel_param):
+        """
+        :return: list of the resting orders selected by the parameters of EVENT_CANCEL.
+        """
+        cancel_type = cancel_param.get(CANCEL_TYPE, CANCEL_ALL)
+        if cancel_type == CANCEL_ORDERS:
+            return [self.orders[order_id] for order_id in cancel_param.get(ORDER_IDS, ()) if order_id in self.orders]
+        elif cancel_type == CANCEL_OPEN_ORDERS:
+            return [order for order in self.orders.values() if order.action == BUY]
+        elif cancel_type == CANCEL_CLOSE_ORDERS:
+            return [order for order in self.orders.values() if order.action == SELL]
+        elif cancel_type == CANCEL_ALL:
+            return list(self.orders.values())
+        return []
+
+    def _cancel(self, order):
+        del self.orders[order.order_id]
+        self.portfolio.on_order_cancelled(order)
+        self.n_cancels += 1
+        self._put_status(order.order_id, ORDER_CANCELLED)
+
+    def on_tick(self, tick_time, price, bid=None, ask=None, bid_volume=0, ask_volume=0):
+        """
+        Match resting orders with the last price of a new tick. Quotes are not used by this broker.
+        """
+        self.tick_time = tick_time
+        if self._max_buy_price < price < self._min_sell_price:
+            return
+        filled = [order for order in self.orders.values()
+                  if (order.action == BUY and price <= order.price) or (order.action == SELL and price >= order.price)]
+        for order in filled:
+            self._fill(order, order.price, order.qty - order.filled_qty)
+        self._update_price_bounds()
+
+    def _fill(self, order, price, qty):
+        self.portfolio.on_fill(order, price, qty)
+        order.filled_qty += qty
+        self.n_trades += 1
+        self.event_engine.put(StrategyEvent(EVENT_TRADE, {
+            TRADE_ID: self._next_trade_id,
+            ORDER_ID: order.order_id,
+            INSTRUMENT_SYMBOL: self.symbol,
+            INSTRUMENT_ID: self.instrument_id,
+            ORDER_ACTION: order.action,
+            DIRECTION: order.direction,
+            PRICE: price,
+            QTY: qty,
+            ORDER_CREATE_DATE: self.tick_time
+        }))
+        self._next_trade_id += 1
+        if order.filled_qty == order.qty:
+            del self.orders[order.order_id]
+            self._put_status(order.order_id, ORDER_CLOSED_ALIAS)
+
+    def _put_status(self, order_id, order_status):
+        self.event_engine.put(StrategyEvent(EVENT_STATUS, {
+            ORDER_ID: order_id,
+            ORDER_STATUS: order_status,
+            INSTRUMENT_SYMBOL: self.symbol
+        }))
+
+    def _update_price_bounds(self):
+        self._max_buy_price = max([o.price for o in self.orders.values() if o.action == BUY] or [float('-inf')])
+        self._min_sell_price = min([o.price for o in self.orders.values() if o.action == SELL] or [float('inf')])
+
+
+class BacktestEventEngine(EventEngine):
+    """
+    Event engine without dispatch thread. Queued events are processed by the backtester with process_pending().
+    """
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class BacktestPlatform(MetaStrategy):
+    """
+    Platform services for backtests, backed by BacktestPortfolio and BacktestBroker.
+    Use backtest_class() to put it under a strategy class.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.event_engine = BacktestEventEngine()
+        self.clock = EventClock()  # driven by the tick times
+        self.logger = logging.getLogger('backtest')
+        self.portfolio_obj = None
+        self.broker = None
+        self.account_id = self.portfolio_id = self.app_id = BACKTEST_ID
+        self.thread_lock = Lock()
+        self.thread_cond = Condition()
+        self.active = False
+        self.suspend = False
+        self.error_code = None
+        self.open_times = ""
+        self.cache_flag = True
+        self.instru_unit_size = {}
+        self.instru_price_tick = {}
+        self.instru_margin_comm_rate = {}
+
+    def config(self, strategy_setting, cash_check=True):
+        return bool(strategy_setting and strategy_setting.get(INSTRUMENTS))
+
+    def reset_properties_for_restart(self):
+        self.active = True
+        self.suspend = False
+        self.error_code = None
+        self.cache_flag = True
+
+    def buy_action(self, event):
+        return self.broker.submit(event)
+
+    def sell_action(self, event):
+        return self.broker.submit(event)
+
+    def cancel_action(self, event):
+        self.broker.cancel(event.even_param)
+
+    def profit_change(self, event):
+        if event.even_param[PRICE] is not None:
+            self.portfolio_obj.last_price = event.even_param[PRICE]
+
+    def trade_record_update(self, event):
+        return True  # Portfolio is updated by the broker on fills
+
+    def order_status_update(self, order_status_param):
+        self.portfolio_obj.order_ids.discard(order_status_param[ORDER_ID])
+
+    def query_margin_rate(self, direction, symbol):
+        return self.instru_margin_comm_rate[symbol][direction]
+
+    def calculate_margin(self, event):
+        param = event.even_param
+        return calc_fee(param[MARGIN_TYPE], param[MARGIN_RATE], param[PRICE], param[QTY], param[UNIT_SIZE])
+
+    def calculate_open_commission_with_event(self, event):
+        param = event.even_param
+        return calc_fee(param[OPEN_COMM_TYPE], param[OPEN_COMM_RATE], param[PRICE], param[QTY], param[UNIT_SIZE])
+
+    def cancel_untraded_orders(self):
+        pass  # Orders do not expire in backtests
+
+    def query_margin_commission_rate(self, symbols):
+        pass  # Margin and commission rates are static in backtests
+
+    def cancel_before_stop(self):
+        self.broker.cancel({CANCEL_TYPE: CANCEL_ALL})
+        self.event_engine.process_pending()
+
+
+_backtest_classes = {}
+
+
+def backtest_class(strategy_cls):
+    """
+    :param strategy_cls: Strategy subclass.
+    :return: Subclass of strategy_cls running on BacktestPlatform.
+    """
+    if strategy_cls not in _backtest_classes:
+        _backtest_classes[strategy_cls] = type('Backtest' + strategy_cls.__name__, (strategy_cls, BacktestPlatform), {})
+    return _backtest_classes[strategy_cls]
+
+
+class BacktestResult:
+    """
+    Summary metrics of a backtest run.
+    """
+    __slots__ = ("pnl", "max_drawdown", "n_ticks", "n_orders", "n_trades", "n_cancels", "position_qty",
+                 "state_transitions", "stopped")
+
+    def __init__(self, pnl, max_drawdown, n_ticks, n_orders, n_trades, n_cancels, position_qty, state_transitions,
+                 stopped=False):
+        """
+        :param pnl: float. Gain net of commission at the end of the run.
+        :param max_drawdown: float. Max drop of net liquidation value from its running peak.
+        :param n_ticks: int. Number of ticks processed.
+        :param n_orders: int. Number of orders accepted by the simulated exchange.
+        :param n_trades: int. Number of fills.
+        :param n_cancels: int. Number of cancelled orders.
+        :param position_qty: list. Long/short position qty at the end of the run.
+        :param state_transitions: dict. Number of strategy state transitions by (from_state, to_state).
+        :param stopped: bool. If the run was stopped at its drawdown limit before the end of the ticks.
+        """
+        self.pnl = pnl
+        self.max_drawdown = max_drawdown
+        self.n_ticks = n_ticks
+        self.n_orders = n_orders
+        self.n_trades = n_trades
+        self.n_cancels = n_cancels
+        self.position_qty = position_qty
+        self.state_transitions = state_transitions
+        self.stopped = stopped
+
+    def __repr__(self):
+        return ("BacktestResult: pnl={} max_drawdown={} n_ticks={} n_orders={} n_trades={} n_cancels={} "
+                "position_qty={} state_transitions={} stopped={}".format(
+                    self.pnl, self.max_drawdown, self.n_ticks, self.n_orders, self.n_trades, self.n_cancels,
+                    self.position_qty, self.state_transitions, self.stopped))
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Backtester:
+    """
+    Replay ticks of one contract through a strategy and simulate its order executions.
+    """
+
+    def __init__(self,
+                 strategy_cls,
+                 strategy_params,
+                 symbol,
+                 tick_size,
+                 unit_size,
+                 principal=1000000.0,
+                 margin_fee=None,
+                 instrument_id=None,
+                 logger=None,
+                 trace_interval=None,
+                 latency=False,
+                 broker_factory=BacktestBroker,
+                 max_drawdown=None,
+                 history=False,
+                 metrics=False):
+        """
+        :param strategy_cls: Strategy subclass, e.g. SwingStrategy.
+        :param strategy_params: dict. Strategy specific parameters passed to strategy_config_params().
+        :param symbol: str. Contract symbol.
+        :param tick_size: float. Contract price tick size.
+        :param unit_size: float. Contract unit size.
+        :param principal: float. Principal cash.
+        :param margin_fee: dict. Margin and commission fee information, same for both directions.
+        :param instrument_id: str. Contract instrument id. Same as symbol if None.
+        :param logger: Strategy logger. A logger at WARNING level is used if None.
+        :param trace_interval: int. Number of ticks between two strategy trace records logged at INFO. No trace if None.
+        :param latency: bool. If record the latency histograms of the strategy hot path in strategy.latency.
+        :param broker_factory: Callable (event_engine, portfolio, symbol, instrument_id) returning the simulated
+            exchange, e.g. BacktestBroker, or functools.partial(fill_sim.QueueBroker, ack_latency=0.05).
+        :param max_drawdown: float. The run stops once its drawdown exceeds it, e.g. to discard losing configs early.
+            No limit if None.
+        :param history: bool. If record the orders and fills of the run in strategy.trade_history, timed by tick time.
+        :param metrics: bool. If count the zone and state metrics of the run in strategy.metrics.
+        """
+        self.strategy_cls = strategy_cls
+        self.strategy_params = strategy_params
+        self.symbol = symbol
+        self.instrument_id = symbol if instrument_id is None else instrument_id
+        self.tick_size = tick_size
+        self.unit_size = unit_size
+        self.principal = principal
+        self.margin_fee = dict(DEFAULT_MARGIN_FEE if margin_fee is None else margin_fee)
+        if logger is None:
+            logger = logging.getLogger('backtest.' + symbol)
+            if logger.level == logging.NOTSET:
+                logger.setLevel(logging.WARNING)
+        self.logger = logger
+        self.trace_interval = trace_interval
+        self.latency = latency
+        self.broker_factory = broker_factory
+        self.max_drawdown = max_drawdown
+        self.history = history
+        self.metrics = metrics
+        self.strategy = None
+
+    def _setup_strategy(self):
+        strategy = backtest_class(self.strategy_cls)()
+        strategy.logger = self.logger
+        if self.trace_interval is not None:
+            strategy.tick_tracer = TickTracer(self.logger, self.trace_interval)
+        if self.latency:
+            strategy.latency = LatencyRecorder()
+        if self.history:
+            strategy.trade_history = TradeHistory(clock=strategy.clock)
+        if self.metrics:
+            strategy.metrics = StrategyMetrics()
+        strategy.portfolio_obj = BacktestPortfolio(self.principal, self.unit_size, {
+            DIRECTION_LONG: self.margin_fee,
+            DIRECTION_SHORT: self.margin_fee
+        })
+        strategy.broker = self.broker_factory(strategy.event_engine, strategy.portfolio_obj, self.symbol,
+                                              self.instrument_id)
+        strategy.instru_margin_comm_rate = {self.symbol: strategy.portfolio_obj.margin_fee}
+        strategy.config({
+            INSTRUMENTS: [{
+                INSTRUMENT_ID: self.instrument_id,
+                INSTRUMENT_SYMBOL: self.symbol,
+                INSTRUMENT_TRADING_HOURS: ''
+            }],
+            self.symbol: self.strategy_params
+        })
+        return strategy
+
+    def run(self, ticks):
+        """
+        Run a backtest with a fresh strategy object.
+        :param ticks: iterable of (time, price, bid, ask, bid_volume, ask_volume, high_limit, low_limit) tuples.
+        :return: BacktestResult
+        """
+        self.strategy = strategy = self._setup_strategy()
+        engine = strategy.event_engine
+        broker = strategy.broker
+        portfolio = strategy.portfolio_obj
+        clock = strategy.clock
+
+        # One market data event is reused for all ticks.
+        param = {
+            INSTRUMENT_SYMBOL: self.symbol,
+            INSTRUMENT_ID: self.instrument_id,
+            TICK_SIZE: self.tick_size,
+            UNIT_SIZE: self.unit_size
+        }
+        event = StrategyEvent(EVENT_MARKETDATA, param)
+
+        strategy.start()
+        n_ticks = 0
+        max_nlv = portfolio.principal
+        max_drawdown = 0.0
+        drawdown_limit = float('inf') if self.max_drawdown is None else self.max_drawdown
+        stopped = False
+        state = getattr(strategy, '_state', None)
+        state_transitions = {}
+        for tick_time, price, bid, ask, bid_volume, ask_volume, high_limit, low_limit in ticks:
+            n_ticks += 1
+            clock.set_ns(tick_time if tick_time.__class__ is int else parse_time(tick_time))
+
+            # Fills on the new price go first, then the tick itself.
+            broker.on_tick(tick_time, price, bid, ask, bid_volume, ask_volume)
+            if engine.qsize():
+                engine.process_pending()
+            param[TICK_TIME] = tick_time
+            param[PRICE] = price
+            param[BID] = bid
+            param[ASK] = ask
+            param[BID_VOLUME] = bid_volume
+            param[ASK_VOLUME] = ask_volume
+            param[HIGH_LIMIT] = high_limit
+            param[LOW_LIMIT] = low_limit
+            portfolio.last_price = price  # The strategy only marks the portfolio to market when it reconciles its gain
+            engine.process(event)
+            if engine.qsize():
+                engine.process_pending()
+
+            # Metrics
+            nlv = portfolio.principal + portfolio.gain()
+            if nlv > max_nlv:
+                max_nlv = nlv
+            elif max_nlv - nlv > max_drawdown:
+                max_drawdown = max_nlv - nlv
+                if max_drawdown > drawdown_limit:
+                    stopped = True
+                    break
+            new_state = getattr(strategy, '_state', None)
+            if new_state != state:
+                state_transitions[(state, new_state)] = state_transitions.get((state, new_state), 0) + 1
+                state = new_state
+            if not strategy.active:
+                break
+
+        result = BacktestResult(portfolio.gain(), max_drawdown, n_ticks, broker.n_orders, broker.n_trades,
+                                broker.n_cancels, list(portfolio.position_qty), state_transitions, stopped)
+        strategy.stop()
+        return result
+
+
+def read_csv_ticks(file_path):
+    """
+    Read ticks from a CSV file with a header row. Columns TICK_TIME and PRICE are required. Missing bid/ask default
+    to the last price, volumes to 0 and limits to [0, NO_PRICE_LIMIT].
+    :return: Generator of (time, price, bid, ask, bid_volume, ask_volume, high_limit, low_limit) tuples.
+    """
+    with open(file_path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        index = {name: i for i, name in enumerate(header)}
+        i_time, i_price = index[TICK_TIME], index[PRICE]
+        i_bid, i_ask = index.get(BID), index.get(ASK)
+        i_bid_volume, i_ask_volume = index.get(BID_VOLUME), index.get(ASK_VOLUME)
+        i_high, i_low = index.get(HIGH_LIMIT), index.get(LOW_LIMIT)
+        for row in reader:
+            if not row:
+                continue
+            price = float(row[i_price])
+            yield (row[i_time], price,
+                   price if i_bid is None else float(row[i_bid]),
+                   price if i_ask is None else float(row[i_ask]),
+                   0 if i_bid_volume is None else int(float(row[i_bid_volume])),
+                   0 if i_ask_volume is None else int(float(row[i_ask_volume])),
+                   NO_PRICE_LIMIT if i_high is None else float(row[i_high]),
+                   0.0 if i_low is None else float(row[i_low]))
+
+
+def main():
+    import argparse
+    import json
+    import time
+    from swing_strategy import SwingStrategy
+
+    parser = argparse.ArgumentParser(description='Backtest SwingStrategy on a CSV tick file.')
+    parser.add_argument('ticks', help='CSV tick file.')
+    parser.add_argument('params', help='JSON file of SwingStrategy parameters.')
+    parser.add_argument('--symbol', required=True)
+    parser.add_argument('--tick-size', type=float, required=True)
+    parser.add_argument('--unit-size', type=float, required=True)
+    parser.add_argument('--principal', type=float, default=1000000.0)
+    parser.add_argument('--trace-interval', type=int, default=None, help='Log a strategy trace every N ticks.')
+    parser.add_argument('--latency', action='store_true', help='Print the latency histograms of the strategy.')
+    parser.add_argument('--queue-fills', action='store_true',
+                        help='Fill orders by their queue position with fill_sim.QueueBroker.')
+    parser.add_argument('--ack-latency', type=float, default=0.0, help='Order ack latency in seconds of --queue-fills.')
+    parser.add_argument('--cancel-latency', type=float, default=0.0, help='Cancel latency in seconds of --queue-fills.')
+    parser.add_argument('--metrics', default=None, help='Write the strategy metrics to this Prometheus text file.')
+    args = parser.parse_args()
+
+    with open(args.params) as f:
+        strategy_params = json.load(f)
+    logger = None
+    if args.trace_interval is not None:
+        logging.basicConfig(format='%(message)s')
+        logger = logging.getLogger('backtest.' + args.symbol)
+        logger.setLevel(logging.INFO)
+    broker_factory = BacktestBroker
+    if args.queue_fills:
+        from functools import partial
+        from fill_sim import QueueBroker
+        broker_factory = partial(QueueBroker, ack_latency=args.ack_latency, cancel_latency=args.cancel_latency)
+    backtester = Backtester(SwingStrategy, strategy_params, args.symbol, args.tick_size, args.unit_size,
+                            args.principal, logger=logger, trace_interval=args.trace_interval, latency=args.latency,
+                            broker_factory=broker_factory, metrics=args.metrics is not None)
+    t0 = time.time()
+    result = backtester.run(read_csv_ticks(args.ticks))
+    print(result)
+    print("{} ticks in {:.1f}s".format(result.n_ticks, time.time() - t0))
+    if args.latency:
+        print(json.dumps(backtester.strategy.latency.snapshot(), indent=2))
+    if args.metrics is not None:
+        backtester.strategy.metrics.write_prometheus(args.metrics)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,486 @@
+"""
+Micro-benchmarks of the tick-to-order hot path.
+
+Every benchmark replays the same synthetic random-walk tick stream and reports the best time per operation over a
+number of repeats, and the memory allocations traced with tracemalloc in a separate run. Results are compared with a
+stored baseline to report regressions.
+
+    python benchmarks.py                    # run all benchmarks and compare with the baseline
+    python benchmarks.py --save             # run all benchmarks and store them as the new baseline
+    python benchmarks.py -k grid_osc        # run benchmarks whose name contains grid_osc
+"""
+
+
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from constants import *
+from events import StrategyEvent, EVENT_MARKETDATA, EVENT_BUY
+from strategy import REQ
+from strategy import Contract, calc_order_params, update_position_avg_price_2way
+from advanced_orders import AdaptiveOrder
+from grid_osc_strategy import GridOsc
+from swing_strategy import START_ZONE, OPEN_PRICE, TREND_REVERSAL_PRICE_TRAIL_RATIO, MIN_OSC_HEIGHT, TRAIL_PRICE_TICKS
+from swing_strategy import OPEN_VOLUME, BASE_VOLUME, OPEN_OFFSET_VOLUME, CLOSE_OFFSET_VOLUME
+from swing_strategy import RISKY_ZONE_ACTIVATE_LOSS_RATIO, STOPWIN_BASE_PERCENTAGE, TRAIL_PERCENTAGE
+from swing_strategy import SwingStrategy
+from backtest import Backtester, BacktestEventEngine, BacktestPortfolio, DEFAULT_MARGIN_FEE
+from fill_sim import QueueBroker, LeanQueueBroker
+from snapshot import StateJournal
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks_baseline.json')
+BENCH_SYMBOL = 'BENCH'
+BENCH_TICK_SIZE = 0.2
+BENCH_UNIT_SIZE = 10
+BENCH_PRICE = 3000.0
+SWING_PARAMS = {
+    START_ZONE: 'Osc',
+    DIRECTION: DIRECTION_LONG,
+    OPEN_PRICE: BENCH_PRICE,
+    TREND_REVERSAL_PRICE_TRAIL_RATIO: 0.01,
+    MIN_OSC_HEIGHT: 0.8,
+    TRAIL_PRICE_TICKS: 0.4,
+    OPEN_VOLUME: 100,
+    BASE_VOLUME: 2,
+    OPEN_OFFSET_VOLUME: {'Net': 1, 'Inc': 1, 'Osc': 1, 'Dec': 1},
+    CLOSE_OFFSET_VOLUME: {'Net': 1, 'Inc': 1, 'Osc': 1, 'Dec': 1},
+    RISKY_ZONE_ACTIVATE_LOSS_RATIO: 0.05,
+    STOPWIN_BASE_PERCENTAGE: 0.5,
+    TRAIL_PERCENTAGE: 0.3
+}
+
+# Benchmarks by name. A benchmark is a setup function of the tick stream, returning a run() function which performs
+# one operation per tick and returns the number of operations. Only run() is timed.
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+def random_walk_ticks(n_ticks, seed=7, price=BENCH_PRICE, tick=BENCH_TICK_SIZE):
+    """
+    Synthetic tick stream of a random walk of one tick per step around price.
+    :return: list of (time, price, bid, ask, bid_volume, ask_volume, high_limit, low_limit) tuples.
+    """
+    rng = random.Random(seed)
+    n = int(round(price / tick))
+    ticks = []
+    for i in range(n_ticks):
+        n += rng.choice((-1, 0, 1))
+        p = round(n * tick, 1)
+        ticks.append((i, p, round(p - tick, 1), round(p + tick, 1), rng.randint(1, 50), rng.randint(1, 50),
+                      round(price * 1.3, 1), round(price * 0.7, 1)))
+    return ticks
+
+
+def _quiet_logger():
+    logger = logging.getLogger('benchmarks')
+    logger.setLevel(logging.WARNING)
+    return logger
+
+
+def _contract():
+    contract = Contract(symbol=BENCH_SYMBOL, instrument_id=BENCH_SYMBOL, unit=BENCH_UNIT_SIZE)
+    contract.set_tick(BENCH_TICK_SIZE)
+    return contract
+
+
+def _swing_backtester():
+    return Backtester(SwingStrategy, SWING_PARAMS, BENCH_SYMBOL, BENCH_TICK_SIZE, BENCH_UNIT_SIZE,
+                      logger=_quiet_logger())
+
+
+def _market_event(backtester):
+    return StrategyEvent(EVENT_MARKETDATA, {
+        INSTRUMENT_SYMBOL: backtester.symbol,
+        INSTRUMENT_ID: backtester.instrument_id,
+        TICK_SIZE: backtester.tick_size,
+        UNIT_SIZE: backtester.unit_size
+    })
+
+
+def _set_tick(param, tick):
+    param[TICK_TIME], param[PRICE], param[BID], param[ASK], param[BID_VOLUME], param[ASK_VOLUME], \
+        param[HIGH_LIMIT], param[LOW_LIMIT] = tick
+
+
+@benchmark('strategy.on_tick')
+def bench_on_tick(ticks):
+    """
+    SwingStrategy.on_tick end-to-end on the backtest platform, with order submissions and simulated fills.
+    """
+    backtester = _swing_backtester()
+    strategy = backtester._setup_strategy()
+    engine, broker = strategy.event_engine, strategy.broker
+    event = _market_event(backtester)
+    param = event.even_param_
+    strategy.start()
+
+    def run():
+        for tick in ticks:
+            broker.on_tick(tick[0], tick[1])
+            if engine.qsize():
+                engine.process_pending()
+            _set_tick(param, tick)
+            strategy.on_tick(event)
+            if engine.qsize():
+                engine.process_pending()
+        return len(ticks)
+    return run
+
+
+@benchmark('strategy.on_tick.state_journal')
+def bench_on_tick_state_journal(ticks):
+    """
+    strategy.on_tick with a StateJournal recording the strategy state, written by its background thread.
+    """
+    backtester = _swing_backtester()
+    strategy = backtester._setup_strategy()
+    engine, broker = strategy.event_engine, strategy.broker
+    event = _market_event(backtester)
+    param = event.even_param_
+    strategy.state_journal = StateJournal(os.path.join(tempfile.mkdtemp(), 'bench'))
+    strategy.start()
+
+    def run():
+        for tick in ticks:
+            broker.on_tick(tick[0], tick[1])
+            if engine.qsize():
+                engine.process_pending()
+            _set_tick(param, tick)
+            strategy.on_tick(event)
+            if engine.qsize():
+                engine.process_pending()
+        return len(ticks)
+    return run
+
+
+@benchmark('strategy._update_contract_market')
+def bench_update_contract_market(ticks):
+    backtester = _swing_backtester()
+    strategy = backtester._setup_strategy()
+    update_contract_market = strategy._update_contract_market
+    event = _market_event(backtester)
+    param = event.even_param_
+
+    def run():
+        for tick in ticks:
+            _set_tick(param, tick)
+            update_contract_market(event)
+        return len(ticks)
+    return run
+
+
+@benchmark('grid_osc.on_tick_trade')
+def bench_grid_osc_on_tick_trade(ticks):
+    """
+    GridOsc.on_tick_update and on_tick_trade, with orders immediately accepted and filled.
+    """
+    contract = _contract()
+    zone = GridOsc(_quiet_logger(), 'Osc', contract, BENCH_PRICE - 40.0, 100, 0.8, True, True, 0.4, 2, 2, 2, 2,
+                   BENCH_PRICE, 0)
+
+    def run():
+        position_long = position_short = 50
+        for tick in ticks:
+            price = tick[1]
+            zone.on_tick_update(price)
+            order_params_list, position_long, position_short = zone.on_tick_trade(price, position_long,
+                                                                                 position_short)
+            if order_params_list:
+                for order_params in order_params_list:
+                    if order_params['qty']:
+                        zone.on_trade_update(int(order_params['action'] == SELL),
+                                             int(order_params['direction'] == DIRECTION_SHORT), price,
+                                             order_params['qty'])
+                zone.on_buy_sell_success(price)
+                if zone.state == REQ:
+                    zone.on_buy_sell_success(price)
+                position_long = position_short = 50
+        return len(ticks)
+    return run
+
+
+@benchmark('grid_osc.evaluate_ticks')
+def bench_grid_osc_evaluate_ticks(ticks):
+    """
+    GridOsc.evaluate_ticks, the batch equivalent of grid_osc.on_tick_trade.
+    """
+    contract = _contract()
+    prices = [tick[1] for tick in ticks]
+
+    def run():
+        zone = GridOsc(_quiet_logger(), 'Osc', contract, BENCH_PRICE - 40.0, 100, 0.8, True, True, 0.4, 2, 2, 2, 2,
+                       BENCH_PRICE, 0)
+        zone.evaluate_ticks(prices, 50, 50)
+        return len(prices)
+    return run
+
+
+@benchmark('grid_osc.evaluate_ticks.wide_grid')
+def bench_grid_osc_evaluate_ticks_wide_grid(ticks):
+    """
+    GridOsc.evaluate_ticks on a grid of 20 ticks trailed by 10 ticks, where most blocks of prices cannot trigger.
+    """
+    contract = _contract()
+    prices = [tick[1] for tick in ticks]
+
+    def run():
+        zone = GridOsc(_quiet_logger(), 'Osc', contract, BENCH_PRICE - 200.0, 100, 4.0, True, True, 2.0, 2, 2, 2, 2,
+                       BENCH_PRICE, 0)
+        zone.evaluate_ticks(prices, 50, 50)
+        return len(prices)
+    return run
+
+
+@benchmark('grid_osc._zone_expand')
+def bench_grid_osc_zone_expand(ticks):
+    contract = _contract()
+    zone = GridOsc(_quiet_logger(), 'Inc', contract, BENCH_PRICE, 1, 0.8, True, True, 0.4, 2, 2, 2, 2, BENCH_PRICE, 0)
+    zone_expand = zone._zone_expand
+
+    def run():
+        for tick in ticks:
+            zone_expand(tick[1])
+        return len(ticks)
+    return run
+
+
+@benchmark('adaptive_order.on_tick')
+def bench_adaptive_order_on_tick(ticks):
+    """
+    AdaptiveOrder.on_tick through submissions, cancels on retry and re-submissions.
+    """
+    contract = _contract()
+
+    def new_order():
+        return AdaptiveOrder(contract, BUY, DIRECTION_LONG, 10, BENCH_PRICE, 'bench', patient_max_retry=10**9,
+                             max_slippage=10**9)
+
+    def run():
+        order = new_order()
+        order_id = 0
+        for tick in ticks:
+            contract.last, contract.bid, contract.ask = tick[1], tick[2], tick[3]
+            status, order_params = order.on_tick()
+            if status == ORDER_OPEN:
+                if order_params['action'] == 'CANCEL':
+                    order.on_order_status(ORDER_CANCELLED)
+                else:
+                    order_id += 1
+                    order.on_buysell_success(order_id, order_params['price'])
+            elif status is not None:
+                order = new_order()
+        return len(ticks)
+    return run
+
+
+@benchmark('strategy.send_limit_order')
+def bench_send_limit_order(ticks):
+    """
+    SwingStrategy.send_limit_order of the sell and buy legs of a split order per tick, without dispatching its events.
+    """
+    backtester = _swing_backtester()
+    strategy = backtester._setup_strategy()
+    strategy.contract.set_tick(BENCH_TICK_SIZE)
+    strategy.contract.set_unit(BENCH_UNIT_SIZE)
+    strategy.contract.set_margin_fee(DIRECTION_LONG, DEFAULT_MARGIN_FEE)
+    strategy.contract.set_margin_fee(DIRECTION_SHORT, DEFAULT_MARGIN_FEE)
+    queue = strategy.event_engine._queue
+
+    def run():
+        actions = (BUY, SELL)
+        for i, tick in enumerate(ticks):
+            order_params_list, _, _, _ = calc_order_params(actions[i & 1], DIRECTION_LONG, tick[1], 10,
+                                                           order_tag='Osc', position_available=6,
+                                                           position_available_reverse=4)
+            strategy.send_limit_order(order_params_list)
+            queue.clear()
+        return len(ticks)
+    return run
+
+
+@benchmark('fill_sim.queue_broker')
+def bench_queue_broker(ticks):
+    """
+    QueueBroker.on_tick with one order submitted at the best bid per tick and cancelled 5 ticks later if not filled.
+    """
+    fee = {DIRECTION_LONG: DEFAULT_MARGIN_FEE, DIRECTION_SHORT: DEFAULT_MARGIN_FEE}
+    order_event = StrategyEvent(EVENT_BUY, {ORDER_ACTION: BUY, DIRECTION: DIRECTION_LONG, PRICE: BENCH_PRICE, QTY: 1})
+    order_param = order_event.even_param_
+    cancel_param = {CANCEL_TYPE: CANCEL_ORDERS, ORDER_IDS: [0]}
+
+    def run():
+        engine = BacktestEventEngine()
+        broker = QueueBroker(engine, BacktestPortfolio(1e12, BENCH_UNIT_SIZE, fee), BENCH_SYMBOL, BENCH_SYMBOL)
+        queue = engine._queue
+        for tick in ticks:
+            broker.on_tick(*tick[:6])
+            order_param[PRICE] = tick[2]
+            broker.submit(order_event)
+            cancel_param[ORDER_IDS][0] = broker._next_order_id - 6
+            broker.cancel(cancel_param)
+            queue.clear()
+        return len(ticks)
+    return run
+
+
+@benchmark('fill_sim.queue_broker.lean')
+def bench_lean_queue_broker(ticks):
+    """
+    LeanQueueBroker of sweeps with the orders of fill_sim.queue_broker: one order placed at the best bid per tick
+    and cancelled 5 ticks later if not filled. ns/op is the time per order, ticks included.
+    """
+    def run():
+        broker = LeanQueueBroker()
+        on_tick, place, cancel_order = broker.on_tick, broker.place, broker.cancel_order
+        for tick in ticks:
+            on_tick(*tick[:6])
+            order_id = place(BUY, DIRECTION_LONG, tick[2], 1)
+            cancel_order(order_id - 5)
+        return broker.n_orders
+    return run
+
+
+@benchmark('calc_order_params')
+def bench_calc_order_params(ticks):
+    def run():
+        actions = (BUY, SELL)
+        for i, tick in enumerate(ticks):
+            calc_order_params(actions[i & 1], DIRECTION_LONG, tick[1], 10, order_tag='bench', position_available=6,
+                              position_available_reverse=4)
+        return len(ticks)
+    return run
+
+
+@benchmark('update_position_avg_price_2way')
+def bench_update_position_avg_price_2way(ticks):
+    def run():
+        cma_price, position_qty = 0.0, 0
+        for i, tick in enumerate(ticks):
+            cma_price, position_qty, _ = update_position_avg_price_2way(cma_price, position_qty, (i >> 1) & 1, 0,
+                                                                        tick[1], 1 + (i & 3))
+        return len(ticks)
+    return run
+
+
+def run_benchmark(setup, ticks, repeat=5):
+    """
+    :return: dict. Best time per operation in ns over repeat runs, and allocations traced during one more run: peak
+        memory allocated above the start of the run, and memory still allocated at the end of the run per operation.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        run = setup(ticks)
+        gc.collect()
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            t0 = time.perf_counter_ns()
+            n_ops = run()
+            elapsed = time.perf_counter_ns() - t0
+        finally:
+            if gc_enabled:
+                gc.enable()
+        best = min(best, elapsed / n_ops)
+
+    run = setup(ticks)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        n_ops = run()
+        end, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'ns_per_op': round(best, 1),
+        'peak_alloc_bytes': peak - start,
+        'retained_bytes_per_op': round((end - start) / n_ops, 2)
+    }
+
+
+def run_benchmarks(names=None, n_ticks=20000, repeat=5, seed=7):
+    """
+    :param names: list of benchmark names. All if None.
+    :return: dict. Benchmark results by name.
+    """
+    ticks = random_walk_ticks(n_ticks, seed)
+    return {name: run_benchmark(BENCHMARKS[name], ticks, repeat) for name in (names or BENCHMARKS)}
+
+
+def compare(results, baseline, tolerance):
+    """
+    :param tolerance: float. Max relative increase of ns/op over the baseline.
+    :return: list of names of regressed benchmarks.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is not None and result['ns_per_op'] > base['ns_per_op'] * (1.0 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the tick-to-order hot path micro-benchmarks.')
+    parser.add_argument('-k', dest='pattern', default='', help='Only run benchmarks whose name contains PATTERN.')
+    parser.add_argument('--ticks', type=int, default=20000, help='Number of ticks of the random walk.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Max relative slowdown over the baseline.')
+    parser.add_argument('--save', action='store_true', help='Store the results as the baseline.')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    names = [name for name in BENCHMARKS if args.pattern in name]
+    results = run_benchmarks(names, args.ticks, args.repeat, args.seed)
+
+    print("{:<36} {:>12} {:>12} {:>14} {:>16}".format('benchmark', 'ns/op', 'baseline', 'peak alloc KB',
+                                                      'retained B/op'))
+    for name, result in results.items():
+        base = baseline.get(name)
+        print("{:<36} {:>12.1f} {:>12} {:>14.1f} {:>16.2f}".format(
+            name, result['ns_per_op'], '-' if base is None else '{:.1f}'.format(base['ns_per_op']),
+            result['peak_alloc_bytes'] / 1024.0, result['retained_bytes_per_op']))
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'ticks': args.ticks,
+                'seed': args.seed,
+                'results': results
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print("Baseline saved to {}".format(args.baseline))
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("Regressions over {:.0%}: {}".format(args.tolerance, ', '.join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Clocks of strategy timing. Clock times are integer nanoseconds.
+"""
+
+
+from datetime import datetime, timezone
+from time import monotonic_ns, time_ns
+
+
+TIME_UNITS = {'s': 10**9, 'ms': 10**6, 'us': 10**3, 'ns': 1}
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def parse_time(value, time_unit='s'):
+    """
+    Convert a tick time to nanoseconds since epoch.
+    :param value: Number in time_unit since epoch, or ISO 8601 date time string (UTC if no time zone).
+    :param time_unit: str. 's', 'ms', 'us' or 'ns'.
+    :return: int
+    """
+    try:
+        return int(round(float(value) * TIME_UNITS[time_unit]))
+    except ValueError:
+        dt = datetime.fromisoformat(value)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        delta = dt - _EPOCH
+        return ((delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds) * 1000
+
+
+class MonotonicClock:
+    """
+    Clock of the process monotonic time, the clock of live strategies. Its times only compare within a process.
+    """
+
+    __slots__ = ()
+
+    now_ns = staticmethod(monotonic_ns)
+
+    def __repr__(self):
+        return "MonotonicClock: now_ns={}".format(self.now_ns())
+
+
+class WallClock:
+    """
+    Clock of the system time since epoch, e.g. for records analysed after the session. It may go backwards when the
+    system time is adjusted.
+    """
+
+    __slots__ = ()
+
+    now_ns = staticmethod(time_ns)
+
+    def __repr__(self):
+        return "WallClock: now_ns={}".format(self.now_ns())
+
+
+class EventClock:
+    """
+    Clock driven by event timestamps, e.g. the tick times of a backtest, so timing is deterministic.
+    Its time never goes backwards.
+    """
+
+    __slots__ = ('_now_ns',)
+
+    def __init__(self, now_ns=0):
+        self._now_ns = now_ns
+
+    def __repr__(self):
+        return "EventClock: now_ns={}".format(self._now_ns)
+
+    def now_ns(self):
+        return self._now_ns
+
+    def set_ns(self, now_ns):
+        """
+        Advance the clock to an event timestamp. Earlier timestamps are ignored.
+        :param now_ns: int. Nanoseconds since epoch.
+        """
+        if now_ns > self._now_ns:
+            self._now_ns = now_ns
+
+
+MONOTONIC_CLOCK = MonotonicClock()
+WALL_CLOCK = WallClock()
@@ -21,7 +21,13 @@ CLOSE_TODAY_COMM_TYPE = 'close_today_comm_type'
 CLOSE_TODAY_COMM_RATE = 'close_today_comm_rate'
 
 
+# Margin and commission fee types
+FEE_TYPE_RATIO = 'ratio'  # rate of the order value
+FEE_TYPE_FIXED = 'fixed'  # amount per contract
+
+
 # Tick message fields
+TICK_TIME = 'time'
 ASK = 'ask'
 BID = 'bid'
 ASK_VOLUME = 'askVolume'
@@ -51,6 +57,7 @@ ORDER_ACCEPT_FLAG = 'order_accept_flag'
 BUY_ORDERS = 'buy_orders'
 SELL_ORDERS = 'sell_orders'
 ORDER_IDS = 'order_ids'
+ORDER_LEGS = 'order_legs'  # (action, direction, price, qty, tag) tuples of an order batch
 
 
 # Order cancel type
@@ -95,6 +102,7 @@ ON_UPDATE_ORDER_STATUS = "Updating order status. Params [%s]"
 ON_PROFIT_CHANGE = "EVENT_PROFITCHANGED triggered. Params: [%s]"
 ON_BUY = "EVENT_BUY triggered. Params: [%s]"
 ON_SELL = "EVENT_SELL triggered. Params: [%s]"
+ON_ORDER_BATCH = "EVENT_ORDER_BATCH triggered. Params: [%s]"
 
 
 # Misc
@@ -1,9 +1,11 @@
 """
-Definition of events.
+Definition of events and the event engine.
 """
 
 
-from abc import ABC
+from collections import deque
+from threading import Condition, Lock, Thread, current_thread
+from constants import INSTRUMENT_SYMBOL
 
 
 EVENT_LOG = 'eLog'                          #Log Event
@@ -12,6 +14,7 @@ EVENT_TRADE = 'eTrade'                      #Trade Event
 EVENT_BUY = 'eBuy'                          #Buy Event
 EVENT_SELL = 'eSell'                        #Sell Event
 EVENT_CANCEL = 'eCancel'                    #Cancel Event
+EVENT_ORDER_BATCH = 'eOrderBatch'          #Batch of Buy/Sell Orders Event
 EVENT_POSITION = 'ePosition'               #Position Query Event
 EVENT_STATUS = 'eStatus'                   #Order Status Event
 EVENT_ACCOUNT = 'eAccount'                 #Account Query Event
@@ -19,10 +22,23 @@ EVENT_PROFIT_CHANGED = 'eProfitChanged'    #Profit Event
 
 
 class StrategyEvent:
+    __slots__ = ("type_", "even_param_")
+
     def __init__(self, type_=None, even_param_=None):
         self.type_ = type_
         self.even_param_ = even_param_
 
+    @property
+    def even_param(self):
+        """
+        Alias of even_param_ used by the strategy event handlers.
+        """
+        return self.even_param_
+
+    @even_param.setter
+    def even_param(self, even_param):
+        self.even_param_ = even_param
+
     def clear(self):
         """
         Delete unreferenced source.
@@ -30,5 +46,191 @@ class StrategyEvent:
         self.even_param_.clear()
 
 
-class EventEngine(ABC):
-    pass
+class EventEngine:
+    """
+    In-process event engine.
+    Events are put in a bounded FIFO queue and dispatched in batches by a dedicated thread to the handlers registered
+    for their event type. Handler look-up is a single dict access keyed by the EVENT_* string.
+
+    In conflation mode, a queued EVENT_MARKETDATA event is dropped when a newer one of the same symbol is queued
+    before its dispatch, so bursts of market data are processed on the latest prices only. Ticks keep their order
+    relative to the other events, which are never dropped.
+    """
+
+    def __init__(self, maxsize=65536, batch_size=512, logger=None, conflate=False):
+        """
+        :param maxsize: int. Max number of queued events. put() blocks when the queue is full.
+        :param batch_size: int. Max number of events taken from the queue per lock acquisition.
+        :param logger: Logger for handler exceptions. Exceptions are only counted if None.
+        :param conflate: bool. If queued market data events are conflated by symbol.
+        """
+        self.logger = logger
+        self._maxsize = maxsize
+        self._batch_size = batch_size
+        self._conflate = conflate
+        self._latest_ticks = {}  # symbol -> latest queued EVENT_MARKETDATA event, in conflation mode
+        self._process_queued = self._process_conflated if conflate else self.process
+        self._queue = deque()
+        self._lock = Lock()
+        self._not_empty = Condition(self._lock)
+        self._not_full = Condition(self._lock)
+        self._handlers = {}  # event type -> tuple of handlers, replaced on (un)register
+        self._handlers_lock = Lock()
+        self._active = False
+        self._thread = None
+
+        # Counters
+        self.n_put = 0
+        self.n_processed = 0
+        self.n_errors = 0
+        self.n_conflated = 0  # market data events dropped by conflation
+        self.n_conflated_by_symbol = {}
+
+    # --- Handlers registration --- #
+
+    def register(self, type_, handler):
+        """
+        Register a handler for an event type. Registering the same handler twice has no effect.
+        """
+        with self._handlers_lock:
+            handlers = self._handlers.get(type_, ())
+            if handler not in handlers:
+                self._handlers[type_] = handlers + (handler,)
+
+    def unregister(self, type_, handler):
+        """
+        Unregister a handler for an event type.
+        """
+        with self._handlers_lock:
+            handlers = tuple(h for h in self._handlers.get(type_, ()) if h != handler)
+            if handlers:
+                self._handlers[type_] = handlers
+            else:
+                self._handlers.pop(type_, None)
+
+    # --- Engine control --- #
+
+    def start(self):
+        """
+        Start the dispatch thread.
+        """
+        if self._active:
+            return
+        self._active = True
+        self._thread = Thread(target=self._run, name='EventEngine')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the dispatch thread after the queued events are processed.
+        """
+        if not self._active:
+            return
+        with self._lock:
+            self._active = False
+            self._not_empty.notify()
+        if self._thread is not current_thread():
+            self._thread.join()
+        self._thread = None
+
+    @property
+    def active(self):
+        return self._active
+
+    @property
+    def conflate(self):
+        return self._conflate
+
+    def qsize(self):
+        return len(self._queue)
+
+    # --- Events processing --- #
+
+    def put(self, event):
+        """
+        Put an event in the queue.
+        Blocks while the queue is full, except when called from the dispatch thread to avoid dead locks.
+        """
+        queue = self._queue
+        with self._lock:
+            if len(queue) >= self._maxsize and self._thread is not current_thread():
+                while len(queue) >= self._maxsize and self._active:
+                    self._not_full.wait()
+            queue.append(event)
+            self.n_put += 1
+            if self._conflate and event.type_ == EVENT_MARKETDATA:
+                self._latest_ticks[event.even_param_.get(INSTRUMENT_SYMBOL)] = event
+            if len(queue) == 1:
+                self._not_empty.notify()
+
+    def process(self, event):
+        """
+        Dispatch an event to its handlers in the calling thread.
+        """
+        for handler in self._handlers.get(event.type_, ()):
+            try:
+                handler(event)
+            except Exception:
+                self.n_errors += 1
+                if self.logger is not None:
+                    self.logger.error("EventEngine: handler {} failed on event {}".format(handler, event.type_),
+                                      exc_info=True)
+        self.n_processed += 1
+
+    def _process_conflated(self, event):
+        """
+        Dispatch a queued event, unless it is market data superseded by a newer queued one of the same symbol.
+        """
+        if event.type_ == EVENT_MARKETDATA:
+            symbol = event.even_param_.get(INSTRUMENT_SYMBOL)
+            with self._lock:
+                latest = self._latest_ticks.get(symbol)
+                if latest is event:
+                    del self._latest_ticks[symbol]
+                elif latest is not None:
+                    self.n_conflated += 1
+                    self.n_conflated_by_symbol[symbol] = self.n_conflated_by_symbol.get(symbol, 0) + 1
+                    return
+        self.process(event)
+
+    def process_pending(self):
+        """
+        Dispatch all queued events, including those put by handlers meanwhile, in the calling thread.
+        Used when the engine is driven synchronously without the dispatch thread, e.g. in backtests.
+        :return: int. Number of events processed.
+        """
+        n = 0
+        queue = self._queue
+        process = self._process_queued
+        while True:
+            with self._lock:
+                if not queue:
+                    break
+                event = queue.popleft()
+                self._not_full.notify()
+            process(event)
+            n += 1
+        return n
+
+    def stats(self):
+        """
+        :return: dict of engine counters.
+        """
+        return {'put': self.n_put, 'processed': self.n_processed, 'errors': self.n_errors, 'queued': len(self._queue),
+                'conflated': self.n_conflated}
+
+    def _run(self):
+        queue = self._queue
+        batch_size = self._batch_size
+        process = self._process_queued
+        while True:
+            with self._lock:
+                while not queue and self._active:
+                    self._not_empty.wait()
+                if not queue:  # stopped and drained
+                    break
+                batch = [queue.popleft() for _ in range(min(len(queue), batch_size))]
+                self._not_full.notify_all()
+            for event in batch:
+                process(event)
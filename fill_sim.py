@@ -0,0 +1,338 @@
+"""
+Fill simulator with queue positions, partial fills and order latencies, a stand-in for BacktestBroker when tuning
+AdaptiveOrder modes and retries:
+
+    backtester = Backtester(SwingStrategy, params, 'rb2101', 1.0, 10,
+                            broker_factory=partial(QueueBroker, ack_latency=0.05, cancel_latency=0.05))
+
+Queue positions are estimated from the best bid/ask volumes of the ticks, which do not include the simulated orders.
+
+Parameter sweeps driving orders directly, e.g. AdaptiveOrder retries without a strategy, use LeanQueueBroker, which
+matches orders by the same rules without the per-order events and portfolio bookkeeping of a backtest.
+"""
+
+
+from collections import deque
+from constants import *
+from clock import parse_time
+from backtest import BacktestBroker, SimOrder
+
+
+PRICE_SCALE = 10**8  # Prices are matched as integer multiples of 1 / PRICE_SCALE
+NO_KEY = float('-inf')
+
+
+def price_key(price):
+    """
+    :return: int. Positive price as a matching key, equal for prices equal up to float rounding.
+    """
+    return int(price * PRICE_SCALE + 0.5)
+
+
+class QueueOrder(SimOrder):
+    """
+    An order of QueueBroker, with its book side and queue position.
+    """
+    __slots__ = ("side", "key", "queue_ahead", "ack_time", "booked")
+
+    def __init__(self, order_id, action, direction, price, qty, create_time, frozen_cash=0.0):
+        # Fields of SimOrder assigned inline, orders being created at sweep rates
+        self.order_id = order_id
+        self.action = action
+        self.direction = direction
+        self.long_short = int(direction == DIRECTION_SHORT)
+        self.price = price
+        self.qty = qty
+        self.filled_qty = 0
+        self.create_time = create_time
+        self.frozen_cash = frozen_cash
+        self.side = int((action == BUY) != (direction == DIRECTION_LONG))  # 0 bid side (buy long, sell short), 1 ask
+        # Signed price_key(price), so that higher keys are more aggressive
+        self.key = (1 - 2 * self.side) * int(price * PRICE_SCALE + 0.5)
+        self.queue_ahead = None  # volume ahead in queue, None until known
+        self.ack_time = None  # time in ns the order reaches the book
+        self.booked = False
+
+    def __repr__(self):
+        return "QueueOrder {}: {} {} price={} qty={} filled_qty={} queue_ahead={} booked={}".format(
+            self.order_id, ('buy', 'sell')[int(self.action == SELL)], self.direction, self.price, self.qty,
+            self.filled_qty, self.queue_ahead, self.booked)
+
+
+class QueueBroker(BacktestBroker):
+    """
+    Simulated exchange filling limit orders by their queue position at their price.
+
+    Orders reach the book ack_latency seconds after their submission, and cancels take effect cancel_latency seconds
+    after their request, so orders can be filled while their cancel is in flight. Latencies are counted in tick times:
+    an order reaches the book, or is cancelled, at the first tick at or after its due time, and is matched from the
+    next tick on. On its side of the book, an order (buy long and sell short orders on the bid side, the others on
+    the ask side):
+    - fills at the opposite best price, up to its volume, if it is marketable when it reaches the book.
+    - queues behind the best volume if it joins at the best price, is first if it improves the best price, and gets
+      its queue position when its price becomes the best if it joins behind the best price.
+    - moves up the queue as the best volume at its price decreases, and is filled by the decrease beyond its queue
+      ahead, so partially. Its queue ahead never exceeds the best volume at its price.
+    - is filled in full by a trade at its price when first in queue, and by a trade through its price or the opposite
+      best price reaching it.
+    Fills are at the order price but for marketable orders. Ticks without volumes (0) fill orders on trades at their
+    price as BacktestBroker does.
+    """
+
+    order_cls = QueueOrder
+
+    def __init__(self, event_engine, portfolio, symbol, instrument_id, ack_latency=0.0, cancel_latency=0.0):
+        """
+        :param ack_latency: float. Seconds between the submission of an order and its arrival in the book.
+        :param cancel_latency: float. Seconds between the request of a cancel and its effect.
+        """
+        super().__init__(event_engine, portfolio, symbol, instrument_id)
+        self.ack_latency = ack_latency
+        self.cancel_latency = cancel_latency
+        self.now_ns = 0
+        self.n_partial_fills = 0
+        self._ack_ns = int(round(ack_latency * 10**9))
+        self._cancel_ns = int(round(cancel_latency * 10**9))
+        self._acks = deque()  # submitted orders not in the book yet, by ack time
+        self._cancels = deque()  # (due time, order ids) of cancels in flight, by due time
+        self._levels = ({}, {})  # bid/ask side: signed price key -> booked orders in queue order
+        self._max_keys = [NO_KEY, NO_KEY]  # bid/ask side: most aggressive booked key
+        self._last_best = [(None, 0), (None, 0)]  # bid/ask side: signed best key and volume of the previous tick
+
+    def __repr__(self):
+        return "QueueBroker: n_orders={} n_trades={} n_partial_fills={} n_cancels={} booked={} in_flight={}".format(
+            self.n_orders, self.n_trades, self.n_partial_fills, self.n_cancels,
+            sum(len(orders) for levels in self._levels for orders in levels.values()), len(self._acks))
+
+    def submit(self, event):
+        result = super().submit(event)
+        if result[ORDER_ACCEPT_FLAG]:
+            order = self.orders[self._next_order_id - 1]
+            order.ack_time = self.now_ns + self._ack_ns
+            self._acks.append(order)
+        return result
+
+    def cancel(self, cancel_param):
+        """
+        Request the cancel of resting orders. EVENT_STATUS events are put when cancels take effect.
+        :param cancel_param: dict. Parameters of EVENT_CANCEL.
+        """
+        orders = self._orders_to_cancel(cancel_param)
+        if not orders:
+            return
+        if self._cancel_ns:
+            self._cancels.append((self.now_ns + self._cancel_ns, [order.order_id for order in orders]))
+        else:
+            for order in orders:
+                self._cancel(order)
+
+    def _cancel(self, order):
+        super()._cancel(order)
+        if order.booked:
+            self._unbook(order)
+
+    def _fill(self, order, price, qty):
+        if qty < order.qty - order.filled_qty:
+            self.n_partial_fills += 1
+        super()._fill(order, price, qty)
+        if order.filled_qty == order.qty and order.booked:
+            self._unbook(order)
+
+    def _unbook(self, order):
+        levels = self._levels[order.side]
+        orders = levels[order.key]
+        orders.remove(order)
+        if not orders:
+            del levels[order.key]
+            if order.key == self._max_keys[order.side]:
+                self._max_keys[order.side] = max(levels) if levels else NO_KEY
+        order.booked = False
+
+    def on_tick(self, tick_time, price, bid=None, ask=None, bid_volume=0, ask_volume=0):
+        """
+        Take the cancels due at a new tick, match the booked orders with its last price and quotes, then book the
+        orders due, which are matched from the next tick on.
+        """
+        self.tick_time = tick_time
+        now = self.now_ns = tick_time if tick_time.__class__ is int else parse_time(tick_time)
+        if bid is None:
+            bid = ask = price
+        cancels = self._cancels
+        if cancels and cancels[0][0] <= now:
+            self._take_cancels(now)
+        acks = self._acks
+        max_keys = self._max_keys
+        last_best = self._last_best
+        if not acks and max_keys[0] is NO_KEY and max_keys[1] is NO_KEY:  # nothing to match
+            last_best[0] = last_best[1] = (None, 0)
+            return
+        last_key = int(price * PRICE_SCALE + 0.5)
+        bid_key = int(bid * PRICE_SCALE + 0.5)
+        ask_key = int(ask * PRICE_SCALE + 0.5)
+        if max_keys[0] >= bid_key or max_keys[0] >= last_key:
+            self._match(0, last_key, bid_key, bid_volume, ask_key)
+        if max_keys[1] >= -ask_key or max_keys[1] >= -last_key:
+            self._match(1, -last_key, -ask_key, ask_volume, -bid_key)
+        if acks and acks[0].ack_time <= now:
+            self._take_acks(now, bid, ask, bid_key, ask_key, bid_volume, ask_volume)
+        last_best[0] = (bid_key, bid_volume)
+        last_best[1] = (-ask_key, ask_volume)
+
+    def _take_cancels(self, now):
+        cancels = self._cancels
+        while cancels and cancels[0][0] <= now:
+            for order_id in cancels.popleft()[1]:
+                order = self.orders.get(order_id)
+                if order is not None:
+                    self._cancel(order)
+
+    def _take_acks(self, now, bid, ask, bid_key, ask_key, bid_volume, ask_volume):
+        acks = self._acks
+        orders = self.orders
+        while acks and acks[0].ack_time <= now:
+            order = acks.popleft()
+            if order.order_id not in orders:  # cancelled in flight
+                continue
+            key = order.key
+            if order.side == 0:
+                if ask_key <= key:  # marketable
+                    remaining = order.qty - order.filled_qty
+                    self._fill(order, ask, remaining if ask_volume <= 0 or remaining < ask_volume else ask_volume)
+                    order.queue_ahead = 0
+                elif key > bid_key:
+                    order.queue_ahead = 0
+                elif key == bid_key:
+                    order.queue_ahead = bid_volume
+            else:
+                if -bid_key <= key:  # marketable
+                    remaining = order.qty - order.filled_qty
+                    self._fill(order, bid, remaining if bid_volume <= 0 or remaining < bid_volume else bid_volume)
+                    order.queue_ahead = 0
+                elif key > -ask_key:
+                    order.queue_ahead = 0
+                elif key == -ask_key:
+                    order.queue_ahead = ask_volume
+            if order.order_id in orders:  # book it
+                levels = self._levels[order.side]
+                level = levels.get(key)
+                if level is None:
+                    levels[key] = [order]
+                    if key > self._max_keys[order.side]:
+                        self._max_keys[order.side] = key
+                else:
+                    level.append(order)
+                order.booked = True
+
+    def _match(self, side, last_key, best_key, best_volume, opposite_key):
+        """
+        Match the booked orders of one side with a tick. Keys are signed, higher keys being more aggressive.
+        """
+        levels = self._levels[side]
+        last_best_key, last_best_volume = self._last_best[side]
+        decrease = last_best_volume - best_volume if last_best_key == best_key else 0
+        low_key = best_key if best_key < last_key else last_key
+        fill = self._fill
+        for key in tuple(levels):
+            if key < low_key:
+                continue
+            if last_key < key or opposite_key <= key:  # traded through or crossed
+                for order in list(levels[key]):
+                    fill(order, order.price, order.qty - order.filled_qty)
+                continue
+
+            filled = 0  # volume of the decrease beyond the queue ahead already filled to orders of the level
+            first = True
+            for order in list(levels[key]):
+                queue_ahead = ahead = order.queue_ahead
+                if key > best_key:
+                    ahead = 0
+                elif key == best_key:
+                    if ahead is None:
+                        ahead = best_volume
+                    else:
+                        if decrease > 0:
+                            ahead -= decrease
+                        if ahead > best_volume:
+                            ahead = best_volume
+                if ahead is not None and ahead < 0:
+                    qty = order.qty - order.filled_qty
+                    if qty > -ahead - filled:
+                        qty = -ahead - filled
+                    ahead = 0
+                    if qty > 0:
+                        filled += qty
+                        fill(order, order.price, qty)
+                elif ahead == 0 == queue_ahead and first and last_key == key:  # a trade at its price hit it
+                    fill(order, order.price, order.qty - order.filled_qty)
+                order.queue_ahead = ahead
+                first = False
+
+
+class LeanQueueBroker(QueueBroker):
+    """
+    QueueBroker for parameter sweeps driving orders directly, e.g. AdaptiveOrder modes and retries, without a
+    strategy. Orders are placed and cancelled by id with place() and cancel_order() instead of submit() and cancel(),
+    and fills and final statuses are reported to callbacks instead of EVENT_TRADE and EVENT_STATUS events, with no
+    portfolio bookkeeping. Orders are matched by the rules of QueueBroker.
+    """
+
+    def __init__(self, ack_latency=0.0, cancel_latency=0.0, on_fill=None, on_status=None):
+        """
+        :param on_fill: Callable (order, price, qty) called on fills. No callback if None.
+        :param on_status: Callable (order, ORDER_CLOSED_ALIAS or ORDER_CANCELLED) called when an order is filled in
+            full or cancelled. No callback if None.
+        """
+        super().__init__(None, None, None, None, ack_latency, cancel_latency)
+        self.on_fill = on_fill
+        self.on_status = on_status
+        self.position_qty = [0, 0]  # long/short position qty of the fills
+
+    def place(self, action, direction, price, qty):
+        """
+        Place a limit order, which reaches the book ack_latency seconds later.
+        :return: int. Order id.
+        """
+        order_id = self._next_order_id
+        order = QueueOrder(order_id, action, direction, price, qty, self.tick_time)
+        order.ack_time = self.now_ns + self._ack_ns
+        self._next_order_id = order_id + 1
+        self.n_orders += 1
+        self.orders[order_id] = order
+        self._acks.append(order)
+        return order_id
+
+    def cancel_order(self, order_id):
+        """
+        Request the cancel of an order, taking effect cancel_latency seconds later. No effect if it is not resting.
+        """
+        order = self.orders.get(order_id)
+        if order is None:
+            return
+        if self._cancel_ns:
+            self._cancels.append((self.now_ns + self._cancel_ns, (order_id,)))
+        else:
+            self._cancel(order)
+
+    def _cancel(self, order):
+        del self.orders[order.order_id]
+        self.n_cancels += 1
+        if order.booked:
+            self._unbook(order)
+        if self.on_status is not None:
+            self.on_status(order, ORDER_CANCELLED)
+
+    def _fill(self, order, price, qty):
+        remaining = order.qty - order.filled_qty
+        if qty < remaining:
+            self.n_partial_fills += 1
+        order.filled_qty += qty
+        self.n_trades += 1
+        self.position_qty[order.long_short] += qty if order.action == BUY else -qty
+        if self.on_fill is not None:
+            self.on_fill(order, price, qty)
+        if qty == remaining:
+            del self.orders[order.order_id]
+            if order.booked:
+                self._unbook(order)
+            if self.on_status is not None:
+                self.on_status(order, ORDER_CLOSED_ALIAS)
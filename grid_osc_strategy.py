@@ -5,10 +5,16 @@ Definition of the GridOsc trading logic, which constitutes the basic components
 
 from math import ceil, floor
 from constants import *
-from strategy import INIT, REQ, SPLIT
+from strategy import INFINITY, INIT, REQ, SPLIT
 from strategy import calc_order_params, update_position_avg_price_2way
 
 
+# Block sizes of the price search of GridOsc.evaluate_ticks()
+MIN_BLOCK_SIZE = 16  # Blocks of this size that may trigger are visited price by price
+MAX_BLOCK_SIZE = 1024
+BLOCK_SPLIT = 4  # Number of sub-blocks a block that may trigger is split into
+
+
 class GridOsc:
     """
     Oscillatory trading on a pre-defined price grid. Support trailing buy/sell.
@@ -93,6 +99,59 @@ class GridOsc:
                     self.tag, self.n_grids, self.bounds, self.ext, self.qa, self.qn, self.state, self.last_order_price,
                     self.peak, self._position_qty, self._cma_price, self._k, self._k_profit, self._k_profit_th)
 
+    @property
+    def position_qty(self):
+        """
+        :return: int. Position quantity of the zone. >0: long, <0: short.
+        """
+        return self._position_qty
+
+    @property
+    def cma_price(self):
+        """
+        :return: float. Cumulative moving average price of the zone position.
+        """
+        return self._cma_price
+
+    @property
+    def k(self):
+        """
+        :return: int. Volume offset scale of the zone orders.
+        """
+        return self._k
+
+    @property
+    def k_profit(self):
+        """
+        :return: float. Profit accumulated since the last change of k.
+        """
+        return self._k_profit
+
+    def snapshot(self):
+        """
+        :return: tuple. Zone parameters and states, restored by from_snapshot().
+        """
+        return (self.tag, self.n_grids, self.ph, tuple(self.bounds), self.ext, self.pt, tuple(self.qa), tuple(self.qn),
+                self.order_qty_scaling, tuple(self.position_qty_caps), tuple(self.order_qty_caps), self.state,
+                self.last_order_price, tuple(self.peak), self._position_qty, self._cma_price, self._k, self._k_profit,
+                self._k_profit_th)
+
+    @classmethod
+    def from_snapshot(cls, logger, contract, snapshot):
+        """
+        :param snapshot: tuple returned by snapshot().
+        :return: GridOsc in the state of the snapshot.
+        """
+        zone = cls.__new__(cls)
+        zone.logger = logger
+        zone.contract = contract
+        (zone.tag, zone.n_grids, zone.ph, bounds, zone.ext, zone.pt, qa, qn, zone.order_qty_scaling, position_qty_caps,
+         order_qty_caps, zone.state, zone.last_order_price, peak, zone._position_qty, zone._cma_price, zone._k,
+         zone._k_profit, zone._k_profit_th) = snapshot
+        zone.bounds, zone.qa, zone.qn, zone.peak = list(bounds), list(qa), list(qn), list(peak)
+        zone.position_qty_caps, zone.order_qty_caps = list(position_qty_caps), list(order_qty_caps)
+        return zone
+
     def _r(self, price):
         return round(price, self.contract.decimal)
 
@@ -101,6 +160,9 @@ class GridOsc:
         self.peak = [last_order_price, last_order_price]
 
     def _zone_expand(self, price):
+        """
+        :return: bool. If the zone expanded to price.
+        """
         for direction in (0, 1):
             d = 1 - 2 * direction
             if self.ext[direction] and d * (price - self.bounds[direction]) < 0:
@@ -109,16 +171,19 @@ class GridOsc:
                 self.bounds[direction] = self._r(self.bounds[direction] - d * n_grids_ext * self.ph)
                 self._k_profit_th = (self.bounds[1] - self.bounds[0]) * (
                     self.n_grids * min(self.qa) + self._k * min(self.qn)) * self.contract.unit
-                break
+                return True
+        return False
 
     def on_tick_update(self, price):
+        """
+        :return: bool. If the zone expanded.
+        """
         # Update peak prices
         self.peak[0] = min(self.peak[0], price)
         self.peak[1] = max(self.peak[1], price)
 
         # Expand zone if necessary
-        if any(self.ext):
-            self._zone_expand(price)
+        return any(self.ext) and self._zone_expand(price)
 
     def on_tick_trade(self, trade_price, position_long, position_short):
         """
@@ -134,28 +199,33 @@ class GridOsc:
 
         # Check if order conditions are met in either long or short direction.
         # 1. peak to last trade price > h0;  2. trailing > pt;  3. last price and last order price in different grids.
+        # Price differences are compared in integer ticks.
         position_qty = position_long - position_short
         pos_qty_caps = (self.position_qty_caps[1] - position_qty, position_qty - self.position_qty_caps[0])
+        to_ticks = self.contract.to_ticks
+        ph_ticks = self.contract.to_ticks_ceil(self.ph)
+        pt_ticks = self.contract.to_ticks_ceil(self.pt)
         for direction in (0, 1):
             peak = self.peak[direction]
             d = 1 - 2 * direction
-            if self._r(d * (self.last_order_price - trade_price)) >= self.ph \
-                    and self._r(d * (trade_price - peak)) >= self.pt:
+            if to_ticks(d * (self.last_order_price - trade_price)) >= ph_ticks \
+                    and to_ticks(d * (trade_price - peak)) >= pt_ticks:
                 scale = int(floor(d * (self.last_order_price - trade_price) / self.ph))
                 if not self.order_qty_scaling:
                     scale = min(1, scale)
                 order_qty = int(scale > 0) * (scale * self.qa[direction] + self._k * self.qn[direction])
-                self.logger.debug("{}: {} last_order_price={} peak={} trade_price={} scale={} k={} order_qty={}".format(
-                    self.tag, ('long', 'short')[direction], self.last_order_price, peak, trade_price, scale, self._k,
-                    order_qty))
+                self.logger.debug("%s: %s last_order_price=%s peak=%s trade_price=%s scale=%s k=%s order_qty=%s",
+                                  self.tag, ('long', 'short')[direction], self.last_order_price, peak, trade_price,
+                                  scale, self._k, order_qty)
                 order_qty = min(order_qty, pos_qty_caps[direction])
-                self.logger.debug("{}: {} pos={}({},{}) pos_cap_{}={} qty_cap={} updated order_qty={}".format(
-                    self.tag, ('long', 'short')[direction], position_qty, position_long, position_short,
-                    ('max', 'min')[direction], (self.position_qty_caps[1], self.position_qty_caps[0])[direction],
-                    pos_qty_caps[direction], order_qty))
+                self.logger.debug("%s: %s pos=%s(%s,%s) pos_cap_%s=%s qty_cap=%s updated order_qty=%s", self.tag,
+                                  ('long', 'short')[direction], position_qty, position_long, position_short,
+                                  ('max', 'min')[direction],
+                                  (self.position_qty_caps[1], self.position_qty_caps[0])[direction],
+                                  pos_qty_caps[direction], order_qty)
                 order_qty = min(order_qty, self.order_qty_caps[direction])
-                self.logger.debug("{}: {} order_qty_cap={} updated order_qty={}".format(
-                    self.tag, ('long', 'short')[direction], self.order_qty_caps[direction], order_qty))
+                self.logger.debug("%s: %s order_qty_cap=%s updated order_qty=%s", self.tag,
+                                  ('long', 'short')[direction], self.order_qty_caps[direction], order_qty)
                 if order_qty > 0:  # Make order parameters list only if order qty > 0.
                     order_params_list, position_long, position_short, is_order_split = calc_order_params(
                         (BUY, SELL)[direction],
@@ -184,8 +254,11 @@ class GridOsc:
         self._update_last_order_price(order_price)
 
     def on_trade_update(self, trade_action, trade_direction, trade_price, trade_qty):
-        self.logger.debug("{}: trade update Begin: position_qty={} cma_price={} k={} k_profit={} k_profit_th={}".format(
-            self.tag, self._position_qty, self._cma_price, self._k, self._k_profit, self._k_profit_th))
+        """
+        :return: float. Realized gain of the trade on the zone position.
+        """
+        self.logger.debug("%s: trade update Begin: position_qty=%s cma_price=%s k=%s k_profit=%s k_profit_th=%s",
+                          self.tag, self._position_qty, self._cma_price, self._k, self._k_profit, self._k_profit_th)
         self._cma_price, self._position_qty, realized_gain = update_position_avg_price_2way(
             self._cma_price, self._position_qty, trade_action, trade_direction, trade_price, trade_qty)
         self._k_profit += realized_gain * self.contract.unit
@@ -194,6 +267,135 @@ class GridOsc:
             self._k_profit = 0.0
             self._k_profit_th += (self.bounds[1] - self.bounds[0]) * min(self.qn) * self.contract.unit
         self.logger.debug(
-            "{}: trade update End: unscaled_gain={} position_qty={} cma_price={} k={} k_profit={} k_profit_th={}".
-            format(self.tag, realized_gain, self._position_qty, self._cma_price, self._k, self._k_profit,
-                   self._k_profit_th))
\ No newline at end of file
+            "%s: trade update End: unscaled_gain=%s position_qty=%s cma_price=%s k=%s k_profit=%s k_profit_th=%s",
+            self.tag, realized_gain, self._position_qty, self._cma_price, self._k, self._k_profit, self._k_profit_th)
+        return realized_gain * self.contract.unit
+
+    def _trigger_bounds(self, last_order, ph_ticks, position_long, position_short):
+        """
+        Trigger prices of evaluate_ticks(). A zone waiting for an order submission, or a direction whose orders are
+        capped to 0, never triggers, as on_tick_trade() would return no order.
+        :param last_order: int. Last order price in ticks.
+        :return: Max buy and min sell trigger prices in ticks, -inf and inf for directions which cannot trigger.
+        """
+        if self.state in (REQ, SPLIT):
+            return -INFINITY, INFINITY
+        position_qty = position_long - position_short
+        can_buy = min(self.position_qty_caps[1] - position_qty, self.order_qty_caps[0]) > 0
+        can_sell = min(position_qty - self.position_qty_caps[0], self.order_qty_caps[1]) > 0
+        return (last_order - ph_ticks if can_buy else -INFINITY), (last_order + ph_ticks if can_sell else INFINITY)
+
+    def evaluate_ticks(self, prices, position_long=0, position_short=0):
+        """
+        Batch evaluation of the zone over a sequence of trade prices, for research and backtests of zone configurations.
+        Every order is assumed to be submitted and fully traded at its trigger price before the next price. Between two
+        fills the last order price is fixed, so the prices of a segment cannot trigger an order unless they cross the
+        buy or sell price of the last order and then trail back from their peak. Segments are searched by blocks of
+        prices, doubling in size while they cannot trigger: the min() and max() of a block tell if the block can
+        trigger or expand the zone, in which case it is searched again in smaller blocks, and only peaks are updated
+        from the block extremes otherwise. Prices of the smallest blocks that may trigger are visited one by one, and
+        on_tick_trade is only called on the prices meeting the conditions to size and cap the order. Directions capped
+        to no order are not searched.
+        The result is the same as calling on_tick_update and on_tick_trade on every price. Prices are expected on the
+        tick grid, rounded to the price decimal.
+        :param prices: sequence of float trade prices supporting slicing, e.g. a list or an array.
+        :param position_long: int. Available long position quantity to sell.
+        :param position_short: int. Available short position quantity to sell.
+        :return: list of fills (index, direction, order_qty, peak), position_long, position_short. direction is 0 for a
+        buy and 1 for a sell, peak the price valley or ridge that triggered the order.
+        """
+        contract = self.contract
+        tick = contract.tick
+        to_ticks = contract.to_ticks
+        ph_ticks = contract.to_ticks_ceil(self.ph)
+        pt_ticks = contract.to_ticks_ceil(self.pt)
+        n_prices = len(prices)
+        fills = []
+
+        # Segment state: peaks in ticks and prices, trigger prices in ticks
+        low_price, high_price = self.peak
+        low, high = to_ticks(low_price), to_ticks(high_price)
+        buy_below, sell_above = self._trigger_bounds(to_ticks(self.last_order_price), ph_ticks, position_long,
+                                                     position_short)
+        # Prices beyond these bounds expand the zone
+        low_bound = self.bounds[0] if self.ext[0] else -INFINITY
+        high_bound = self.bounds[1] if self.ext[1] else INFINITY
+
+        start = 0
+        block_size = MIN_BLOCK_SIZE
+        scan_size = MIN_BLOCK_SIZE  # Number of prices visited one by one after a block that may trigger
+        scan_stop = 0
+        while start < n_prices:
+            if start >= scan_stop:
+                block_stop = min(start + block_size, n_prices)
+                block = prices[start:block_stop]
+                block_min, block_max = min(block), max(block)
+                t_min, t_max = int(round(block_min / tick)), int(round(block_max / tick))
+                if low_bound <= block_min and block_max <= high_bound and \
+                        (t_min > buy_below or t_max - min(low, t_min) < pt_ticks) and \
+                        (t_max < sell_above or max(high, t_max) - t_min < pt_ticks):
+                    # No price of the block can trigger or expand the zone: only update the peaks.
+                    if t_min < low:
+                        low, low_price = t_min, block_min
+                    if t_max > high:
+                        high, high_price = t_max, block_max
+                    start = block_stop
+                    if block_size < MAX_BLOCK_SIZE:
+                        block_size *= 2
+                    scan_size = MIN_BLOCK_SIZE
+                    continue
+                if block_size > MIN_BLOCK_SIZE:  # Search the start of the block again in smaller blocks
+                    block_size = max(MIN_BLOCK_SIZE, block_size // BLOCK_SPLIT)
+                    continue
+                # Visit the prices one by one, over more prices after each block that may trigger in a row, so that
+                # blocks are seldom checked in vain where orders trigger every few prices.
+                scan_stop = min(start + scan_size, n_prices)
+                if scan_size < MAX_BLOCK_SIZE:
+                    scan_size *= 2
+
+            for index in range(start, scan_stop):
+                price = prices[index]
+                t = int(round(price / tick))
+                if t < low:
+                    low, low_price = t, price
+                elif t > high:
+                    high, high_price = t, price
+                if not low_bound <= price <= high_bound:
+                    self._zone_expand(price)
+                    low_bound = self.bounds[0] if self.ext[0] else -INFINITY
+                    high_bound = self.bounds[1] if self.ext[1] else INFINITY
+                if (t <= buy_below and t - low >= pt_ticks) or (t >= sell_above and high - t >= pt_ticks):
+                    break
+            else:
+                start = scan_stop
+                continue
+            start = index + 1
+
+            # Order conditions met: sync the zone and size the order
+            self.peak = [low_price, high_price]
+            order_params_list, position_long, position_short = self.on_tick_trade(price, position_long,
+                                                                                  position_short)
+            if not order_params_list:  # Capped or waiting for a submission
+                continue
+            direction = int(t >= sell_above)
+            fills.append((index, direction, sum(order_params['qty'] for order_params in order_params_list),
+                          (low_price, high_price)[direction]))
+            for order_params in order_params_list:
+                qty = order_params['qty']
+                if not qty:
+                    continue
+                self.on_buy_sell_success(price)
+                self.on_trade_update(int(order_params['action'] == SELL),
+                                     int(order_params['direction'] == DIRECTION_SHORT), price, qty)
+                if order_params['action'] == BUY:  # Opening orders add to the available positions
+                    if order_params['direction'] == DIRECTION_LONG:
+                        position_long += qty
+                    else:
+                        position_short += qty
+            low = high = t
+            low_price = high_price = price
+            buy_below, sell_above = self._trigger_bounds(t, ph_ticks, position_long, position_short)
+            block_size = MIN_BLOCK_SIZE
+
+        self.peak = [low_price, high_price]
+        return fills, position_long, position_short
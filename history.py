@@ -0,0 +1,347 @@
+"""
+Compact history of the orders and fills of a strategy session, for post-trade analysis.
+
+Orders and fills are kept as fixed-size rows of typed columns (array.array), struct-of-arrays, grown by chunks of
+CHUNK_SIZE rows so that growing never copies the rows already recorded. A fill takes 39 bytes and an order 52 bytes,
+instead of the few hundred bytes of TradeRecord and OrderRecord objects, so a session of 100k fills and orders keeps
+under 10 MB. Tags and order statuses are stored as small integer codes.
+
+    strategy.trade_history = TradeHistory()
+    ...
+    history = strategy.trade_history
+    osc_fills = history.fills(tag='Osc', start_ns=start_ns, stop_ns=stop_ns)
+    osc_qty = sum(fill['qty'] for fill in osc_fills)
+    fill_prices = history.fill_column('price')  # array('d') of all fill prices
+"""
+
+
+from array import array
+from bisect import bisect_left
+from constants import ORDER_OPEN
+from clock import WALL_CLOCK
+
+
+CHUNK_SIZE = 4096  # rows per chunk
+
+# Columns of fills: name, array typecode
+FILL_FIELDS = (
+    ('time', 'q'),  # ns of the fill on the history clock
+    ('trade_id', 'q'),
+    ('order_id', 'q'),
+    ('price', 'd'),
+    ('qty', 'i'),
+    ('tag', 'H'),  # tag code
+    ('side', 'B')  # buy_sell | long_short << 1 of the order
+)
+
+# Columns of orders
+ORDER_FIELDS = (
+    ('time', 'q'),  # ns of the order submission on the history clock
+    ('finish_time', 'q'),  # ns of the final order status, 0 while the order is open
+    ('order_id', 'q'),
+    ('price', 'd'),
+    ('qty', 'i'),
+    ('filled_qty', 'i'),
+    ('filled_price', 'd'),
+    ('tag', 'H'),
+    ('side', 'B'),
+    ('status', 'B')  # order status code
+)
+
+
+def _side(order):
+    """
+    :return: int. Side code of an OrderRecord, buy_sell | long_short << 1. Unknown action or direction count as 0.
+    """
+    return (order.buy_sell or 0) | (order.long_short or 0) << 1
+
+
+class CodeTable:
+    """
+    Small integer codes of the values of a column, e.g. order tags, in order of first use.
+    """
+    __slots__ = ("_codes", "values")
+
+    def __init__(self):
+        self._codes = {}  # value -> code
+        self.values = []  # code -> value
+
+    def __repr__(self):
+        return "CodeTable: {}".format(self.values)
+
+    def encode(self, value):
+        """
+        :return: int. Code of value, a new code if value was never encoded.
+        """
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value):
+        """
+        :return: int. Code of value, None if value was never encoded.
+        """
+        return self._codes.get(value)
+
+
+class ChunkedColumns:
+    """
+    Append-only table of fixed-size rows stored as one typed array per column, grown by preallocated chunks.
+    """
+    __slots__ = ("names", "typecodes", "chunk_size", "_index", "_chunks", "_n_rows")
+
+    def __init__(self, fields, chunk_size=CHUNK_SIZE):
+        """
+        :param fields: tuple of (column name, array typecode).
+        :param chunk_size: int. Number of rows per chunk.
+        """
+        self.names = tuple(name for name, _ in fields)
+        self.typecodes = tuple(typecode for _, typecode in fields)
+        self.chunk_size = chunk_size
+        self._index = {name: i for i, name in enumerate(self.names)}  # column name -> column position
+        self._chunks = []  # list of chunks, a chunk being a list of one array per column
+        self._n_rows = 0
+
+    def __repr__(self):
+        return "ChunkedColumns: columns={} n_rows={} n_chunks={}".format(self.names, self._n_rows, len(self._chunks))
+
+    def __len__(self):
+        return self._n_rows
+
+    @property
+    def nbytes(self):
+        """
+        :return: int. Bytes allocated to the column arrays.
+        """
+        return sum(column.itemsize * len(column) for chunk in self._chunks for column in chunk)
+
+    def append(self, values):
+        """
+        :param values: tuple of the column values of the row.
+        :return: int. Index of the new row.
+        """
+        row = self._n_rows
+        offset = row % self.chunk_size
+        if offset == 0:
+            self._chunks.append([array(typecode, bytes(array(typecode).itemsize * self.chunk_size))
+                                 for typecode in self.typecodes])
+        chunk = self._chunks[-1]
+        for i, value in enumerate(values):
+            chunk[i][offset] = value
+        self._n_rows = row + 1
+        return row
+
+    def get(self, row, name):
+        """
+        :return: Value of a column of a row.
+        """
+        return self._chunks[row // self.chunk_size][self._index[name]][row % self.chunk_size]
+
+    def set(self, row, name, value):
+        """
+        Update a column of a row.
+        """
+        self._chunks[row // self.chunk_size][self._index[name]][row % self.chunk_size] = value
+
+    def row(self, row):
+        """
+        :return: dict. Column values of a row by column name.
+        """
+        chunk = self._chunks[row // self.chunk_size]
+        offset = row % self.chunk_size
+        return {name: column[offset] for name, column in zip(self.names, chunk)}
+
+    def column(self, name, start=0, stop=None):
+        """
+        :return: array. Values of a column in rows start to stop.
+        """
+        stop = self._n_rows if stop is None else min(stop, self._n_rows)
+        i = self._index[name]
+        values = array(self.typecodes[i])
+        chunk_size = self.chunk_size
+        while start < stop:
+            offset = start % chunk_size
+            n = min(chunk_size - offset, stop - start)
+            values.extend(self._chunks[start // chunk_size][i][offset:offset + n])
+            start += n
+        return values
+
+    def find(self, name, value, start=0, stop=None):
+        """
+        :return: list of indexes of the rows from start to stop whose column equals value, in row order.
+        """
+        stop = self._n_rows if stop is None else min(stop, self._n_rows)
+        i = self._index[name]
+        chunk_size = self.chunk_size
+        rows = []
+        for chunk_index in range(start // chunk_size, (stop + chunk_size - 1) // chunk_size):
+            column = self._chunks[chunk_index][i]
+            base = chunk_index * chunk_size
+            offset = max(start - base, 0)
+            end = min(stop - base, chunk_size)
+            while offset < end:
+                try:
+                    offset = column.index(value, offset, end)  # scan in C
+                except ValueError:
+                    break
+                rows.append(base + offset)
+                offset += 1
+        return rows
+
+    def bisect(self, name, value):
+        """
+        :return: int. Index of the first row whose column is not less than value, for a non-decreasing column.
+        """
+        i = self._index[name]
+        chunk_size = self.chunk_size
+        chunks = self._chunks
+        low, high = 0, len(chunks)  # first chunk whose first value is not less than value
+        while low < high:
+            mid = (low + high) // 2
+            if chunks[mid][i][0] < value:
+                low = mid + 1
+            else:
+                high = mid
+        if low == 0:
+            return 0
+        chunk_index = low - 1  # the row is in the previous chunk or first in the found chunk
+        n = min(chunk_size, self._n_rows - chunk_index * chunk_size)
+        return chunk_index * chunk_size + bisect_left(chunks[chunk_index][i], value, 0, n)
+
+
+class TradeHistory:
+    """
+    Append-only history of the orders and fills of a strategy, queryable by order id, tag and time.
+    Strategies record their orders on submission, fills on trades and final order statuses when set as their
+    trade_history. Open orders are updated in place, found by a map of the open order ids only, so memory stays
+    bounded by the rows.
+    """
+
+    def __init__(self, clock=WALL_CLOCK, chunk_size=CHUNK_SIZE):
+        """
+        :param clock: Clock of record times, e.g. the strategy clock driven by tick times in backtests. Record times
+            never go backwards so that they are searched by bisection.
+        :param chunk_size: int. Number of rows per chunk.
+        """
+        self.clock = clock
+        self.fill_rows = ChunkedColumns(FILL_FIELDS, chunk_size)
+        self.order_rows = ChunkedColumns(ORDER_FIELDS, chunk_size)
+        self.tags = CodeTable()
+        self.statuses = CodeTable()
+        self.statuses.encode(ORDER_OPEN)
+        self._open_rows = {}  # order id -> order row of the open orders
+        self._last_ns = 0
+
+    def __repr__(self):
+        return "TradeHistory: n_orders={} n_fills={} n_open={} nbytes={}".format(
+            len(self.order_rows), len(self.fill_rows), len(self._open_rows), self.nbytes)
+
+    @property
+    def nbytes(self):
+        """
+        :return: int. Bytes allocated to the rows.
+        """
+        return self.fill_rows.nbytes + self.order_rows.nbytes
+
+    def _now_ns(self):
+        now_ns = self.clock.now_ns()
+        if now_ns < self._last_ns:
+            return self._last_ns
+        self._last_ns = now_ns
+        return now_ns
+
+    def _order_row(self, order):
+        row = self._open_rows.get(order.order_id)
+        if row is None:  # e.g. orders restored from a snapshot
+            row = self.on_order(order)
+        return row
+
+    def on_order(self, order):
+        """
+        Record a submitted order.
+        :param order: OrderRecord
+        :return: int. Order row.
+        """
+        row = self.order_rows.append((self._now_ns(), 0, order.order_id, order.price, order.qty, order.filled_qty,
+                                      order.filled_price, self.tags.encode(order.tag), _side(order), 0))
+        self._open_rows[order.order_id] = row
+        return row
+
+    def on_fill(self, trade, order):
+        """
+        Record a fill, and update its order.
+        :param trade: TradeRecord
+        :param order: OrderRecord, updated with the fill.
+        """
+        tag = self.tags.encode(order.tag)
+        self.fill_rows.append((self._now_ns(), trade.trade_id, trade.order_id, trade.price, trade.qty, tag,
+                               _side(order)))
+        row = self._order_row(order)
+        self.order_rows.set(row, 'filled_qty', order.filled_qty)
+        self.order_rows.set(row, 'filled_price', order.filled_price)
+
+    def on_order_finished(self, order, status):
+        """
+        Record the final status of an order.
+        :param order: OrderRecord
+        :param status: str. Final order status, e.g. ORDER_CLOSED or ORDER_CANCELLED.
+        """
+        row = self._order_row(order)
+        self.order_rows.set(row, 'finish_time', self._now_ns())
+        self.order_rows.set(row, 'status', self.statuses.encode(status))
+        del self._open_rows[order.order_id]
+
+    def _query(self, rows, order_id, tag, start_ns, stop_ns):
+        start = 0 if start_ns is None else rows.bisect('time', start_ns)
+        stop = len(rows) if stop_ns is None else rows.bisect('time', stop_ns)
+        if tag is not None:
+            code = self.tags.code(tag)
+            if code is None:
+                return []
+            indexes = rows.find('tag', code, start, stop)
+            if order_id is not None:
+                indexes = [i for i in indexes if rows.get(i, 'order_id') == order_id]
+        elif order_id is not None:
+            indexes = rows.find('order_id', order_id, start, stop)
+        else:
+            indexes = range(start, stop)
+        return [rows.row(i) for i in indexes]
+
+    def fills(self, order_id=None, tag=None, start_ns=None, stop_ns=None):
+        """
+        Fills matching all the given criteria, in time order.
+        :param order_id: int. Order id of the fills.
+        :param tag: str. Order tag, e.g. 'Osc' or 'RISKY_OSC'.
+        :param start_ns: int. Min fill time, included.
+        :param stop_ns: int. Max fill time, excluded.
+        :return: list of dicts of the fill columns by name, with tag decoded.
+        """
+        fills = self._query(self.fill_rows, order_id, tag, start_ns, stop_ns)
+        tags = self.tags.values
+        for fill in fills:
+            fill['tag'] = tags[fill['tag']]
+        return fills
+
+    def orders(self, order_id=None, tag=None, start_ns=None, stop_ns=None):
+        """
+        Orders matching all the given criteria, in submission time order.
+        :param start_ns, stop_ns: int. Range of order submission times, start included.
+        :return: list of dicts of the order columns by name, with tag and status decoded.
+        """
+        orders = self._query(self.order_rows, order_id, tag, start_ns, stop_ns)
+        tags, statuses = self.tags.values, self.statuses.values
+        for order in orders:
+            order['tag'] = tags[order['tag']]
+            order['status'] = statuses[order['status']]
+        return orders
+
+    def fill_column(self, name, start_ns=None, stop_ns=None):
+        """
+        :return: array. Values of a fill column, e.g. 'price' or 'qty', of the fills in a time range.
+        """
+        rows = self.fill_rows
+        start = 0 if start_ns is None else rows.bisect('time', start_ns)
+        stop = len(rows) if stop_ns is None else rows.bisect('time', stop_ns)
+        return rows.column(name, start, stop)
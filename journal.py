@@ -0,0 +1,518 @@
+"""
+Append-only journal of the events handled by a strategy, and their deterministic replay.
+
+The journal records the events entering the strategy handlers, and the results of the platform calls the strategy
+rules depend on: order submissions, trade record updates, margin/commission queries, portfolio queries and the clock
+times read by adaptive orders. Frames are a header of frame kind and payload length, then a marshalled payload, or a
+pickled one for values marshal does not support. Frames are encoded in the strategy thread, since event parameters
+may be reused by their sender, and written to the file by a background thread.
+
+Record by hosting the strategy on its platform with RecordingPlatform underneath, e.g.:
+
+    strategy = type('SwingOnPlatform', (recording_class(SwingStrategy), Platform), {})()
+    strategy.event_journal = EventJournal('/var/log/strategy/rb2101.journal')
+    strategy.config(strategy_setting)
+    strategy.start()
+
+and replay with:
+
+    python journal.py /var/log/strategy/rb2101.journal
+
+Replays run the strategy on ReplayPlatform: recorded external events are dispatched again, events put by the
+strategy itself are checked against the recorded ones, and platform calls are answered by their recorded results in
+call order per call name. A ReplayDivergence is raised as soon as the replay departs from the record.
+"""
+
+
+import marshal
+import pickle
+import struct
+from collections import deque
+from threading import Event, Lock, Thread
+from constants import *
+from events import EVENT_MARKETDATA, EVENT_BUY, EVENT_SELL, EVENT_CANCEL, EVENT_TRADE, EVENT_STATUS, EVENT_PROFIT_CHANGED
+from events import EVENT_ORDER_BATCH, StrategyEvent
+from strategy import MetaStrategy
+from backtest import BacktestPlatform, BacktestEventEngine
+
+
+FRAME_HEADER = struct.Struct('<BI')  # frame kind, payload length
+FRAME_EVENT = 1  # (event type, event parameters)
+FRAME_CALL = 2  # (call name, result)
+FRAME_CONFIG = 3  # strategy settings
+FRAME_PICKLED = 0x80  # flag of payloads pickled instead of marshalled
+
+# Events put by the strategy itself, checked instead of dispatched on replay
+STRATEGY_EVENTS = (EVENT_BUY, EVENT_SELL, EVENT_ORDER_BATCH, EVENT_CANCEL)
+
+# Portfolio methods whose results are recorded
+RECORDED_PORTFOLIO_CALLS = ('get_principal_by_this_running', 'get_remaining_cash', 'get_gain_by_this_running',
+                            'get_traded_qty', 'query_all_order_ids')
+
+
+class ReplayDivergence(Exception):
+    """
+    Exception raised when a replayed strategy departs from its journal.
+    """
+    pass
+
+
+def encode_frame(kind, value):
+    """
+    :return: bytes. Frame of a value.
+    """
+    try:
+        payload = marshal.dumps(value)
+    except ValueError:
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        kind |= FRAME_PICKLED
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
+
+
+def read_journal(path):
+    """
+    Read the frames of a journal, up to the first frame torn by a crash.
+    :return: Generator of (frame kind, value).
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    end = len(data)
+    while offset + FRAME_HEADER.size <= end:
+        kind, length = FRAME_HEADER.unpack_from(data, offset)
+        offset += FRAME_HEADER.size
+        if offset + length > end:
+            return
+        payload = data[offset:offset + length]
+        offset += length
+        if kind & FRAME_PICKLED:
+            yield kind & ~FRAME_PICKLED, pickle.loads(payload)
+        else:
+            yield kind, marshal.loads(payload)
+
+
+class EventJournal:
+    """
+    Writer of a journal. Recording a frame encodes it and queues it; a background thread writes the queued frames
+    every flush_interval seconds.
+    """
+
+    def __init__(self, path, flush_interval=0.05):
+        """
+        :param path: str. Journal file path. An existing journal is overwritten.
+        :param flush_interval: float. Seconds between two writes of the queued frames.
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.n_frames = 0
+        self._queue = deque()
+        self._file = open(path, 'wb')
+        self._write_lock = Lock()
+        self._closed = Event()
+        self._thread = Thread(target=self._run, name='EventJournal')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __repr__(self):
+        return "EventJournal: path={} n_frames={} queued={}".format(self.path, self.n_frames, len(self._queue))
+
+    def record_event(self, event):
+        """
+        :param event: StrategyEvent entering a strategy handler.
+        """
+        self._queue.append(encode_frame(FRAME_EVENT, (event.type_, event.even_param_)))
+        self.n_frames += 1
+
+    def record_call(self, name, result):
+        """
+        :param name: str. Platform call name.
+        :param result: Result of the call.
+        """
+        self._queue.append(encode_frame(FRAME_CALL, (name, result)))
+        self.n_frames += 1
+
+    def record_config(self, strategy_setting):
+        """
+        :param strategy_setting: dict. Strategy settings of Strategy.config().
+        """
+        self._queue.append(encode_frame(FRAME_CONFIG, strategy_setting))
+        self.n_frames += 1
+
+    def flush(self):
+        """
+        Write the queued frames in the calling thread.
+        """
+        queue = self._queue
+        with self._write_lock:
+            if self._file is None:
+                return
+            chunks = []
+            while queue:
+                chunks.append(queue.popleft())
+            if chunks:
+                self._file.write(b''.join(chunks))
+                self._file.flush()
+
+    def close(self):
+        """
+        Stop the writer thread, write the queued frames and close the file.
+        """
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._thread.join()
+        self.flush()
+        with self._write_lock:
+            self._file.close()
+            self._file = None
+
+    def _run(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+
+class JournaledPortfolio:
+    """
+    Proxy of a platform portfolio object recording the results of RECORDED_PORTFOLIO_CALLS in the journal of its
+    strategy.
+    """
+
+    def __init__(self, portfolio, strategy):
+        self._portfolio = portfolio
+        self._strategy = strategy
+
+    def __repr__(self):
+        return "JournaledPortfolio: {!r}".format(self._portfolio)
+
+    def __getattr__(self, name):
+        attr = getattr(self._portfolio, name)
+        if name not in RECORDED_PORTFOLIO_CALLS:
+            return attr
+        strategy = self._strategy
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if strategy.event_journal is not None and not strategy.platform_depth:
+                strategy.event_journal.record_call('portfolio.' + name, result)
+            return result
+        return call
+
+    def __setattr__(self, name, value):
+        if name in ('_portfolio', '_strategy'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._portfolio, name, value)
+
+
+class JournaledClock:
+    """
+    Proxy of a platform clock recording the times read by its strategy in the journal of the strategy.
+    """
+
+    __slots__ = ('_clock', '_strategy')
+
+    def __init__(self, clock, strategy):
+        self._clock = clock
+        self._strategy = strategy
+
+    def __repr__(self):
+        return "JournaledClock: {!r}".format(self._clock)
+
+    def __getattr__(self, name):
+        return getattr(self._clock, name)
+
+    def now_ns(self):
+        now_ns = self._clock.now_ns()
+        if self._strategy.event_journal is not None and not self._strategy.platform_depth:
+            self._strategy.event_journal.record_call('clock.now_ns', now_ns)
+        return now_ns
+
+
+class RecordingPlatform(MetaStrategy):
+    """
+    Platform layer recording the results of the platform calls of a strategy in strategy.event_journal. It goes
+    between the strategy and its platform in the MRO, see recording_class().
+    Portfolio and clock reads made by the platform itself within a platform call, e.g. the cash check of an order
+    submission, are not recorded, since replays answer the platform call without making them.
+    """
+
+    platform_depth = 0  # number of platform calls in progress
+
+    @property
+    def portfolio_obj(self):
+        return self._journaled_portfolio
+
+    @portfolio_obj.setter
+    def portfolio_obj(self, portfolio):
+        self._journaled_portfolio = None if portfolio is None else JournaledPortfolio(portfolio, self)
+
+    @property
+    def clock(self):
+        return self._journaled_clock
+
+    @clock.setter
+    def clock(self, clock):
+        self._journaled_clock = JournaledClock(clock, self)
+
+    def _platform_call(self, call, *args):
+        self.platform_depth += 1
+        try:
+            return call(*args)
+        finally:
+            self.platform_depth -= 1
+
+    def _record_call(self, name, call, *args):
+        result = self._platform_call(call, *args)
+        if self.event_journal is not None:
+            self.event_journal.record_call(name, result)
+        return result
+
+    def config(self, strategy_setting, cash_check=True):
+        if self.event_journal is not None:
+            self.event_journal.record_config(strategy_setting)
+        return self._platform_call(super().config, strategy_setting, cash_check)
+
+    def buy_action(self, event):
+        return self._record_call('buy_action', super().buy_action, event)
+
+    def sell_action(self, event):
+        return self._record_call('sell_action', super().sell_action, event)
+
+    def trade_record_update(self, event):
+        return self._record_call('trade_record_update', super().trade_record_update, event)
+
+    def margin_rate_version(self, symbol):
+        return self._record_call('margin_rate_version', super().margin_rate_version, symbol)
+
+    def query_margin_rate(self, direction, symbol):
+        return self._record_call('query_margin_rate', super().query_margin_rate, direction, symbol)
+
+    def calculate_margin(self, event):
+        return self._record_call('calculate_margin', super().calculate_margin, event)
+
+    def calculate_open_commission_with_event(self, event):
+        return self._record_call('calculate_open_commission_with_event', super().calculate_open_commission_with_event,
+                                 event)
+
+
+_recording_classes = {}
+
+
+def recording_class(strategy_cls):
+    """
+    :param strategy_cls: Strategy subclass.
+    :return: Subclass of strategy_cls recording its platform calls, to be put on top of a platform class.
+    """
+    if strategy_cls not in _recording_classes:
+        _recording_classes[strategy_cls] = type('Recording' + strategy_cls.__name__, (strategy_cls, RecordingPlatform),
+                                                {})
+    return _recording_classes[strategy_cls]
+
+
+class ReplayEventEngine(BacktestEventEngine):
+    """
+    Event engine holding the events put by the strategy until the replay checks them against the journal.
+    """
+
+    def take(self):
+        """
+        :return: StrategyEvent. The oldest event put by the strategy. None if there is none.
+        """
+        return self._queue.popleft() if self._queue else None
+
+
+class ReplayPortfolio:
+    """
+    Portfolio answering the calls of the strategy with their recorded results.
+    """
+
+    def __init__(self, platform):
+        self._platform = platform
+
+    def __getattr__(self, name):
+        if name not in RECORDED_PORTFOLIO_CALLS:
+            return lambda *args, **kwargs: None
+        platform = self._platform
+        return lambda *args, **kwargs: platform.replay_call('portfolio.' + name)
+
+
+class ReplayClock:
+    """
+    Clock answering the time reads of the strategy with the recorded times.
+    """
+
+    __slots__ = ('_platform',)
+
+    def __init__(self, platform):
+        self._platform = platform
+
+    def __repr__(self):
+        return "ReplayClock"
+
+    def now_ns(self):
+        return self._platform.replay_call('clock.now_ns')
+
+    def set_ns(self, now_ns):
+        pass
+
+
+class ReplayPlatform(BacktestPlatform):
+    """
+    Platform services of replays, answering platform calls with the results recorded in the journal.
+    Use replay_class() to put it under a strategy class.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.event_engine = ReplayEventEngine()
+        self.portfolio_obj = ReplayPortfolio(self)
+        self.clock = ReplayClock(self)
+        self.replay_calls = {}  # call name -> deque of recorded results
+
+    def replay_call(self, name):
+        """
+        :return: Next recorded result of a platform call.
+        """
+        results = self.replay_calls.get(name)
+        if not results:
+            raise ReplayDivergence("No recorded result left for {}".format(name))
+        return results.popleft()
+
+    def buy_action(self, event):
+        return self.replay_call('buy_action')
+
+    def sell_action(self, event):
+        return self.replay_call('sell_action')
+
+    def cancel_action(self, event):
+        pass  # Cancels take effect through the recorded order status events
+
+    def profit_change(self, event):
+        pass
+
+    def trade_record_update(self, event):
+        return self.replay_call('trade_record_update')
+
+    def order_status_update(self, order_status_param):
+        pass
+
+    def margin_rate_version(self, symbol):
+        return self.replay_call('margin_rate_version')
+
+    def query_margin_rate(self, direction, symbol):
+        return self.replay_call('query_margin_rate')
+
+    def calculate_margin(self, event):
+        return self.replay_call('calculate_margin')
+
+    def calculate_open_commission_with_event(self, event):
+        return self.replay_call('calculate_open_commission_with_event')
+
+    def cancel_before_stop(self):
+        pass
+
+
+_replay_classes = {}
+
+
+def replay_class(strategy_cls):
+    """
+    :param strategy_cls: Strategy subclass.
+    :return: Subclass of strategy_cls running on ReplayPlatform.
+    """
+    if strategy_cls not in _replay_classes:
+        _replay_classes[strategy_cls] = type('Replay' + strategy_cls.__name__, (strategy_cls, ReplayPlatform), {})
+    return _replay_classes[strategy_cls]
+
+
+class Replayer:
+    """
+    Replay a journal through a fresh strategy.
+    """
+
+    def __init__(self, strategy_cls, path, strategy_setting=None, logger=None):
+        """
+        :param strategy_cls: Strategy subclass of the recorded strategy, e.g. SwingStrategy.
+        :param path: str. Journal file path.
+        :param strategy_setting: dict. Strategy settings of Strategy.config(). The recorded ones if None.
+        :param logger: Strategy logger. The ReplayPlatform logger if None.
+        """
+        self.strategy_cls = strategy_cls
+        self.path = path
+        self.strategy_setting = strategy_setting
+        self.logger = logger
+        self.strategy = None
+        self.n_events = 0
+        self.n_checked = 0  # events put by the strategy and checked against the journal
+
+    def __repr__(self):
+        return "Replayer: path={} n_events={} n_checked={}".format(self.path, self.n_events, self.n_checked)
+
+    def run(self):
+        """
+        :return: Strategy at the end of the journal.
+        """
+        strategy_setting = self.strategy_setting
+        events = []
+        self.strategy = strategy = replay_class(self.strategy_cls)()
+        if self.logger is not None:
+            strategy.logger = self.logger
+        for kind, value in read_journal(self.path):
+            if kind == FRAME_EVENT:
+                events.append(value)
+            elif kind == FRAME_CALL:
+                strategy.replay_calls.setdefault(value[0], deque()).append(value[1])
+            elif kind == FRAME_CONFIG and strategy_setting is None:
+                strategy_setting = value
+        if strategy_setting is None:
+            raise ReplayDivergence("No strategy settings recorded in {}".format(self.path))
+
+        strategy.config(strategy_setting)
+        strategy.instru_margin_comm_rate = {strategy.contract.symbol: None}  # Rates are replayed by query_margin_rate
+        strategy.start()
+        handlers = {
+            EVENT_BUY: strategy.on_buy,
+            EVENT_SELL: strategy.on_sell,
+            EVENT_ORDER_BATCH: strategy.on_order_batch,
+            EVENT_CANCEL: strategy.on_cancel,
+            EVENT_TRADE: strategy.on_trade_update,
+            EVENT_STATUS: strategy.on_order_status,
+            EVENT_PROFIT_CHANGED: strategy.on_profit_change
+        }
+        engine = strategy.event_engine
+        for i, (type_, param) in enumerate(events):
+            if type_ in STRATEGY_EVENTS:
+                event = engine.take()
+                if event is None or event.type_ != type_ or event.even_param_ != param:
+                    raise ReplayDivergence("Event {}: recorded {} {}, replayed {}".format(
+                        i, type_, param, None if event is None else (event.type_, event.even_param_)))
+                self.n_checked += 1
+            else:
+                event = StrategyEvent(type_, param)
+            if type_ == EVENT_MARKETDATA:
+                strategy._check_margin_fee()
+                strategy._process_tick(event)
+            else:
+                handlers[type_](event)
+            self.n_events += 1
+        return strategy
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import logging
+    from swing_strategy import SwingStrategy
+
+    parser = argparse.ArgumentParser(description='Replay a SwingStrategy event journal.')
+    parser.add_argument('journal', help='Event journal file.')
+    parser.add_argument('--debug', action='store_true', help='Log the replayed strategy at DEBUG level.')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(message)s')
+    logger = logging.getLogger('replay')
+    logger.setLevel(logging.DEBUG if args.debug else logging.WARNING)
+    replayer = Replayer(SwingStrategy, args.journal, logger=logger)
+    strategy = replayer.run()
+    print(replayer)
+    print(json.dumps(strategy.trace_record(), default=str, indent=2))
@@ -0,0 +1,177 @@
+"""
+Latency histograms of the strategy hot path stages.
+"""
+
+
+from time import perf_counter_ns
+
+
+# Hot path stages
+LATENCY_ON_TICK = 'on_tick'  # Strategy.on_tick entry to strategy rules done
+LATENCY_TICK_TO_ORDER = 'tick_to_order'  # Strategy.on_tick entry to order event put by send_limit_order
+LATENCY_BUY_CASH_CHECK = 'buy_cash_check'  # Affordable order qty sizing on margin and commission of Strategy.on_buy
+LATENCY_ON_BUY = 'on_buy'  # Strategy.on_buy entry to buy action done
+LATENCY_ON_SELL = 'on_sell'  # Strategy.on_sell entry to sell action done
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+# Histogram buckets
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_SHIFT = 64 - SUB_BUCKET_BITS - 1
+N_BUCKETS = (MAX_SHIFT + 2) * SUB_BUCKETS  # Up to 2**64 ns
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of non-negative integer latencies in ns.
+    Values below 2 * SUB_BUCKETS are counted exactly. Larger values are counted in SUB_BUCKETS linear buckets per power
+    of 2, i.e. with a relative error below 1 / SUB_BUCKETS, so a record is a few integer operations on a fixed list.
+    """
+    __slots__ = ('counts', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * N_BUCKETS
+        self.total = 0
+        self.max = 0
+
+    def __repr__(self):
+        return "LatencyHistogram: count={} mean={:.0f} p50={} p99={} p99.9={} max={}".format(
+            self.count, self.mean(), self.percentile(50.0), self.percentile(99.0), self.percentile(99.9), self.max)
+
+    def record(self, value):
+        """
+        :param value: int. Latency in ns.
+        """
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        if shift <= 0:
+            self.counts[value] += 1
+        else:
+            self.counts[((shift if shift < MAX_SHIFT else MAX_SHIFT) << SUB_BUCKET_BITS) + (value >> shift)] += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    @staticmethod
+    def bucket_high(index):
+        """
+        :return: int. Highest value counted in bucket index.
+        """
+        if index < 2 * SUB_BUCKETS:
+            return index
+        shift = index // SUB_BUCKETS - 1
+        return ((index - shift * SUB_BUCKETS + 1) << shift) - 1
+
+    def percentile(self, percent):
+        """
+        :param percent: float. Percentile in [0, 100].
+        :return: int. Highest value of the bucket holding the percentile, not above max. 0 if no value recorded.
+        """
+        count = self.count
+        if not count:
+            return 0
+        rank = max(1, -(-count * percent // 100))
+        cumulative = 0
+        for index, n in enumerate(self.counts):
+            cumulative += n
+            if cumulative >= rank:
+                return min(self.bucket_high(index), self.max)
+        return self.max
+
+    def mean(self):
+        count = self.count
+        return self.total / count if count else 0.0
+
+    def merge(self, other):
+        """
+        Add the counts of another histogram.
+        """
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def snapshot(self):
+        """
+        :return: dict of count, mean, percentiles and max in ns.
+        """
+        snapshot = {'count': self.count, 'mean': round(self.mean(), 1)}
+        for percent in PERCENTILES:
+            snapshot['p{:g}'.format(percent)] = self.percentile(percent)
+        snapshot['max'] = self.max
+        return snapshot
+
+
+class LatencyRecorder:
+    """
+    Latency histograms by hot path stage and label, e.g. the strategy state when the latency is recorded.
+    Strategies only record latencies when their recorder is set.
+    """
+    __slots__ = ('histograms', 'tick_start')
+
+    def __init__(self):
+        self.histograms = {}  # (stage, label) -> LatencyHistogram
+        self.tick_start = None  # perf_counter_ns() at Strategy.on_tick entry while the strategy rules run
+
+    def __repr__(self):
+        return "LatencyRecorder: {}".format(sorted(self.histograms, key=str))
+
+    def record(self, stage, label, value):
+        """
+        :param stage: str. One of the LATENCY_* stages.
+        :param label: Hashable sub-key of the stage, e.g. strategy state. None if not labeled.
+        :param value: int. Latency in ns.
+        """
+        histogram = self.histograms.get((stage, label))
+        if histogram is None:
+            histogram = self.histograms[(stage, label)] = LatencyHistogram()
+        histogram.record(value)
+
+    def record_since(self, stage, label, start):
+        """
+        Record the latency from start to now.
+        :param start: int. perf_counter_ns() at the start of the stage.
+        """
+        value = perf_counter_ns() - start
+        histogram = self.histograms.get((stage, label))
+        if histogram is None:
+            histogram = self.histograms[(stage, label)] = LatencyHistogram()
+        histogram.record(value)
+
+    def histogram(self, stage):
+        """
+        :return: LatencyHistogram of a stage over all labels.
+        """
+        merged = LatencyHistogram()
+        for (s, _), histogram in self.histograms.items():
+            if s == stage:
+                merged.merge(histogram)
+        return merged
+
+    def snapshot(self):
+        """
+        :return: dict. {stage: {label: histogram snapshot}} with labels as str and an 'all' label per stage.
+        """
+        snapshot = {}
+        for stage, label in sorted(self.histograms, key=str):
+            snapshot.setdefault(stage, {})[str(label)] = self.histograms[(stage, label)].snapshot()
+        for stage, stage_snapshot in snapshot.items():
+            if len(stage_snapshot) > 1:
+                stage_snapshot['all'] = self.histogram(stage).snapshot()
+        return snapshot
+
+    def reset(self):
+        self.histograms = {}
+        self.tick_start = None
+
+    def dump(self, logger):
+        """
+        Log the snapshot at INFO, one line per stage and label.
+        """
+        for stage, stage_snapshot in self.snapshot().items():
+            for label, histogram_snapshot in stage_snapshot.items():
+                logger.info("Latency %s[%s]: %s", stage, label,
+                            ' '.join('{}={}'.format(k, v) for k, v in histogram_snapshot.items()))
@@ -0,0 +1,184 @@
+"""
+Counters and gauges of a strategy by zone tag and strategy state, pulled by snapshot() or dumped to a file in the
+Prometheus text format, e.g. for the node_exporter textfile collector:
+
+    strategy.metrics = StrategyMetrics(labels={'instance': 'rb2101-swing-1'})
+    ...
+    strategy.metrics.snapshot()['realized_gain']  # {zone: {state: value}}
+    strategy.metrics.write_prometheus('/var/lib/node_exporter/rb2101-swing-1.prom')
+
+Metrics are only updated by the strategy thread, as plain dict updates without locks. Other threads read them by
+copying the dicts, which is atomic under the GIL, so a snapshot never blocks the strategy.
+"""
+
+
+import os
+
+
+# Counters: name -> help
+METRIC_ORDERS_SENT = 'orders_sent'
+METRIC_FILLS = 'fills'
+METRIC_FILLED_QTY = 'filled_qty'
+METRIC_ORDERS_CANCELLED = 'orders_cancelled'
+METRIC_REALIZED_GAIN = 'realized_gain'
+METRIC_K_INCREMENTS = 'k_increments'
+METRIC_ZONE_EXPANSIONS = 'zone_expansions'
+METRIC_ZONE_SWITCHES = 'zone_switches'
+METRIC_REVERSALS = 'reversals'
+METRIC_RISKY_ACTIVATIONS = 'risky_activations'
+METRIC_FAR_CANCELS = 'far_cancels'
+COUNTERS = {
+    METRIC_ORDERS_SENT: 'Orders submitted.',
+    METRIC_FILLS: 'Fills.',
+    METRIC_FILLED_QTY: 'Filled quantity.',
+    METRIC_ORDERS_CANCELLED: 'Orders finished cancelled.',
+    METRIC_REALIZED_GAIN: 'Realized gain of the zone positions.',
+    METRIC_K_INCREMENTS: 'Increments of the zone volume offset scale k.',
+    METRIC_ZONE_EXPANSIONS: 'Expansions of the zone bounds.',
+    METRIC_ZONE_SWITCHES: 'Switches of the active zone, by new active zone.',
+    METRIC_REVERSALS: 'Trend reversals triggered.',
+    METRIC_RISKY_ACTIVATIONS: 'Risky zone activations triggered.',
+    METRIC_FAR_CANCELS: 'Cancels of the orders far away from the last price.'
+}
+
+# Gauges: name -> help
+METRIC_POSITION_QTY = 'position_qty'
+METRIC_CMA_PRICE = 'cma_price'
+METRIC_K = 'k'
+METRIC_K_PROFIT = 'k_profit'
+GAUGES = {
+    METRIC_POSITION_QTY: 'Zone position quantity, >0 long, <0 short.',
+    METRIC_CMA_PRICE: 'Zone position cumulative moving average price.',
+    METRIC_K: 'Zone volume offset scale k.',
+    METRIC_K_PROFIT: 'Zone profit accumulated since the last change of k.'
+}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+class StrategyMetrics:
+    """
+    Counters and gauges keyed by (metric name, zone tag, strategy state label). Zone tags are order tags for the
+    metrics of orders, '' for metrics of no zone; state labels are the ones of Strategy.metric_label(), None if not
+    labeled. Strategies only update metrics when their metrics are set.
+    """
+    __slots__ = ('namespace', 'labels', 'counters', 'gauges')
+
+    def __init__(self, namespace='strategy', labels=None):
+        """
+        :param namespace: str. Prefix of the Prometheus metric names.
+        :param labels: dict. Labels added to all Prometheus samples, e.g. {'instance': 'rb2101-swing-1'}.
+        """
+        self.namespace = namespace
+        self.labels = dict(labels or {})
+        self.counters = {}  # (name, zone, state) -> int or float
+        self.gauges = {}  # (name, zone, state) -> int or float
+
+    def __repr__(self):
+        return "StrategyMetrics: namespace={} labels={} n_counters={} n_gauges={}".format(
+            self.namespace, self.labels, len(self.counters), len(self.gauges))
+
+    def inc(self, name, zone, state, value=1):
+        """
+        :param name: str. One of the COUNTERS names.
+        :param zone: str. Zone tag.
+        :param state: Hashable. Strategy state label.
+        :param value: int or float. Increment, e.g. a filled quantity or a realized gain.
+        """
+        key = (name, zone, state)
+        counters = self.counters
+        counters[key] = counters.get(key, 0) + value
+
+    def set(self, name, zone, state, value):
+        """
+        :param name: str. One of the GAUGES names.
+        """
+        self.gauges[(name, zone, state)] = value
+
+    def set_zone(self, zone):
+        """
+        Set the gauges of a zone from its states. Zone gauges are not labeled by strategy state.
+        :param zone: GridOsc
+        """
+        gauges = self.gauges
+        tag = zone.tag
+        gauges[(METRIC_POSITION_QTY, tag, None)] = zone.position_qty
+        gauges[(METRIC_CMA_PRICE, tag, None)] = zone.cma_price
+        gauges[(METRIC_K, tag, None)] = zone.k
+        gauges[(METRIC_K_PROFIT, tag, None)] = zone.k_profit
+
+    def samples(self):
+        """
+        :return: tuple of the (name, zone, state) -> value dicts of the counters and of the gauges, as copies.
+        """
+        return self.counters.copy(), self.gauges.copy()
+
+    def total(self, name, zone=None, state=None):
+        """
+        :return: Sum of a counter or gauge over all zones and states, or the given ones only.
+        """
+        counters, gauges = self.samples()
+        values = counters if name in COUNTERS else gauges
+        return sum(value for (n, z, s), value in values.items()
+                   if n == name and (zone is None or z == zone) and (state is None or s == state))
+
+    def snapshot(self):
+        """
+        :return: dict. {metric name: {zone: {state: value}}} with states as str, counters and gauges together.
+        """
+        counters, gauges = self.samples()
+        snapshot = {}
+        for values in (counters, gauges):
+            for (name, zone, state), value in sorted(values.items(), key=str):
+                snapshot.setdefault(name, {}).setdefault(zone, {})[str(state)] = value
+        return snapshot
+
+    def reset(self):
+        self.counters = {}
+        self.gauges = {}
+
+    def prometheus_text(self):
+        """
+        :return: str. Metrics in the Prometheus text exposition format.
+        """
+        counters, gauges = self.samples()
+        lines = []
+        for values, helps, metric_type, suffix in ((counters, COUNTERS, 'counter', '_total'),
+                                                   (gauges, GAUGES, 'gauge', '')):
+            by_name = {}
+            for (name, zone, state), value in values.items():
+                by_name.setdefault(name, []).append((zone, state, value))
+            for name in sorted(by_name):
+                metric = '{}_{}{}'.format(self.namespace, name, suffix)
+                lines.append('# HELP {} {}'.format(metric, helps.get(name, name)))
+                lines.append('# TYPE {} {}'.format(metric, metric_type))
+                for zone, state, value in sorted(by_name[name], key=str):
+                    labels = dict(self.labels)
+                    if zone:
+                        labels['zone'] = zone
+                    if state is not None:
+                        labels['state'] = state
+                    label_text = ','.join('{}="{}"'.format(k, _escape(v)) for k, v in sorted(labels.items()))
+                    lines.append('{}{{{}}} {}'.format(metric, label_text, _format_value(value)) if label_text else
+                                 '{} {}'.format(metric, _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """
+        Write the metrics in the Prometheus text format to a file, replacing it atomically so that collectors never
+        read a partial file.
+        :param path: str. File path, e.g. in the textfile collector directory of node_exporter.
+        """
+        with open(path + '.tmp', 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(path + '.tmp', path)
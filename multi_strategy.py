@@ -0,0 +1,200 @@
+"""
+Host of many single-contract strategies in one process.
+"""
+
+
+from constants import *
+from events import EVENT_MARKETDATA, EVENT_BUY, EVENT_SELL, EVENT_CANCEL, EVENT_TRADE, EVENT_STATUS, EVENT_PROFIT_CHANGED
+from events import EVENT_ORDER_BATCH, EventEngine
+
+
+class MultiStrategyHost:
+    """
+    Run one strategy per contract on a shared event engine and a shared set of background threads.
+
+    Each hosted strategy is a configured single-contract Strategy keeping its own contract, order and trade books.
+    The host registers one handler per event type and routes events to strategies with dict look-ups: market data,
+    orders and cancels by contract symbol, trades and order status by symbol or by the order book holding the order id,
+    and profit changes by instrument id.
+
+    The first added strategy is the lead. It runs the threads cancelling untraded orders and querying margin and
+    commission rates for all symbols, and its contract unit, price tick and margin/commission rate caches, all keyed by
+    symbol, are shared by the other strategies. Hosted strategies are expected to run on the same platform account.
+    """
+
+    def __init__(self, event_engine=None, logger=None):
+        """
+        :param event_engine: EventEngine shared by the strategies. A new EventEngine if None.
+        :param logger: Logger of the host.
+        """
+        self.event_engine = EventEngine(logger=logger) if event_engine is None else event_engine
+        self.logger = logger
+        self.strategies = {}  # contract symbol -> strategy
+        self._instrument_strategies = {}  # contract instrument id -> strategy
+        self._order_strategies = {}  # order id -> strategy, cache of order books look-ups
+        self._lead = None
+        self._active = False
+        self._handlers = (
+            (EVENT_MARKETDATA, self._on_tick),
+            (EVENT_BUY, self._on_buy),
+            (EVENT_SELL, self._on_sell),
+            (EVENT_ORDER_BATCH, self._on_order_batch),
+            (EVENT_CANCEL, self._on_cancel),
+            (EVENT_TRADE, self._on_trade_update),
+            (EVENT_STATUS, self._on_order_status),
+            (EVENT_PROFIT_CHANGED, self._on_profit_change)
+        )
+
+    def __repr__(self):
+        return "MultiStrategyHost: active={} symbols={}".format(self._active, sorted(self.strategies))
+
+    def __len__(self):
+        return len(self.strategies)
+
+    @property
+    def active(self):
+        return self._active
+
+    def add(self, strategy):
+        """
+        Host a configured strategy. Strategies can only be added before start().
+        :param strategy: Strategy configured with its contract by config().
+        :return: None
+        """
+        symbol = strategy.contract.symbol
+        if self._active:
+            raise RuntimeError("Strategy {} cannot be added to a running host.".format(symbol))
+        if symbol is None:
+            raise ValueError("Strategy has no contract. Configure it before hosting it.")
+        if symbol in self.strategies:
+            raise ValueError("A strategy is already hosted for {}.".format(symbol))
+
+        strategy.event_engine = self.event_engine
+        if self._lead is None:
+            self._lead = strategy
+        else:
+            lead = self._lead
+            lead.instru_unit_size.update(strategy.instru_unit_size)
+            lead.instru_price_tick.update(strategy.instru_price_tick)
+            lead.instru_margin_comm_rate.update(strategy.instru_margin_comm_rate)
+            strategy.instru_unit_size = lead.instru_unit_size
+            strategy.instru_price_tick = lead.instru_price_tick
+            strategy.instru_margin_comm_rate = lead.instru_margin_comm_rate
+        self.strategies[symbol] = strategy
+        self._instrument_strategies[strategy.contract.instrument_id] = strategy
+
+    def strategy(self, symbol):
+        """
+        :return: Strategy hosted for a contract symbol. None if not hosted.
+        """
+        return self.strategies.get(symbol)
+
+    def start(self):
+        """
+        Start all strategies, the shared background threads and the event engine.
+        :return: None
+        """
+        if self._active or self._lead is None:
+            return
+        for strategy in self.strategies.values():
+            strategy.start(hosted=True)
+        self._start_workers()
+        for type_, handler in self._handlers:
+            self.event_engine.register(type_, handler)
+        self._active = True
+        self.event_engine.start()
+
+    def stop(self):
+        """
+        Stop all strategies, the lead last as it runs the shared background threads, then the event engine.
+        :return: None
+        """
+        if not self._active:
+            return
+        self._active = False
+        for type_, handler in self._handlers:
+            self.event_engine.unregister(type_, handler)
+        for strategy in self.strategies.values():
+            if strategy is not self._lead:
+                strategy.stop(hosted=True)
+        self._lead.stop(hosted=True)
+        self.event_engine.stop()
+        self._order_strategies = {}
+
+    def _start_workers(self):
+        """
+        Start the shared background threads of the lead strategy for all hosted symbols.
+        """
+        self._lead._start_workers(list(self.strategies))
+
+    # --- Event routing --- #
+
+    def _order_strategy(self, param):
+        """
+        :return: Strategy of an order or trade event, by contract symbol or by the order book holding its order id.
+        """
+        strategy = self.strategies.get(param.get(INSTRUMENT_SYMBOL))
+        if strategy is not None:
+            return strategy
+        try:
+            order_id = int(param[ORDER_ID])
+        except (KeyError, TypeError, ValueError):
+            return None
+        strategy = self._order_strategies.get(order_id)
+        if strategy is None:
+            for s in self.strategies.values():
+                if order_id in s.order_dict:
+                    strategy = self._order_strategies[order_id] = s
+                    break
+        return strategy
+
+    def _on_tick(self, event):
+        strategy = self.strategies.get(event.even_param_[INSTRUMENT_SYMBOL])
+        if strategy is not None:
+            strategy.on_tick(event)
+
+    def _on_buy(self, event):
+        strategy = self.strategies.get(event.even_param_[INSTRUMENT_SYMBOL])
+        if strategy is not None:
+            strategy.on_buy(event)
+
+    def _on_sell(self, event):
+        strategy = self.strategies.get(event.even_param_[INSTRUMENT_SYMBOL])
+        if strategy is not None:
+            strategy.on_sell(event)
+
+    def _on_order_batch(self, event):
+        strategy = self.strategies.get(event.even_param_[INSTRUMENT_SYMBOL])
+        if strategy is not None:
+            strategy.on_order_batch(event)
+
+    def _on_cancel(self, event):
+        symbol = event.even_param_.get(INSTRUMENT_SYMBOL)
+        if symbol is None:  # Cancel without contract goes to all strategies
+            for strategy in self.strategies.values():
+                strategy.on_cancel(event)
+        else:
+            strategy = self.strategies.get(symbol)
+            if strategy is not None:
+                strategy.on_cancel(event)
+
+    def _on_trade_update(self, event):
+        strategy = self._order_strategy(event.even_param_)
+        if strategy is not None:
+            strategy.on_trade_update(event)
+
+    def _on_order_status(self, event):
+        param = event.even_param_
+        strategy = self._order_strategy(param)
+        if strategy is not None:
+            strategy.on_order_status(event)
+            if param.get(ORDER_STATUS) in (ORDER_CLOSED_ALIAS, ORDER_REJECTED, ORDER_CANCELLED, ORDER_REPEAT_CANCEL):
+                try:
+                    self._order_strategies.pop(int(param[ORDER_ID]), None)
+                except (KeyError, TypeError, ValueError):
+                    pass
+
+    def _on_profit_change(self, event):
+        strategy = self._instrument_strategies.get(event.even_param_.get(INSTRUMENT_ID))
+        if strategy is not None:
+            strategy.on_profit_change(event)
@@ -0,0 +1,234 @@
+"""
+Journal of strategy state snapshots for warm restarts.
+
+A journal is two files: a checkpoint holding one full state, and an append-only journal of the state components
+changed since the checkpoint. Both are sequences of binary frames: a header of payload length, CRC-32 and checkpoint
+epoch, then a pickled payload. Journal frames only apply on top of the checkpoint of the same epoch, so a crash while
+a new checkpoint replaces the old one never mixes the frames of two checkpoints, and a frame torn by a crash ends the
+journal.
+
+    journal = StateJournal('/var/lib/strategy/rb2101')
+    strategy.state_journal = journal
+    ...
+    journal.close()  # on stop, writes the last recorded state
+
+    strategy.start(state=load_state('/var/lib/strategy/rb2101'))  # warm restart
+"""
+
+
+import os
+import pickle
+import struct
+from collections import deque
+from threading import Event, Lock, Thread
+from zlib import crc32
+
+
+CHECKPOINT_SUFFIX = '.ckpt'
+JOURNAL_SUFFIX = '.journal'
+FRAME_HEADER = struct.Struct('<IIQ')  # payload length, payload CRC-32, checkpoint epoch
+_MISSING = object()
+
+
+def _frame(epoch, payload):
+    return FRAME_HEADER.pack(len(payload), crc32(payload), epoch) + payload
+
+
+def _read_frames(data):
+    """
+    :return: generator of (epoch, payload) of the frames of data, up to the first torn or corrupted frame.
+    """
+    offset = 0
+    end = len(data)
+    while offset + FRAME_HEADER.size <= end:
+        length, crc, epoch = FRAME_HEADER.unpack_from(data, offset)
+        offset += FRAME_HEADER.size
+        payload = data[offset:offset + length]
+        if len(payload) < length or crc32(payload) != crc:
+            return
+        offset += length
+        yield epoch, payload
+
+
+def _read_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return b''
+
+
+def load_state(path):
+    """
+    Load the latest strategy state of a journal: its checkpoint updated with the journal frames of the checkpoint.
+    :param path: str. Path of the journal files without suffix.
+    :return: dict. Strategy state for Strategy.start(state=...). None if there is no checkpoint.
+    """
+    checkpoint = next(_read_frames(_read_file(path + CHECKPOINT_SUFFIX)), None)
+    if checkpoint is None:
+        return None
+    epoch, payload = checkpoint
+    state = pickle.loads(payload)
+    for frame_epoch, payload in _read_frames(_read_file(path + JOURNAL_SUFFIX)):
+        if frame_epoch != epoch:
+            continue
+        changed, deleted = pickle.loads(payload)
+        for key in deleted:
+            state.pop(key, None)
+        state.update(changed)
+    return state
+
+
+class StateJournal:
+    """
+    Writer of the state snapshots of a strategy. Strategies record their state after order, trade and status events,
+    and every tick_interval ticks as peak prices change on most ticks. Recording a state only marks it changed: a
+    background thread requests a snapshot every flush_interval seconds, and the strategy takes it with
+    Strategy.snapshot_state() at the end of its next recorded event or tick, where its state is consistent. So the
+    strategy builds at most one snapshot per flush_interval whatever its event rate and book size, and a crash loses
+    at most the states of the last flush_interval and of the events since the last tick. Each write only appends the
+    components changed since the previous write, and every checkpoint_interval writes the full state is checkpointed
+    and the journal restarted.
+    """
+
+    def __init__(self, path, tick_interval=1000, checkpoint_interval=1000, fsync=False, flush_interval=0.05):
+        """
+        :param path: str. Path of the journal files without suffix.
+        :param tick_interval: int. Number of ticks between two tick records.
+        :param checkpoint_interval: int. Number of journal frames between two checkpoints.
+        :param fsync: bool. If frames and checkpoints are synced to disk, surviving OS crashes and not only process
+            crashes, at the cost of a disk flush per write.
+        :param flush_interval: float. Seconds between two writes of the latest queued state.
+        """
+        self.path = path
+        self.tick_interval = tick_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.fsync = fsync
+        self.flush_interval = flush_interval
+        self.n_frames = 0  # journal frames since the last checkpoint
+        self.n_checkpoints = 0
+        self._n_ticks = 0
+        self._epoch = None  # epoch of the current checkpoint, None before the first checkpoint
+        self._last = {}  # state components as of the last write
+        self._file = None
+        self._queued = deque(maxlen=1)  # latest snapshot not written yet
+        self._strategy = None  # strategy of the recorded states
+        self._dirty = False  # if the strategy state changed since its last snapshot
+        self._wanted = True  # if the next recorded state is snapshot, set at every flush
+        self._write_lock = Lock()
+        self._closed = Event()
+        self._thread = Thread(target=self._run, name='StateJournal')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __repr__(self):
+        return "StateJournal: path={} epoch={} n_frames={} n_checkpoints={}".format(
+            self.path, self._epoch, self.n_frames, self.n_checkpoints)
+
+    def on_tick(self, strategy):
+        """
+        Record the strategy state every tick_interval ticks, and take the snapshot of a state recorded since the last
+        one if requested.
+        """
+        self._n_ticks += 1
+        if self._n_ticks >= self.tick_interval:
+            self._n_ticks = 0
+            self._dirty = True
+        if self._dirty and self._wanted:
+            self._snapshot(strategy)
+
+    def record(self, strategy):
+        """
+        Record the strategy state, taking its snapshot only if requested since the last one.
+        """
+        self._dirty = True
+        if self._wanted:
+            self._snapshot(strategy)
+        else:
+            self._strategy = strategy
+
+    def _snapshot(self, strategy):
+        self._wanted = False
+        self._dirty = False
+        self._strategy = strategy
+        self._queued.append(strategy.snapshot_state())
+
+    def flush(self):
+        """
+        Write the latest snapshot in the calling thread, and request the snapshot of the next recorded state.
+        :return: bool. If anything was written.
+        """
+        with self._write_lock:
+            self._wanted = True
+            try:
+                state = self._queued.pop()
+            except IndexError:
+                return False
+            return self.write(state)
+
+    def write(self, state):
+        """
+        Append the components of state changed since the last write, or checkpoint state.
+        :param state: dict. Strategy state.
+        :return: bool. If anything was written.
+        """
+        if self._epoch is None or self.n_frames >= self.checkpoint_interval:
+            self.checkpoint(state)
+            return True
+        last = self._last
+        changed = {key: value for key, value in state.items() if last.get(key, _MISSING) != value}
+        deleted = [key for key in last if key not in state]
+        if not changed and not deleted:
+            return False
+        self._file.write(_frame(self._epoch, pickle.dumps((changed, deleted), pickle.HIGHEST_PROTOCOL)))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.n_frames += 1
+        self._last = state
+        return True
+
+    def checkpoint(self, state):
+        """
+        Replace the checkpoint by state and restart the journal.
+        :param state: dict. Strategy state.
+        """
+        epoch = int.from_bytes(os.urandom(8), 'little')
+        checkpoint_path = self.path + CHECKPOINT_SUFFIX
+        tmp_path = checkpoint_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_frame(epoch, pickle.dumps(state, pickle.HIGHEST_PROTOCOL)))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, checkpoint_path)
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path + JOURNAL_SUFFIX, 'wb')
+        self._epoch = epoch
+        self._last = state
+        self.n_frames = 0
+        self.n_checkpoints += 1
+
+    def close(self):
+        """
+        Stop the writer thread, write the latest recorded state and close the files. The strategy must not be handling
+        events anymore, e.g. stopped.
+        """
+        if not self._closed.is_set():
+            self._closed.set()
+            self._thread.join()
+        if self._dirty and self._strategy is not None:
+            self._snapshot(self._strategy)
+        self.flush()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._epoch = None
+            self._last = {}
+            self._strategy = None
+
+    def _run(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
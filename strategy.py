@@ -4,24 +4,44 @@ Definition of base strategy and related types.
 
 
 from abc import ABC
+from bisect import bisect_left, bisect_right, insort
 from datetime import datetime
+from math import ceil
 from threading import Thread
+from time import perf_counter_ns
 from constants import *
 from utils import get_number_of_decimal, if_market_open
 from events import EVENT_MARKETDATA, EVENT_BUY, EVENT_SELL, EVENT_CANCEL, EVENT_TRADE, EVENT_STATUS, EVENT_PROFIT_CHANGED
-from events import StrategyEvent, EventEngine
+from events import EVENT_ORDER_BATCH, StrategyEvent, EventEngine
+from clock import MONOTONIC_CLOCK
+from latency import LATENCY_ON_TICK, LATENCY_TICK_TO_ORDER, LATENCY_BUY_CASH_CHECK, LATENCY_ON_BUY, LATENCY_ON_SELL
+from metrics import METRIC_ORDERS_SENT, METRIC_FILLS, METRIC_FILLED_QTY, METRIC_ORDERS_CANCELLED
 
 
 # Constants
 INIT = "INIT"
 REQ = "REQ"
 SPLIT = "SPLIT"
+INFINITY = float('inf')
+PRICE_CACHE_SIZE = 65536  # Max number of cached prices per contract
+LINEAR_FEE_TYPES = (FEE_TYPE_RATIO, FEE_TYPE_FIXED)  # Fee types proportional to order quantity
+
+# State snapshot components
+SNAPSHOT_POSITION = 'position'
+SNAPSHOT_ORDER = 'order'  # keyed by (SNAPSHOT_ORDER, order id)
+SNAPSHOT_TRADE = 'trade'  # keyed by (SNAPSHOT_TRADE, trade id)
+
+# Market data fields updated on tick: (event field, Contract price attribute, Contract price in ticks attribute)
+MARKET_PRICE_FIELDS = ((LOW_LIMIT, 'low_limit', 'low_limit_ticks'), (HIGH_LIMIT, 'high_limit', 'high_limit_ticks'),
+                       (PRICE, 'last', 'last_ticks'), (BID, 'bid', 'bid_ticks'), (ASK, 'ask', 'ask_ticks'))
+MARKET_VOLUME_FIELDS = ((BID_VOLUME, 'bid_volume'), (ASK_VOLUME, 'ask_volume'))
 
 
 # --- Exceptions ---
 class InvalidMarginFee(Exception):
     """
-    Exception raised if Strategy.instru_margin_comm_rate is empty when receiving a MarketData event.
+    Exception raised if Strategy.instru_margin_comm_rate has no rates of the contract when receiving a MarketData
+    event, e.g. before the platform queried them.
     """
     pass
 
@@ -44,9 +64,13 @@ class InvalidContractUnit(Exception):
 class Contract:
     """
     Contract specs and its latest market status.
+    Prices are kept both as floats rounded to the price decimal and as integer numbers of ticks (*_ticks).
+    spec_version is incremented whenever the unit or the margin/commission rates change, so that values derived from
+    them can be cached by version.
     """
     __slots__ = ("symbol", "instrument_id", "tick", "unit", "margin_fee", "trading_hours", "decimal", "last", "bid",
-                 "ask", "bid_volume", "ask_volume", "low_limit", "high_limit")
+                 "ask", "bid_volume", "ask_volume", "low_limit", "high_limit", "last_ticks", "bid_ticks", "ask_ticks",
+                 "low_limit_ticks", "high_limit_ticks", "price_cache", "spec_version")
 
     def __init__(self, symbol=None, instrument_id=None, tick=None, unit=None, margin_fee=None, trading_hours=None):
         # Constant contract specs
@@ -55,13 +79,17 @@ class Contract:
         self.trading_hours = trading_hours
 
         # Variable contract specs
-        self.tick = tick
+        self.spec_version = 0
+        self.tick = None
+        self.decimal = None
+        self.price_cache = {}  # number of ticks -> rounded float price, valid for the current tick size
+        if tick is not None:
+            self.set_tick(tick)
         self.unit = unit
         self.margin_fee = {  # margin and commission fee information
             DIRECTION_LONG: {},
             DIRECTION_SHORT: {}
         } if margin_fee is None else margin_fee
-        self.decimal = None
 
         # Market status from exchange: prices, volumes, depths, volatility, etc.
         self.low_limit = None
@@ -71,6 +99,11 @@ class Contract:
         self.ask = None
         self.bid_volume = None
         self.ask_volume = None
+        self.low_limit_ticks = None
+        self.high_limit_ticks = None
+        self.last_ticks = None
+        self.bid_ticks = None
+        self.ask_ticks = None
 
     def reset_market_status(self):
         """
@@ -79,6 +112,7 @@ class Contract:
         self.tick = None
         self.unit = None
         self.margin_fee = {DIRECTION_LONG: {}, DIRECTION_SHORT: {}}
+        self.spec_version += 1
         self.decimal = None
         self.low_limit = None
         self.high_limit = None
@@ -87,6 +121,70 @@ class Contract:
         self.ask = None
         self.bid_volume = None
         self.ask_volume = None
+        self.low_limit_ticks = None
+        self.high_limit_ticks = None
+        self.last_ticks = None
+        self.bid_ticks = None
+        self.ask_ticks = None
+        self.price_cache = {}
+
+    def set_tick(self, tick):
+        """
+        Update tick size. The price decimal is only derived again when the tick size changes.
+        """
+        if tick != self.tick or self.decimal is None:
+            self.tick = tick
+            self.decimal = get_number_of_decimal(tick)
+            self.price_cache = {}
+
+    def set_unit(self, unit):
+        """
+        Update contract unit size.
+        """
+        if unit != self.unit:
+            self.unit = unit
+            self.spec_version += 1
+
+    def set_margin_fee(self, direction, margin_fee):
+        """
+        Update the margin and commission rates of a direction. The rates are copied, and margin_fee itself is replaced
+        instead of updated, so that rates are only changed by this method.
+        :param direction: DIRECTION_LONG or DIRECTION_SHORT
+        :param margin_fee: dict. Margin and commission rates.
+        """
+        if margin_fee != self.margin_fee[direction]:
+            self.margin_fee = dict(self.margin_fee)
+            self.margin_fee[direction] = None if margin_fee is None else dict(margin_fee)
+            self.spec_version += 1
+
+    def to_ticks(self, price):
+        """
+        :return: int. Price or price difference in the nearest number of ticks.
+        """
+        return int(round(price / self.tick))
+
+    def to_ticks_ceil(self, amount):
+        """
+        :return: int. Min number of ticks not less than a price amount, e.g. threshold of a comparison in ticks.
+        """
+        return int(ceil(amount / self.tick - COMPARED_FLOAT))
+
+    def to_price(self, n_ticks):
+        """
+        :return: float. Price of a number of ticks rounded to the price decimal.
+        """
+        price = self.price_cache.get(n_ticks)
+        if price is None:  # round() to decimal is costly, so prices are cached by number of ticks.
+            if len(self.price_cache) >= PRICE_CACHE_SIZE:
+                self.price_cache.clear()
+            price = self.price_cache[n_ticks] = round(n_ticks * self.tick, self.decimal)
+        return price
+
+    def round_price(self, price):
+        """
+        :return: float. Price rounded to the nearest tick.
+        """
+        return self.to_price(int(round(price / self.tick)))
 
 
 class OrderRecord:
@@ -128,6 +226,28 @@ class OrderRecord:
             format(self.order_id, ('buy', 'sell')[self.buy_sell], ('long', 'short')[self.long_short], self.price,
                    self.qty, self.tag, self.status, self.filled_qty, self.filled_price, self.trades, self.create_time))
 
+    def snapshot(self):
+        """
+        :return: tuple. Order information, restored by from_snapshot().
+        """
+        return (self.order_id, self.create_time, self.expiration_time, self.buy_sell, self.long_short, self.price,
+                self.qty, self.tag, self.status, self.filled_qty, self.filled_price, tuple(self.trades))
+
+    @classmethod
+    def from_snapshot(cls, contract, snapshot):
+        """
+        :param snapshot: tuple returned by snapshot().
+        :return: OrderRecord
+        """
+        order_id, create_time, expiration_time, buy_sell, long_short, price, qty, tag, status, filled_qty, \
+            filled_price, trades = snapshot
+        order = cls(contract, order_id, create_time, expiration_time, buy_sell, long_short, price, qty, tag)
+        order.status = status
+        order.filled_qty = filled_qty
+        order.filled_price = filled_price
+        order.trades = list(trades)
+        return order
+
 
 class TradeRecord:
     """
@@ -153,11 +273,148 @@ class TradeRecord:
         return ("Trade {} for Order {}: price={} qty={} time={}".format(self.trade_id, self.order_id, self.price,
                                                                         self.qty, self.create_time))
 
+    def snapshot(self):
+        """
+        :return: tuple. Trade information, restored by from_snapshot().
+        """
+        return self.trade_id, self.order_id, self.price, self.qty, self.create_time
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """
+        :param snapshot: tuple returned by snapshot().
+        :return: TradeRecord
+        """
+        return cls(*snapshot)
+
+
+class OrderIndex:
+    """
+    Index of the open orders of order_dict by price, so that orders outside a price range are found without scanning
+    all orders.
+    """
+    __slots__ = ("_by_price",)
+
+    def __init__(self):
+        self._by_price = []  # sorted list of (price, order_id)
+
+    def __len__(self):
+        return len(self._by_price)
+
+    def __repr__(self):
+        return "OrderIndex: {}".format(self._by_price)
+
+    def add(self, order):
+        """
+        :param order: OrderRecord
+        """
+        insort(self._by_price, (order.price, order.order_id))
+
+    def remove(self, order):
+        """
+        :param order: OrderRecord
+        """
+        key = (order.price, order.order_id)
+        i = bisect_left(self._by_price, key)
+        if i < len(self._by_price) and self._by_price[i] == key:
+            del self._by_price[i]
+
+    def clear(self):
+        self._by_price = []
+
+    def ids_outside(self, low, high):
+        """
+        :return: list of ids of the orders priced below low or above high, by ascending price.
+        """
+        by_price = self._by_price
+        return ([order_id for _, order_id in by_price[:bisect_left(by_price, (low,))]] +
+                [order_id for _, order_id in by_price[bisect_right(by_price, (high, INFINITY)):]])
+
+
+class MarginRates(dict):
+    """
+    Margin and commission rates by contract symbol, as queried by the platform, with a version by symbol incremented
+    whenever the rates of the symbol change, so that strategies only query them again when their version changes.
+    Rates set by item assignment, update(), set_rates() or removed bump the version at once. Writers editing nested
+    rates in place, e.g. rates[symbol][DIRECTION_LONG][MARGIN_RATE] = 0.12, must call touch(symbol) afterwards:
+    version() only reads the counter and never looks at the rates themselves.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.versions = dict.fromkeys(self, 1)  # symbol -> version of its rates, 0 if not set
+
+    def __repr__(self):
+        return "MarginRates: {} versions={}".format(dict.__repr__(self), self.versions)
+
+    def __setitem__(self, symbol, rates):
+        super().__setitem__(symbol, rates)
+        self.touch(symbol)  # after the rates, so new versions have new rates
+
+    def __delitem__(self, symbol):
+        super().__delitem__(symbol)
+        self.touch(symbol)
+
+    def pop(self, symbol, *default):
+        rates = super().pop(symbol, *default)
+        self.touch(symbol)
+        return rates
+
+    def update(self, *args, **kwargs):
+        for symbol, rates in dict(*args, **kwargs).items():
+            self[symbol] = rates
+
+    def set_rates(self, symbol, rates):
+        """
+        Set the rates of a symbol and bump their version, same as rates[symbol] = rates.
+        :param symbol: str. Contract symbol.
+        :param rates: dict. Margin and commission rates by direction.
+        """
+        self[symbol] = rates
+
+    def touch(self, symbol):
+        """
+        Bump the version of the rates of a symbol, e.g. after editing them in place.
+        :param symbol: str. Contract symbol.
+        """
+        self.versions[symbol] = self.versions.get(symbol, 0) + 1
+
+    def version(self, symbol):
+        """
+        :return: int. Version of the rates of a symbol, 0 if never set.
+        """
+        return self.versions.get(symbol, 0)
 
 
 class MetaStrategy(ABC):
+    """
+    Base of the trading platform services used by Strategy: logger, portfolio_obj, thread_lock, config(),
+    buy_action(), sell_action(), cancel_action(), profit_change(), margin/commission queries, etc.
+    Platforms provide them in a subclass placed between Strategy and MetaStrategy in the MRO, e.g.
+    backtest.BacktestPlatform.
+
+    Margin and commission rates queried by the platform, e.g. by its query_margin_commission_rate() thread, are kept
+    in instru_margin_comm_rate, a MarginRates wrapping any dict assigned to it. Platforms set the rates of a symbol
+    by assignment or set_rates(), or call touch(symbol) after editing them in place, so that strategies see them.
+    """
     def __init__(self):
         self.event_engine = EventEngine()
+        self.clock = MONOTONIC_CLOCK  # Source of strategy timing in ns, e.g. AdaptiveOrder pending times
+        self.instru_margin_comm_rate = MarginRates()
+
+    @property
+    def instru_margin_comm_rate(self):
+        return self._margin_rates
+
+    @instru_margin_comm_rate.setter
+    def instru_margin_comm_rate(self, margin_rates):
+        self._margin_rates = margin_rates if isinstance(margin_rates, MarginRates) else MarginRates(margin_rates)
+
+    def margin_rate_version(self, symbol):
+        """
+        :return: int. Version of the margin and commission rates of a symbol, see MarginRates.
+        """
+        return self._margin_rates.version(symbol)
 
 
 class Strategy(MetaStrategy):
@@ -166,17 +423,29 @@ class Strategy(MetaStrategy):
     """
 
     def __init__(self):
-        Strategy.__init__(self)
+        super().__init__()
 
         # Auxiliary attributes
         self.contract = Contract()  # The contract's latest specs and market status
         self.order_dict = {}  # orders look-up table by order_id
+        self.order_index = OrderIndex()  # price index of order_dict
         self.trade_dict = {}  # trades look-up table by trade_id
         self._position_qty = [0, 0]  # Position quantity for long/short
         self._cma_price = [0.0, 0.0]  # Cumulative moving average price of position cost
         self._principal = 0.00  # principal cash
         self._gain = 0.00  # current profit
         self._nlv = 0.0  # net liquidation value
+        self._realized_gain = 0.0  # profit net of the unrealized gain as of the last portfolio reconciliation
+        self._ticks_since_reconcile = 0
+        self.profit_reconcile_interval = 100  # ticks between two reconciliations of the gain with the portfolio
+        self.tick_tracer = None  # TickTracer of sampled per-tick state records, no trace if None
+        self.latency = None  # LatencyRecorder of the hot path stages, no instrumentation if None
+        self.state_journal = None  # StateJournal of state snapshots for warm restarts, no journal if None
+        self.event_journal = None  # EventJournal of the handled events for replays, no journal if None
+        self.trade_history = None  # TradeHistory of the session orders and fills, no history if None
+        self.metrics = None  # StrategyMetrics of counters and gauges by zone and state, no metrics if None
+        self._order_templates = {}  # direction -> (contract spec version, order params template)
+        self._margin_rate_version = None  # version of the platform rates in contract.margin_fee, None if not set
 
         # Thread for querying the margin and commission rate
         self.__margin_commission_thread = None
@@ -264,6 +533,73 @@ class Strategy(MetaStrategy):
         """
         pass
 
+    def latency_label(self):
+        """
+        Label of the latencies recorded at the moment, e.g. the strategy state.
+        :return: Hashable. None if latencies are not labeled.
+        """
+        return None
+
+    def metric_label(self):
+        """
+        State label of the metrics updated at the moment, e.g. the strategy state.
+        :return: Hashable. None if metrics are not labeled.
+        """
+        return None
+
+    def trace_record(self):
+        """
+        Strategy state record of the sampled per-tick trace. Strategies add their own state to it.
+        :return: dict of JSON serializable values.
+        """
+        contract = self.contract
+        return {
+            'symbol': contract.symbol,
+            'last': contract.last,
+            'bid': contract.bid,
+            'ask': contract.ask,
+            'position_qty': self._position_qty,
+            'cma_price': self._cma_price,
+            'gain': self._gain,
+            'nlv': self._nlv,
+            'n_orders': len(self.order_dict),
+            'n_trades': len(self.trade_dict)
+        }
+
+    def snapshot_state(self):
+        """
+        Strategy state for a warm restart, as components keyed by name so that a StateJournal only writes the
+        components changed since its last write. Strategies add their own components to it.
+        :return: dict of picklable immutable values.
+        """
+        state = {SNAPSHOT_POSITION: (tuple(self._position_qty), tuple(self._cma_price))}
+        for order_id, order in self.order_dict.items():
+            state[(SNAPSHOT_ORDER, order_id)] = order.snapshot()
+        for trade_id, trade in self.trade_dict.items():
+            state[(SNAPSHOT_TRADE, trade_id)] = trade.snapshot()
+        return state
+
+    def restore_state(self, state):
+        """
+        Restore the strategy state returned by snapshot_state(). Strategies restore their own components.
+        :param state: dict. Strategy state.
+        :return: None
+        """
+        position_qty, cma_price = state[SNAPSHOT_POSITION]
+        self._position_qty, self._cma_price = list(position_qty), list(cma_price)
+        self._ticks_since_reconcile = self.profit_reconcile_interval
+        self.order_dict = {}
+        self.order_index.clear()
+        self.trade_dict = {}
+        for key, value in state.items():
+            if key.__class__ is not tuple:
+                continue
+            if key[0] == SNAPSHOT_ORDER:
+                order_record = self.order_dict[key[1]] = OrderRecord.from_snapshot(self.contract, value)
+                self.order_index.add(order_record)
+            elif key[0] == SNAPSHOT_TRADE:
+                self.trade_dict[key[1]] = TradeRecord.from_snapshot(value)
+
     # --- Strategy configuration and control --- #
 
     def _register_event_handlers(self):
@@ -274,6 +610,7 @@ class Strategy(MetaStrategy):
         self.event_engine.register(EVENT_MARKETDATA, self.on_tick)
         self.event_engine.register(EVENT_BUY, self.on_buy)
         self.event_engine.register(EVENT_SELL, self.on_sell)
+        self.event_engine.register(EVENT_ORDER_BATCH, self.on_order_batch)
         self.event_engine.register(EVENT_CANCEL, self.on_cancel)
         self.event_engine.register(EVENT_TRADE, self.on_trade_update)
         self.event_engine.register(EVENT_STATUS, self.on_order_status)
@@ -287,6 +624,7 @@ class Strategy(MetaStrategy):
         self.event_engine.unregister(EVENT_MARKETDATA, self.on_tick)
         self.event_engine.unregister(EVENT_BUY, self.on_buy)
         self.event_engine.unregister(EVENT_SELL, self.on_sell)
+        self.event_engine.unregister(EVENT_ORDER_BATCH, self.on_order_batch)
         self.event_engine.unregister(EVENT_CANCEL, self.on_cancel)
         self.event_engine.unregister(EVENT_TRADE, self.on_trade_update)
         self.event_engine.unregister(EVENT_STATUS, self.on_order_status)
@@ -294,12 +632,16 @@ class Strategy(MetaStrategy):
 
     def _reset_ext_base_strategy(self):
         self.order_dict = {}
+        self.order_index.clear()
         self.trade_dict = {}
         self.contract.reset_market_status()
+        self._margin_rate_version = None
         self._position_qty = [0, 0]
         self._cma_price = [0.0, 0.0]
         self._principal = float(self.portfolio_obj.get_principal_by_this_running(self.account_id))
         self._gain = 0.00
+        self._realized_gain = 0.0
+        self._ticks_since_reconcile = self.profit_reconcile_interval  # reconcile on the first tick
 
     def config(self, strategy_setting, cash_check=True):
         """
@@ -308,7 +650,8 @@ class Strategy(MetaStrategy):
         :param cash_check: whether or not to check cash in the configuration
         :return: None
         """
-        if not Strategy.config(self, strategy_setting, cash_check):
+        self._order_templates = {}  # account and contract ids may change
+        if not super().config(strategy_setting, cash_check):
             self.open_times = ""
             self.contract.instrument_id = None
             self.contract.symbol = None
@@ -330,9 +673,34 @@ class Strategy(MetaStrategy):
         settings_dict.update(strategy_setting[self.contract.symbol])
         self.logger.debug(STRATEGY_SETTING_PARAMS, settings_dict)
 
-    def start(self):
+    def _start_workers(self, symbols):
+        """
+        Start the background threads cancelling untraded orders and querying margin and commission rates.
+        :param symbols: list of contract symbols to query margin and commission rates for.
+        :return: None
+        """
+        self.__cancel_pending_orders_thread = Thread(target=self.cancel_untraded_orders)
+        self.__cancel_pending_orders_thread.start()
+        self.__margin_commission_thread = Thread(target=self.query_margin_commission_rate, args=(symbols,))
+        self.__margin_commission_thread.start()
+
+    def _join_workers(self):
+        """
+        Wait for the background threads to finish after the strategy is deactivated.
+        :return: None
+        """
+        if self.__cancel_pending_orders_thread is not None and self.__cancel_pending_orders_thread.is_alive():
+            self.__cancel_pending_orders_thread.join()
+        if self.__margin_commission_thread is not None and self.__margin_commission_thread.is_alive():
+            self.__margin_commission_thread.join()
+
+    def start(self, hosted=False, state=None):
         """
         Start running strategy.
+        :param hosted: bool. If the strategy runs in a MultiStrategyHost, which dispatches its events from a shared
+            event engine and runs the background threads for all its strategies.
+        :param state: dict. Strategy state of snapshot_state() restored after the resets of start for a warm restart,
+            e.g. loaded by snapshot.load_state(). Cold start if None.
         :return: None
         """
         self.logger.info(STRATEGY_START)
@@ -341,21 +709,18 @@ class Strategy(MetaStrategy):
         self._reset_ext_base_strategy()
 
         self.strategy_config_on_start()  # API
+        if state is not None:
+            self.restore_state(state)
 
-        self.__cancel_pending_orders_thread = Thread(target=self.cancel_untraded_orders)
-        self.__cancel_pending_orders_thread.start()
-        self.__margin_commission_thread = Thread(
-            target=self.query_margin_commission_rate, args=([
-                self.contract.symbol,
-            ],))
-        self.__margin_commission_thread.start()
-
-        self._register_event_handlers()
-        self.event_engine.start()
+        if not hosted:
+            self._start_workers([self.contract.symbol])
+            self._register_event_handlers()
+            self.event_engine.start()
 
-    def stop(self):
+    def stop(self, hosted=False):
         """
         Stop running strategy.
+        :param hosted: bool. If the strategy runs in a MultiStrategyHost, which owns the shared event engine.
         :return: None
         """
         self.logger.info(STRATEGY_STOP)
@@ -365,17 +730,17 @@ class Strategy(MetaStrategy):
         self.thread_lock.release()
 
         self.thread_cond.acquire()
-        self.thread_cond.notifyAll()  # wake up margin commission thread
+        self.thread_cond.notify_all()  # wake up margin commission thread
         self.thread_cond.release()
-        if self.__cancel_pending_orders_thread.isAlive():
-            self.__cancel_pending_orders_thread.join()
-        if self.__margin_commission_thread.isAlive():
-            self.__margin_commission_thread.join()
+        self._join_workers()
 
-        self._unregister_event_handlers()
-        self.event_engine.stop()
+        if not hosted:
+            self._unregister_event_handlers()
+            self.event_engine.stop()
 
         self.strategy_config_on_stop()  # API
+        if self.latency is not None:
+            self.latency.dump(self.logger)
 
         self.portfolio_obj.clear_all_accounts()
         self.cancel_before_stop()  # cancel all pending orders
@@ -389,7 +754,9 @@ class Strategy(MetaStrategy):
         :param event: StrategyEvent of EVENT_PROFIT_CHANGED
         :return: None
         """
-        Strategy.profit_change(self, event)
+        if self.event_journal is not None:
+            self.event_journal.record_event(event)
+        super().profit_change(event)
 
     def on_buy(self, event):
         """
@@ -397,6 +764,54 @@ class Strategy(MetaStrategy):
         :param event: StrategyEvent of EVENT_BUY
         :return: None
         """
+        if self.event_journal is not None:
+            self.event_journal.record_event(event)
+        self._buy(event)
+        if self.state_journal is not None:
+            self.state_journal.record(self)
+
+    def on_sell(self, event):
+        """
+        EVENT_SELL handler.
+        :param event: StrategyEvent of EVENT_SELL
+        :return: None
+        """
+        if self.event_journal is not None:
+            self.event_journal.record_event(event)
+        self._sell(event)
+        if self.state_journal is not None:
+            self.state_journal.record(self)
+
+    def on_order_batch(self, event):
+        """
+        EVENT_ORDER_BATCH handler. Legs are placed in order as their EVENT_BUY/EVENT_SELL would be, with order
+        parameters copied from the order templates of their direction.
+        :param event: StrategyEvent of EVENT_ORDER_BATCH
+        :return: None
+        """
+        if self.event_journal is not None:
+            self.event_journal.record_event(event)
+        for action, direction, price, qty, tag in event.even_param_[ORDER_LEGS]:
+            order_para = self._order_template(direction).copy()
+            order_para[PRICE] = price
+            order_para[QTY] = qty
+            order_para[TAG] = tag
+            order_para[ORDER_ACTION] = action
+            if action == BUY:
+                self._buy(StrategyEvent(EVENT_BUY, order_para))
+            else:
+                self._sell(StrategyEvent(EVENT_SELL, order_para))
+        if self.state_journal is not None:
+            self.state_journal.record(self)
+
+    def _buy(self, event):
+        """
+        Check and place the buy order of an EVENT_BUY event, and run the strategy rules on its result.
+        """
+        latency = self.latency
+        if latency is not None:
+            buy_start = perf_counter_ns()
+
         # Check if order price is out of exchange limits
         price_valid = self.contract.low_limit <= event.even_param[PRICE] <= self.contract.high_limit
         if not price_valid:
@@ -408,16 +823,19 @@ class Strategy(MetaStrategy):
             return
 
         # Reduce order qty if not enough cash
+        if latency is not None:
+            cash_check_start = perf_counter_ns()
         order_qty = event.even_param[QTY]
         remaining_cash = self.portfolio_obj.get_remaining_cash(self.account_id)
-        while event.even_param[QTY] > 0 and (
-                remaining_cash < self.calculate_margin(event) + self.calculate_open_commission_with_event(event)):
-            event.even_param[QTY] -= 1
-        if event.even_param[QTY] <= 0:  # Not enough cash to buy any
-            event.even_param[QTY] = order_qty
+        affordable_qty = self._affordable_buy_qty(event, remaining_cash)
+        event.even_param[QTY] = affordable_qty if affordable_qty > 0 else order_qty  # Not enough cash to buy any
+        if latency is not None:
+            latency.record_since(LATENCY_BUY_CASH_CHECK, self.latency_label(), cash_check_start)
 
         # Execute buy action
-        buy_result = Strategy.buy_action(self, event)
+        buy_result = super().buy_action(event)
+        if latency is not None:
+            latency.record_since(LATENCY_ON_BUY, self.latency_label(), buy_start)
 
         # Process buy result depending on buy action success/fail
         if buy_result[ORDER_ACCEPT_FLAG]:
@@ -426,15 +844,14 @@ class Strategy(MetaStrategy):
         else:
             self.strategy_rules_on_buy_fail(event.even_param[TAG])
 
-        # Update profit and cash
-        self._update_profit(instantly=True)
-
-    def on_sell(self, event):
+    def _sell(self, event):
         """
-        EVENT_SELL handler.
-        :param event: StrategyEvent of EVENT_SELL
-        :return: None
+        Check and place the sell order of an EVENT_SELL event, and run the strategy rules on its result.
         """
+        latency = self.latency
+        if latency is not None:
+            sell_start = perf_counter_ns()
+
         # Check if order price is out of range exchange limits
         price_valid = self.contract.low_limit <= event.even_param[PRICE] <= self.contract.high_limit
         if not price_valid:
@@ -457,7 +874,9 @@ class Strategy(MetaStrategy):
             return
 
         # Execute sell action
-        sell_result = Strategy.sell_action(self, event)
+        sell_result = super().sell_action(event)
+        if latency is not None:
+            latency.record_since(LATENCY_ON_SELL, self.latency_label(), sell_start)
 
         # Process sell result depending on sell action success/fail
         if sell_result[ORDER_ACCEPT_FLAG]:
@@ -466,16 +885,15 @@ class Strategy(MetaStrategy):
         else:
             self.strategy_rules_on_sell_fail(event.even_param[TAG])
 
-        # Update profit and cash
-        self._update_profit(instantly=True)
-
     def on_cancel(self, event):
         """
         EVENT_CANCEL handler.
         :param event: StrategyEvent of EVENT_CANCEL
         :return: None
         """
-        Strategy.cancel_action(self, event)
+        if self.event_journal is not None:
+            self.event_journal.record_event(event)
+        super().cancel_action(event)
         self.strategy_rules_on_cancel(event)
 
     def on_tick(self, event):
@@ -484,6 +902,8 @@ class Strategy(MetaStrategy):
         :param event: StrategyEvent of EVENT_MARKETDATA
         :return: None
         """
+        tick_start = perf_counter_ns() if self.latency is not None else None
+
         # Filter symbol
         if event.even_param[INSTRUMENT_SYMBOL] != self.contract.symbol:
             return
@@ -502,22 +922,53 @@ class Strategy(MetaStrategy):
             if self.thread_lock.locked():
                 self.thread_lock.release()
 
+        self._process_tick(event, tick_start)
+
+    def _process_tick(self, event, tick_start=None):
+        """
+        Standard tick processing and strategy rules of a market data event of the contract, once the strategy is
+        checked to be active with valid margin/commission information.
+        :param event: StrategyEvent of EVENT_MARKETDATA.
+        :param tick_start: int. perf_counter_ns() at the tick arrival if latencies are recorded, else None.
+        :return: None
+        """
+        if self.event_journal is not None:
+            self.event_journal.record_event(event)
+
         # Update market status
         try:
             self._update_contract_market(event)
         except (InvalidContractUnit, InvalidTickSize):
             return False
 
-        # Update portfolio
-        self._update_profit(instantly=True)
-        self._gain = self.portfolio_obj.get_gain_by_this_running(self.account_id)
-        self._nlv = self._principal + self._gain
+        # Update profit, incrementally between two reconciliations with the portfolio
+        self._ticks_since_reconcile += 1
+        if self._ticks_since_reconcile >= self.profit_reconcile_interval:
+            self._reconcile_profit()
+        else:
+            self._gain = self._realized_gain + self._unrealized_gain()
+            self._nlv = self._principal + self._gain
 
         # Log
-        self.logger.info(ON_TICK, event.even_param)
+        self.logger.debug(ON_TICK, event.even_param)
+        if self.tick_tracer is not None:
+            self.tick_tracer.on_tick(self)
 
-        # Strategy rules
-        self.strategy_rules_on_tick(event)
+        # Strategy rules, from the first valid last price on
+        if self.contract.last is None:
+            return
+        latency = self.latency
+        if latency is None or tick_start is None:
+            self.strategy_rules_on_tick(event)
+        else:
+            latency.tick_start = tick_start
+            try:
+                self.strategy_rules_on_tick(event)
+            finally:
+                latency.tick_start = None
+            latency.record_since(LATENCY_ON_TICK, self.latency_label(), tick_start)
+        if self.state_journal is not None:
+            self.state_journal.on_tick(self)
 
     def on_trade_update(self, event):
         """
@@ -525,8 +976,11 @@ class Strategy(MetaStrategy):
         :param event: StrategyEvent of EVENT_TRADE.
         :return: None
         """
+        if self.event_journal is not None:
+            self.event_journal.record_event(event)
+
         # Standard update
-        if not Strategy.trade_record_update(self, event):
+        if not super().trade_record_update(event):
             return
 
         # Extended update
@@ -546,18 +1000,30 @@ class Strategy(MetaStrategy):
             order_record.filled_qty + qty)
         order_record.filled_qty += qty
         order_record.trades.append(trade_id)
-
-        # Update position
+        if self.trade_history is not None:
+            self.trade_history.on_fill(trade_record, order_record)
+        if self.metrics is not None:
+            label = self.metric_label()
+            self.metrics.inc(METRIC_FILLS, order_record.tag, label)
+            self.metrics.inc(METRIC_FILLED_QTY, order_record.tag, label, qty)
+
+        # Update position and profit
         self._update_position_avg_price_on_trade(event)
+        self._reconcile_profit()
 
         # Strategy rules
         self.strategy_rules_on_trade_update(order_id, trade_id)
+        if self.state_journal is not None:
+            self.state_journal.record(self)
 
     def on_order_status(self, event):
         """
         EVENT_STATUS handler.
         :param event: StrategyEvent of EVENT_STATUS.
         """
+        if self.event_journal is not None:
+            self.event_journal.record_event(event)
+
         # Standard update
         try:
             self.thread_lock.acquire()  # thread_lock acquiring to access portfolio_obj
@@ -568,12 +1034,12 @@ class Strategy(MetaStrategy):
                 return
             self.logger.debug(ON_UPDATE_ORDER_STATUS, self.portfolio_id, event.even_param)
             order_status = event.even_param[ORDER_STATUS]
-            self.logger.debug("Event_Status: Order ID = {}  Status = {}".format(order_id, order_status))
+            self.logger.debug("Event_Status: Order ID = %s  Status = %s", order_id, order_status)
             if order_status not in (ORDER_CLOSED_ALIAS, ORDER_REJECTED, ORDER_CANCELLED, ORDER_REPEAT_CANCEL):
                 return
             if order_status == ORDER_CLOSED_ALIAS:
                 order_status = ORDER_CLOSED
-            Strategy.order_status_update(self, {ORDER_ID: order_id, ORDER_STATUS: order_status})
+            super().order_status_update({ORDER_ID: order_id, ORDER_STATUS: order_status})
             self.portfolio_obj.is_reset_for_accounts()
 
         except Exception:
@@ -598,11 +1064,18 @@ class Strategy(MetaStrategy):
                     self.logger.error("trade_dict key error when removing order trades: \n" + str(e))
                     continue
             self.order_dict.pop(order_id)  # Remove the OrderRecord object in order dictionary
+            self.order_index.remove(order_record)
+            if self.trade_history is not None:
+                self.trade_history.on_order_finished(order_record, order_status)
+            if self.metrics is not None and order_status in (ORDER_CANCELLED, ORDER_REPEAT_CANCEL):
+                self.metrics.inc(METRIC_ORDERS_CANCELLED, order_record.tag, self.metric_label())
         else:  # Order not finished yet. Update status only.
             self.order_dict[order_id].status = order_status
 
         # Strategy rules
         self.strategy_rules_on_order_status(order_id, order_status)
+        if self.state_journal is not None:
+            self.state_journal.record(self)
 
     # --- Utilities for market status, account, position, order and trades management --- #
 
@@ -621,22 +1094,46 @@ class Strategy(MetaStrategy):
         self.logger.debug(ON_PROFIT_CHANGE, profit_para)
         profit_event = StrategyEvent(EVENT_PROFIT_CHANGED, profit_para)
         if instantly:
-            Strategy.profit_change(self, profit_event)
+            super().profit_change(profit_event)
         else:
             self.event_engine.put(profit_event)
 
+    def _unrealized_gain(self):
+        """
+        :return: float. Gain of the long/short positions at the last price, 0 until the last price is known.
+        """
+        last = self.contract.last
+        if last is None:
+            return 0.0
+        position_qty, cma_price = self._position_qty, self._cma_price
+        return ((last - cma_price[0]) * position_qty[0] - (last - cma_price[1]) * position_qty[1]) * self.contract.unit
+
+    def _reconcile_profit(self):
+        """
+        Update the portfolio profit at the last price and reset the incremental profit to the portfolio gain.
+        :return: None
+        """
+        self._update_profit(instantly=True)
+        self._gain = self.portfolio_obj.get_gain_by_this_running(self.account_id)
+        self._nlv = self._principal + self._gain
+        self._realized_gain = self._gain - self._unrealized_gain()
+        # Without last price the portfolio gain is not marked to market, reconcile again on the next tick
+        self._ticks_since_reconcile = 0 if self.contract.last is not None else self.profit_reconcile_interval
+
     def _check_margin_fee(self):
         """
-        Check and update margin requirements and commission fee.
+        Check margin requirements and commission fee, and update them when the platform rates of the contract changed.
         *** Strategy thread_lock acquiring needed to call this method. ***
         :return: None
         """
-        if len(self.instru_margin_comm_rate) == 0:
+        contract = self.contract
+        if contract.symbol not in self._margin_rates:  # rates may be shared with strategies of other symbols
             raise InvalidMarginFee
-        self.contract.margin_fee = {
-            d: self.query_margin_rate(d, self.contract.symbol)
-            for d in (DIRECTION_LONG, DIRECTION_SHORT)
-        }
+        version = self.margin_rate_version(contract.symbol)
+        if version != self._margin_rate_version:
+            contract.set_margin_fee(DIRECTION_LONG, self.query_margin_rate(DIRECTION_LONG, contract.symbol))
+            contract.set_margin_fee(DIRECTION_SHORT, self.query_margin_rate(DIRECTION_SHORT, contract.symbol))
+            self._margin_rate_version = version
 
     def _update_contract_market(self, event):
         """
@@ -645,48 +1142,41 @@ class Strategy(MetaStrategy):
         :return: success flag (bool)
         """
         # Update contract unit and price tick
+        param = event.even_param
+        contract = self.contract
+        unit_size, tick_size = param[UNIT_SIZE], param[TICK_SIZE]
         if self.cache_flag:
-            if event.even_param[UNIT_SIZE] != INVALID_VALUE:
-                self.instru_unit_size[self.contract.symbol] = event.even_param[UNIT_SIZE]
-            if event.even_param[TICK_SIZE] != INVALID_VALUE:
-                self.instru_price_tick[self.contract.symbol] = event.even_param[TICK_SIZE]
+            if unit_size != INVALID_VALUE:
+                self.instru_unit_size[contract.symbol] = unit_size
+            if tick_size != INVALID_VALUE:
+                self.instru_price_tick[contract.symbol] = tick_size
                 self.cache_flag = False
-        self.contract.unit = self.instru_unit_size[self.contract.symbol] \
-            if (event.even_param[UNIT_SIZE] - INVALID_VALUE < COMPARED_FLOAT) else event.even_param[UNIT_SIZE]
-        self.contract.tick = self.instru_price_tick[self.contract.symbol] \
-            if event.even_param[TICK_SIZE] - INVALID_VALUE < COMPARED_FLOAT else event.even_param[TICK_SIZE]
-        if not isinstance(self.contract.unit, (int, float)):
+        unit = self.instru_unit_size[contract.symbol] if unit_size - INVALID_VALUE < COMPARED_FLOAT else unit_size
+        tick = self.instru_price_tick[contract.symbol] if tick_size - INVALID_VALUE < COMPARED_FLOAT else tick_size
+        if not isinstance(unit, (int, float)):
             raise InvalidContractUnit
-        if not isinstance(self.contract.tick, (int, float)):
+        if not isinstance(tick, (int, float)):
             raise InvalidTickSize
-        self.contract.decimal = get_number_of_decimal(self.contract.tick)
-
-        # Update prices and volumes
-        fields_map = {
-            LOW_LIMIT: 'low_limit',
-            HIGH_LIMIT: 'high_limit',
-            PRICE: 'last',
-            BID: 'bid',
-            ASK: 'ask',
-            BID_VOLUME: 'bid_volume',
-            ASK_VOLUME: 'ask_volume'
-        }
-        for field, attr_name in fields_map.items():
-            field_value = None
-            try:
-                if not isinstance(event.even_param[field], (int, float)) or event.even_param[field] < 0:
-                    raise TypeError
-                if field in (BID_VOLUME, ASK_VOLUME):
-                    field_value = int(round(event.even_param[field]))
-                else:
-                    field_value = round(
-                        round(event.even_param[field] / float(self.contract.tick)) * self.contract.tick,
-                        self.contract.decimal)
-                setattr(self.contract, attr_name, field_value)
-            except Exception:  # TypeError or KeyError
-                self.logger.debug("Market data exception: field = {} attr = {} val = {}".format(
-                    field, attr_name, field_value))
-                pass
+        contract.set_unit(unit)
+        contract.set_tick(tick)  # price decimal is cached until tick size changes
+
+        # Update prices and volumes. Invalid or missing values keep the previous ones.
+        price_cache = contract.price_cache
+        for field, attr_name, ticks_attr_name in MARKET_PRICE_FIELDS:
+            value = param.get(field)
+            if isinstance(value, (int, float)) and 0 <= value < INFINITY:
+                n_ticks = int(round(value / tick))
+                setattr(contract, ticks_attr_name, n_ticks)
+                price = price_cache.get(n_ticks)
+                setattr(contract, attr_name, contract.to_price(n_ticks) if price is None else price)
+            else:
+                self.logger.debug("Market data exception: field = %s val = %s", field, value)
+        for field, attr_name in MARKET_VOLUME_FIELDS:
+            value = param.get(field)
+            if isinstance(value, (int, float)) and 0 <= value < INFINITY:
+                setattr(contract, attr_name, int(round(value)))
+            else:
+                self.logger.debug("Market data exception: field = %s val = %s", field, value)
 
     def _update_position_avg_price_on_trade(self, event):
         """
@@ -707,8 +1197,8 @@ class Strategy(MetaStrategy):
             return
         update_position_avg_price(self._position_qty, self._cma_price, trade_action, trade_direction, trade_price,
                                   trade_qty)
-        self.logger.debug("Position avg price updated: trade_direction = {} new cma = {} new qty = {}".format(
-            trade_direction, self._cma_price, self._position_qty))
+        self.logger.debug("Position avg price updated: trade_direction = %s new cma = %s new qty = %s",
+                          trade_direction, self._cma_price, self._position_qty)
 
     def _save_orders_on_buy_sell(self, buy_sell_result, tag=TAG_DEFAULT_VALUE):
         """
@@ -734,72 +1224,133 @@ class Strategy(MetaStrategy):
 
             # Add order record object to order dictionary
             self.order_dict[order_id] = order_record
+            self.order_index.add(order_record)
+            if self.trade_history is not None:
+                self.trade_history.on_order(order_record)
+            if self.metrics is not None:
+                self.metrics.inc(METRIC_ORDERS_SENT, tag, self.metric_label())
             new_order_ids.append(order_id)
         return new_order_ids
 
+    def _affordable_buy_qty(self, event, remaining_cash):
+        """
+        Max quantity of a buy order, up to the order quantity, whose margin and open commission fit in the cash.
+        The quantity is computed in closed form from the fee rates of ratio and fixed fee types, and checked against the
+        platform fee calculation: it must be affordable and one more contract not. Other fee types, and closed forms
+        failing the check, are sized by binary search on the platform fee calculation.
+        :param event: StrategyEvent of EVENT_BUY. Its QTY is changed during the search and restored on return.
+        :param remaining_cash: float. Cash available for the order.
+        :return: int. 0 if not even one contract is affordable.
+        """
+        param = event.even_param
+        order_qty = param[QTY]
+
+        def is_affordable(qty):
+            param[QTY] = qty
+            return remaining_cash >= self.calculate_margin(event) + self.calculate_open_commission_with_event(event)
+
+        if order_qty <= 0 or is_affordable(order_qty):
+            return order_qty
+
+        qty = None
+        if param[MARGIN_TYPE] in LINEAR_FEE_TYPES and param[OPEN_COMM_TYPE] in LINEAR_FEE_TYPES:
+            unit_fee = (calc_fee(param[MARGIN_TYPE], param[MARGIN_RATE], param[PRICE], 1, param[UNIT_SIZE]) +
+                        calc_fee(param[OPEN_COMM_TYPE], param[OPEN_COMM_RATE], param[PRICE], 1, param[UNIT_SIZE]))
+            if unit_fee > 0:
+                qty = max(0, min(order_qty - 1, int(remaining_cash // unit_fee)))
+                # Fix float rounding of the closed form
+                if qty < order_qty - 1 and is_affordable(qty + 1):
+                    qty += 1
+                elif qty > 0 and not is_affordable(qty):
+                    qty -= 1
+                # The platform fees may differ from calc_fee, e.g. by minimum commissions or per lot rounding
+                if (qty > 0 and not is_affordable(qty)) or (qty < order_qty - 1 and is_affordable(qty + 1)):
+                    qty = None
+        if qty is None:
+            low, high = 0, order_qty - 1
+            while low < high:
+                mid = (low + high + 1) // 2
+                if is_affordable(mid):
+                    low = mid
+                else:
+                    high = mid - 1
+            qty = low
+        param[QTY] = order_qty
+        return qty
+
     # --- Utilities for executing strategy --- #
 
+    def _order_template(self, direction):
+        """
+        Order parameters are built by copying a template, cached until the contract specs or margin/commission rates
+        change, and setting price, qty, tag and action.
+        :param direction: DIRECTION_LONG or DIRECTION_SHORT
+        :return: dict. Order parameters of the contract in a direction but for price, qty, tag and action. Not to be
+            modified.
+        """
+        contract = self.contract
+        cached = self._order_templates.get(direction)
+        if cached is not None and cached[0] == contract.spec_version:
+            return cached[1]
+        margin_fee = contract.margin_fee[direction]
+        template = {
+            ACCOUNT_ID: self.account_id,
+            PORTFOLIO_ID: self.portfolio_id,
+            INSTRUMENT_ID: contract.instrument_id,
+            INSTRUMENT_SYMBOL: contract.symbol,
+            DIRECTION: direction,
+            UNIT_SIZE: contract.unit,
+            MARGIN_TYPE: margin_fee[MARGIN_TYPE],
+            MARGIN_RATE: margin_fee[MARGIN_RATE],
+            OPEN_COMM_TYPE: margin_fee[OPEN_COMM_TYPE],
+            OPEN_COMM_RATE: margin_fee[OPEN_COMM_RATE],
+            CLOSE_COMM_TYPE: margin_fee[CLOSE_COMM_TYPE],
+            CLOSE_COMM_RATE: margin_fee[CLOSE_COMM_RATE],
+            CLOSE_TODAY_COMM_RATE: margin_fee[CLOSE_TODAY_COMM_RATE],
+            APP_ID: self.app_id
+        }
+        self._order_templates[direction] = (contract.spec_version, template)
+        return template
+
     def send_limit_order(self, order_params_list):
         """
         Repack order_params with other params and put buy/sell events in engine.
+        A single order is put as an EVENT_BUY or EVENT_SELL event, and several orders, e.g. the sell and buy legs of a
+        split order, as one EVENT_ORDER_BATCH event of (action, direction, price, qty, tag) legs placed in order.
         :param order_params_list: List of order params dictionaries returned from calc_order_params().
         :return: None
         """
-        for order_params in order_params_list:
-            if order_params['qty'] > 0:
-                order_para = {
-                    ACCOUNT_ID:
-                    self.account_id,
-                    PORTFOLIO_ID:
-                    self.portfolio_id,
-                    INSTRUMENT_ID:
-                    self.contract.instrument_id,
-                    INSTRUMENT_SYMBOL:
-                    self.contract.symbol,
-                    DIRECTION:
-                    order_params['direction'],
-                    PRICE:
-                    round(
-                        round(float(order_params['price']) / self.contract.tick) * self.contract.tick,
-                        self.contract.decimal),
-                    QTY:
-                    order_params['qty'],
-                    TAG:
-                    TAG_DEFAULT_VALUE if order_params['tag'] is None else order_params['tag'],
-                    ORDER_ACTION:
-                    order_params['action'],
-                    UNIT_SIZE:
-                    self.contract.unit,
-                    MARGIN_TYPE:
-                    self.contract.margin_fee[order_params['direction']][MARGIN_TYPE],
-                    MARGIN_RATE:
-                    self.contract.margin_fee[order_params['direction']][MARGIN_RATE],
-                    OPEN_COMM_TYPE:
-                    self.contract.margin_fee[order_params['direction']][OPEN_COMM_TYPE],
-                    OPEN_COMM_RATE:
-                    self.contract.margin_fee[order_params['direction']][OPEN_COMM_RATE],
-                    CLOSE_COMM_TYPE:
-                    self.contract.margin_fee[order_params['direction']][CLOSE_COMM_TYPE],
-                    CLOSE_COMM_RATE:
-                    self.contract.margin_fee[order_params['direction']][CLOSE_COMM_RATE],
-                    CLOSE_TODAY_COMM_RATE:
-                    self.contract.margin_fee[order_params['direction']][CLOSE_TODAY_COMM_RATE],
-                    APP_ID:
-                    self.app_id
-                }
-                order_event = StrategyEvent({
-                    BUY: EVENT_BUY,
-                    SELL: EVENT_SELL
-                }[order_params['action']], order_para)
-                self.event_engine.put(order_event)
-                self.logger.debug({BUY: ON_BUY, SELL: ON_SELL}[order_params['action']], order_para)
+        round_price = self.contract.round_price
+        legs = [(order_params['action'], order_params['direction'], round_price(float(order_params['price'])),
+                 order_params['qty'], TAG_DEFAULT_VALUE if order_params['tag'] is None else order_params['tag'])
+                for order_params in order_params_list if order_params['qty'] > 0]
+        if not legs:
+            return
+        if len(legs) == 1:
+            action, direction, price, qty, tag = legs[0]
+            order_para = self._order_template(direction).copy()
+            order_para[PRICE] = price
+            order_para[QTY] = qty
+            order_para[TAG] = tag
+            order_para[ORDER_ACTION] = action
+            self.event_engine.put(StrategyEvent(EVENT_BUY if action == BUY else EVENT_SELL, order_para))
+            self.logger.debug(ON_BUY if action == BUY else ON_SELL, order_para)
+        else:
+            batch_para = {INSTRUMENT_SYMBOL: self.contract.symbol, ORDER_LEGS: tuple(legs)}
+            self.event_engine.put(StrategyEvent(EVENT_ORDER_BATCH, batch_para))
+            self.logger.debug(ON_ORDER_BATCH, batch_para)
+        if self.latency is not None and self.latency.tick_start is not None:
+            self.latency.record_since(LATENCY_TICK_TO_ORDER, self.latency_label(), self.latency.tick_start)
 
     def cancel_all_orders(self):
         """
         Cancel all pending orders.
         :return: None
         """
-        self.event_engine.put(StrategyEvent(EVENT_CANCEL, {CANCEL_TYPE: CANCEL_ALL}))
+        self.event_engine.put(StrategyEvent(EVENT_CANCEL, {
+            CANCEL_TYPE: CANCEL_ALL,
+            INSTRUMENT_SYMBOL: self.contract.symbol
+        }))
         self.logger.debug("The event[EVENT_CANCEL] (CANCEL_ALL) is being triggered.")
 
     def cancel_orders(self, order_ids):
@@ -808,7 +1359,11 @@ class Strategy(MetaStrategy):
         :param order_ids: iterable. Order id strings.
         :return: None.
         """
-        self.event_engine.put(StrategyEvent(EVENT_CANCEL, {CANCEL_TYPE: CANCEL_ORDERS, ORDER_IDS: order_ids}))
+        self.event_engine.put(StrategyEvent(EVENT_CANCEL, {
+            CANCEL_TYPE: CANCEL_ORDERS,
+            ORDER_IDS: order_ids,
+            INSTRUMENT_SYMBOL: self.contract.symbol
+        }))
         self.logger.debug("The event[EVENT_CANCEL] is being triggered for orders: %s." % order_ids)
 
     def run_adaptive_order(self, adaptive_order_obj):
@@ -938,4 +1493,16 @@ def update_position_avg_price_2way(cma_price, position_qty, trade_action, trade_
     else:
         realized_gain = 0
 
-    return cma_price_new, position_qty_new, realized_gain
\ No newline at end of file
+    return cma_price_new, position_qty_new, realized_gain
+
+
+def calc_fee(fee_type, fee_rate, price, qty, unit):
+    """
+    Calculate margin or commission fee of an order.
+    :param fee_type: FEE_TYPE_RATIO or FEE_TYPE_FIXED.
+    :param fee_rate: float. Rate of order value, or amount per contract.
+    :return: float
+    """
+    if fee_type == FEE_TYPE_FIXED:
+        return fee_rate * qty
+    return fee_rate * price * qty * unit
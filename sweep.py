@@ -0,0 +1,232 @@
+"""
+Parallel parameter sweep of strategy configs with backtests in a process pool.
+
+Ticks are either a tick store memory-mapped by every worker, or copied once into a shared memory block that every
+worker attaches read-only, so tasks only carry the strategy parameters and return the summary metrics of their backtest.
+"""
+
+
+import copy
+import itertools
+import os
+from array import array
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+from backtest import Backtester
+from clock import parse_time
+from tick_store import TickStore
+
+
+class SharedTicks:
+    """
+    Ticks stored as columns in a shared memory block: time as int64 nanoseconds since epoch, then price, bid, ask,
+    bid_volume, ask_volume, high_limit, low_limit as float64.
+    Tick times are converted like Backtester.run() does, so sweeps replay the same clock times as serial backtests.
+    """
+    COLUMN_NAMES = ('time', 'price', 'bid', 'ask', 'bid_volume', 'ask_volume', 'high_limit', 'low_limit')
+    N_COLUMNS = 8
+
+    def __init__(self, shm, n_ticks, owner=False):
+        self.shm = shm
+        self.n_ticks = n_ticks
+        self._owner = owner
+        size = n_ticks * 8
+        self._columns = [shm.buf[:size].cast('q')]
+        view = shm.buf[size:size * self.N_COLUMNS].cast('d')
+        self._columns += [view[i * n_ticks:(i + 1) * n_ticks] for i in range(self.N_COLUMNS - 1)]
+
+    @classmethod
+    def create(cls, ticks, time_unit='s'):
+        """
+        Copy ticks to a new shared memory block.
+        :param ticks: iterable of (time, price, bid, ask, bid_volume, ask_volume, high_limit, low_limit) tuples.
+        :param time_unit: str. Unit of non-int tick times, see clock.parse_time(). Int times are nanoseconds.
+        :return: SharedTicks owning the block.
+        """
+        times = array('q')
+        columns = [array('d') for _ in range(cls.N_COLUMNS - 1)]
+        for tick in ticks:
+            tick_time = tick[0]
+            times.append(tick_time if tick_time.__class__ is int else parse_time(tick_time, time_unit))
+            for column, value in zip(columns, tick[1:]):
+                column.append(value)
+        n_ticks = len(times)
+        size = n_ticks * 8
+        shm = SharedMemory(create=True, size=max(1, size * cls.N_COLUMNS))
+        time_view = shm.buf[:size].cast('q')
+        time_view[:] = times
+        time_view.release()
+        view = shm.buf[size:size * cls.N_COLUMNS].cast('d')
+        for i, column in enumerate(columns):
+            view[i * n_ticks:(i + 1) * n_ticks] = column
+        view.release()
+        return cls(shm, n_ticks, owner=True)
+
+    @classmethod
+    def attach(cls, name, n_ticks):
+        return cls(SharedMemory(name=name), n_ticks)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def __len__(self):
+        return self.n_ticks
+
+    def __iter__(self):
+        return self.slice(0, self.n_ticks)
+
+    def column(self, name):
+        """
+        :return: memoryview of a column, e.g. 'price'.
+        """
+        return self._columns[self.COLUMN_NAMES.index(name)]
+
+    def slice(self, start, stop):
+        """
+        :return: iterator of ticks [start, stop).
+        """
+        time, price, bid, ask, bid_volume, ask_volume, high_limit, low_limit = (
+            column[start:stop] for column in self._columns)
+        return zip(time, price, bid, ask, map(int, bid_volume), map(int, ask_volume), high_limit, low_limit)
+
+    def close(self):
+        """
+        Detach the block. The owner also frees it.
+        """
+        for column in self._columns:
+            column.release()
+        self._columns = []
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
+def param_grid(base_params, grid):
+    """
+    Expand a parameter grid into a list of strategy parameter dicts.
+    :param base_params: dict. Strategy parameters shared by all configs.
+    :param grid: dict. Lists of values to sweep by parameter name. A tuple key is the path of a nested parameter,
+        e.g. (OPEN_OFFSET_VOLUME, 'Net').
+    :return: list of dicts. Cartesian product of the grid values over the base parameters.
+    """
+    keys = list(grid)
+    params_list = []
+    for values in itertools.product(*(grid[key] for key in keys)):
+        params = copy.deepcopy(base_params)
+        for key, value in zip(keys, values):
+            path = key if isinstance(key, tuple) else (key,)
+            target = params
+            for name in path[:-1]:
+                target = target[name]
+            target[path[-1]] = value
+        params_list.append(params)
+    return params_list
+
+
+# Per worker process state set by _init_worker().
+_worker = {}
+
+
+def _init_worker(ticks_source, backtest_kwargs):
+    # ticks_source is a TickStore re-opened by unpickling, or the name and size of a SharedTicks block.
+    _worker['ticks'] = ticks_source if isinstance(ticks_source, TickStore) else SharedTicks.attach(*ticks_source)
+    _worker['backtest_kwargs'] = backtest_kwargs
+
+
+def _run_one(task):
+    index, strategy_params, window = task
+    ticks = _worker['ticks'] if window is None else _worker['ticks'].slice(*window)
+    backtester = Backtester(strategy_params=strategy_params, **_worker['backtest_kwargs'])
+    try:
+        result = backtester.run(ticks).as_dict()
+    except Exception as e:
+        result = {'error': repr(e)}
+    return index, strategy_params, result
+
+
+def run_sweep(strategy_cls,
+              params_list,
+              ticks,
+              symbol,
+              tick_size,
+              unit_size,
+              principal=1000000.0,
+              margin_fee=None,
+              processes=None,
+              windows=None,
+              max_drawdown=None):
+    """
+    Backtest every strategy config of params_list in parallel on the same ticks, or on a window of them.
+    :param strategy_cls: Strategy subclass, e.g. SwingStrategy. Must be importable by worker processes.
+    :param params_list: list of strategy parameter dicts.
+    :param ticks: TickStore, SharedTicks, or iterable of tick tuples copied to shared memory for the sweep.
+    :param symbol, tick_size, unit_size, principal, margin_fee: Backtester arguments.
+    :param processes: int. Number of worker processes. Number of CPUs if None.
+    :param windows: list of (start, stop) tick index ranges, the window of each config of params_list. All ticks if
+        None.
+    :param max_drawdown: float. Backtests stop once their drawdown exceeds it. No limit if None.
+    :return: Generator of (index, strategy_params, result dict) in completion order. The result dict is
+        BacktestResult.as_dict(), or {'error': ...} if the backtest raised.
+    """
+    if isinstance(ticks, (TickStore, SharedTicks)):
+        shared_ticks = ticks
+    else:
+        shared_ticks = SharedTicks.create(ticks)
+    ticks_source = ticks if isinstance(ticks, TickStore) else (shared_ticks.name, shared_ticks.n_ticks)
+    backtest_kwargs = {
+        'strategy_cls': strategy_cls,
+        'symbol': symbol,
+        'tick_size': tick_size,
+        'unit_size': unit_size,
+        'principal': principal,
+        'margin_fee': margin_fee,
+        'max_drawdown': max_drawdown
+    }
+    tasks = [(index, strategy_params, None if windows is None else windows[index])
+             for index, strategy_params in enumerate(params_list)]
+    try:
+        with Pool(processes or os.cpu_count(), _init_worker, (ticks_source, backtest_kwargs)) as pool:
+            for item in pool.imap_unordered(_run_one, tasks):
+                yield item
+    finally:
+        if shared_ticks is not ticks:
+            shared_ticks.close()
+
+
+def main():
+    import argparse
+    import json
+    import sys
+    from backtest import read_csv_ticks
+    from swing_strategy import SwingStrategy
+
+    parser = argparse.ArgumentParser(description='Sweep SwingStrategy parameters on a CSV tick file or tick store.')
+    parser.add_argument('ticks', help='CSV tick file, or tick store directory.')
+    parser.add_argument('params', help='JSON file of base SwingStrategy parameters.')
+    parser.add_argument('grid', help='JSON file of parameter value lists. Nested parameters are "NAME.KEY".')
+    parser.add_argument('--symbol', required=True)
+    parser.add_argument('--tick-size', type=float, required=True)
+    parser.add_argument('--unit-size', type=float, required=True)
+    parser.add_argument('--principal', type=float, default=1000000.0)
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.params) as f:
+        base_params = json.load(f)
+    with open(args.grid) as f:
+        grid = {tuple(key.split('.')) if '.' in key else key: values for key, values in json.load(f).items()}
+    params_list = param_grid(base_params, grid)
+    ticks = TickStore(args.ticks) if os.path.isdir(args.ticks) else read_csv_ticks(args.ticks)
+    for index, strategy_params, result in run_sweep(SwingStrategy, params_list, ticks,
+                                                    args.symbol, args.tick_size, args.unit_size, args.principal,
+                                                    processes=args.processes):
+        if 'state_transitions' in result:
+            result['state_transitions'] = {'{}->{}'.format(*k): v for k, v in result['state_transitions'].items()}
+        json.dump({'index': index, 'params': strategy_params, 'result': result}, sys.stdout)
+        sys.stdout.write('\n')
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 # encoding: utf-8
 
+from logging import DEBUG
 from math import floor
 from constants import DIRECTION, DIRECTION_LONG, DIRECTION_SHORT, PRICE, BUY, SELL
 from strategy import REQ, SPLIT
@@ -7,6 +8,8 @@ from strategy import calc_order_params
 from strategy import Strategy
 from advanced_orders import AdaptiveOrder
 from grid_osc_strategy import GridOsc
+from metrics import METRIC_REALIZED_GAIN, METRIC_K_INCREMENTS, METRIC_ZONE_EXPANSIONS, METRIC_ZONE_SWITCHES
+from metrics import METRIC_REVERSALS, METRIC_RISKY_ACTIVATIONS, METRIC_FAR_CANCELS
 
 
 # Swing strategy user parameter field names
@@ -23,6 +26,14 @@ TREND_REVERSAL_PRICE_TRAIL_RATIO = 'TREND_REVERSAL_PRICE_TRAIL_RATIO'
 MIN_OSC_HEIGHT = 'MIN_OSC_HEIGHT'
 RISKY_ZONE_ACTIVATE_LOSS_RATIO = 'RISKY_ZONE_ACTIVATE_LOSS_RATIO'
 
+# Swing strategy state snapshot components
+SNAPSHOT_SWING = 'swing'
+SNAPSHOT_ZONE = 'zone'  # keyed by (SNAPSHOT_ZONE, zone tag)
+SNAPSHOT_RISKY_OSC_ZONE = 'risky_osc_zone'
+SNAPSHOT_REVERSAL_ORDERS = 'reversal_orders'
+SNAPSHOT_RISKY_INIT_ORDERS = 'risky_init_orders'
+SNAPSHOT_STOP_ORDERS = 'stop_orders'
+
 
 class SwingStrategy(Strategy):
     """
@@ -62,6 +73,8 @@ class SwingStrategy(Strategy):
     # Strategy states
     (SWING_START, SWING_GRID_OSC, SWING_REVERSAL, SWING_RISKY_INIT, SWING_RISKY_OSC, SWING_STOP, SWING_FINISH) = range(
         800, 800 + 7)
+    STATE_NAMES = dict(zip(range(800, 800 + 7), ('SWING_START', 'SWING_GRID_OSC', 'SWING_REVERSAL', 'SWING_RISKY_INIT',
+                                                 'SWING_RISKY_OSC', 'SWING_STOP', 'SWING_FINISH')))
 
     def __init__(self):
         Strategy.__init__(self)
@@ -179,8 +192,8 @@ class SwingStrategy(Strategy):
         pass
 
     def _swing_start_run(self):
-        self.logger.debug("SWING_START: waiting for trigger. long_short={} open price={} last price={}".format(
-            self._long_short, self.p0, self.contract.last))
+        self.logger.debug("SWING_START: waiting for trigger. long_short=%s open price=%s last price=%s",
+                          self._long_short, self.p0, self.contract.last)
         if (1 - 2 * self._long_short) * (self.contract.last - self.p0) > 0:
             return False
         if 'Net' not in self.start_zone:
@@ -241,6 +254,9 @@ class SwingStrategy(Strategy):
             close_bound = open_bound + d * self.N_GRIDS * self.ph
 
         self._active_zone = self._zones[self.ZONE_NAMES[start_zone_index]]
+        if self.metrics is not None:
+            for zone in self._zones.values():
+                self.metrics.set_zone(zone)
 
     def _is_trailing_stop_on_gain_triggered(self):
         """
@@ -257,10 +273,9 @@ class SwingStrategy(Strategy):
         trailing_target = round(self.gt * self._max_gain, 2)
         is_triggered = is_gain_valid and self._max_gain >= target_gain and trailing_amount >= trailing_target
         self.logger.debug(
-            "SWING Trailing Stop: LowBound = {}  gain = {}  is_valid = {}  max_gain = {}  target_gain = {} "
-            "trail_amt = {}  trail_target = {}  triggered = {}".format(gain_lower_bound, self._gain, is_gain_valid,
-                                                                       self._max_gain, target_gain, trailing_amount,
-                                                                       trailing_target, is_triggered))
+            "SWING Trailing Stop: LowBound = %s  gain = %s  is_valid = %s  max_gain = %s  target_gain = %s "
+            "trail_amt = %s  trail_target = %s  triggered = %s", gain_lower_bound, self._gain, is_gain_valid,
+            self._max_gain, target_gain, trailing_amount, trailing_target, is_triggered)
         return is_triggered
 
     def _swing_grid_osc_transition(self):
@@ -279,7 +294,7 @@ class SwingStrategy(Strategy):
                 self._state = self._next_state_after_cleanup
                 self._state_cleanup = False
                 self._next_state_after_cleanup = None
-                self.logger.debug("SWING_GRID_OSC -> {}: After Cleanup".format(self._state))
+                self.logger.debug("SWING_GRID_OSC -> %s: After Cleanup", self._state)
 
         # To SWING_STOP
         elif self._is_trailing_stop_on_gain_triggered():
@@ -300,9 +315,11 @@ class SwingStrategy(Strategy):
             reversal_trail = (1 - 2 * self._long_short) * (1 - self.contract.last / self._dec_peak)
             reversal_triggerred = reversal_trail > self.pls
             self.logger.debug(
-                "SWING_GRID_OSC: _dec_peak={} last_price={} trail_ratio={} target_ratio={} reversal_triggerred={}".
-                format(self._dec_peak, self.contract.last, reversal_trail, self.pls, reversal_triggerred))
+                "SWING_GRID_OSC: _dec_peak=%s last_price=%s trail_ratio=%s target_ratio=%s reversal_triggerred=%s",
+                self._dec_peak, self.contract.last, reversal_trail, self.pls, reversal_triggerred)
             if reversal_triggerred:
+                if self.metrics is not None:
+                    self.metrics.inc(METRIC_REVERSALS, self._active_zone.tag, self.metric_label())
                 if self.order_dict:
                     self._state_cleanup = True
                     self._next_state_after_cleanup = self.SWING_REVERSAL
@@ -329,11 +346,12 @@ class SwingStrategy(Strategy):
                 int(floor(r * risky_init_order_qty))
                 for r in (self.RISKY_OSC_BUY_BACK_QTY_RATIO, self.RISKY_OSC_SELL_OFF_QTY_RATIO))
             self.logger.debug(
-                "SWING_GRID_OSC -> SWING_RISKY_INIT: risky_base_val={} target_val={} nlv={} value_triggered={}"
-                " order_qty={} osc_min_order_qty={}".format(self._risky_base_val, risky_init_value_trail_target,
-                                                            self._nlv, risky_init_value_trail_triggered,
-                                                            risky_init_order_qty, risky_osc_min_order_qty))
+                "SWING_GRID_OSC -> SWING_RISKY_INIT: risky_base_val=%s target_val=%s nlv=%s value_triggered=%s"
+                " order_qty=%s osc_min_order_qty=%s", self._risky_base_val, risky_init_value_trail_target, self._nlv,
+                risky_init_value_trail_triggered, risky_init_order_qty, risky_osc_min_order_qty)
             if risky_init_value_trail_triggered and risky_init_order_qty > 0 and risky_osc_min_order_qty > 0:
+                if self.metrics is not None:
+                    self.metrics.inc(METRIC_RISKY_ACTIVATIONS, self._active_zone.tag, self.metric_label())
                 self._risky_init_order_qty = risky_init_order_qty
                 self._risky_base_qty = position_qty
                 if self.order_dict:
@@ -367,7 +385,7 @@ class SwingStrategy(Strategy):
                 self._state = self._next_state_after_cleanup
                 self._state_cleanup = False
                 self._next_state_after_cleanup = None
-                self.logger.debug("SWING_RISKY_OSC -> {}: After Cleanup".format(self._state))
+                self.logger.debug("SWING_RISKY_OSC -> %s: After Cleanup", self._state)
 
         # To SWING_STOP
         elif self._is_trailing_stop_on_gain_triggered():
@@ -407,8 +425,8 @@ class SwingStrategy(Strategy):
             self._risky_base_qty = (1 - 2 * self._long_short) * (self._position_qty[0] - self._position_qty[1])
             self._risky_cut_qty = 0
             self._risky_cut_price = 0.0
-            self.logger.debug("SWING_RISKY_OSC -> {}: NEW risky_base_val={} risky_base_qty={}".format(
-                self._state, self._risky_base_val, self._risky_base_qty))
+            self.logger.debug("SWING_RISKY_OSC -> %s: NEW risky_base_val=%s risky_base_qty=%s", self._state,
+                              self._risky_base_val, self._risky_base_qty)
 
         return self._state_cleanup
 
@@ -416,12 +434,14 @@ class SwingStrategy(Strategy):
         # Initialize zone planning
         if not self._zones:
             self._setup_zones(self._start_zone, self._start_zone_mid_price)
-        self.logger.debug(
-            "SWING_GRID_OSC Zones:\n" + '\n'.join([str(self._zones[zone_name]) for zone_name in self.ZONE_NAMES]))
+        if self.logger.isEnabledFor(DEBUG):
+            self.logger.debug("SWING_GRID_OSC Zones:\n%s",
+                              '\n'.join([str(self._zones[zone_name]) for zone_name in self.ZONE_NAMES]))
 
         # Update active zone status
-        self._active_zone.on_tick_update(self.contract.last)
-        self.logger.debug("SWING_GRID_OSC active zone update:\n{}".format(self._active_zone))
+        if self._active_zone.on_tick_update(self.contract.last) and self.metrics is not None:
+            self.metrics.inc(METRIC_ZONE_EXPANSIONS, self._active_zone.tag, self.metric_label())
+        self.logger.debug("SWING_GRID_OSC active zone update:\n%s", self._active_zone)
 
         # Check and switch active zone
         for direction in (0, 1):
@@ -436,9 +456,14 @@ class SwingStrategy(Strategy):
             if new_active_zone_index != active_zone_index:
                 new_active_zone.last_order_price = self._active_zone.last_order_price
                 new_active_zone.peak[:] = self._active_zone.peak[:]
-                new_active_zone.on_tick_update(self.contract.last)  # expand new zone if needed
+                expanded = new_active_zone.on_tick_update(self.contract.last)  # expand new zone if needed
                 self._active_zone = new_active_zone
-                self.logger.debug("SWING_GRID_OSC: active zone switched:\n{}".format(self._active_zone))
+                if self.metrics is not None:
+                    label = self.metric_label()
+                    self.metrics.inc(METRIC_ZONE_SWITCHES, new_active_zone.tag, label)
+                    if expanded:
+                        self.metrics.inc(METRIC_ZONE_EXPANSIONS, new_active_zone.tag, label)
+                self.logger.debug("SWING_GRID_OSC: active zone switched:\n%s", self._active_zone)
                 break
 
         # Run active zone rules
@@ -449,17 +474,32 @@ class SwingStrategy(Strategy):
         order_params_list, _, _ = self._active_zone.on_tick_trade(self.contract.last, position_available_long,
                                                                   position_available_short)
         if order_params_list:
-            self.logger.debug("SWING_GRID_OSC order_params_list: {}".format(order_params_list))
+            self.logger.debug("SWING_GRID_OSC order_params_list: %s", order_params_list)
         self.send_limit_order(order_params_list)
 
         # Cancel OSC orders that are far away from current price
-        orders_to_cancel = []
-        for order in self.order_dict.values():
-            if abs(self.contract.last - order.price) > self.N_GRIDS_CANCEL_ORDER * self.ph:
-                orders_to_cancel.append(order.order_id)
+        orders_to_cancel = self._far_order_ids()
         if orders_to_cancel:
             self.cancel_orders(orders_to_cancel)
-            self.logger.debug("SWING_GRID_OSC orders_to_cancel: {}".format(orders_to_cancel))
+            self.logger.debug("SWING_GRID_OSC orders_to_cancel: %s", orders_to_cancel)
+            if self.metrics is not None:
+                self._count_far_cancels(orders_to_cancel)
+
+    def _far_order_ids(self):
+        """
+        :return: list of ids of the orders more than N_GRIDS_CANCEL_ORDER grids away from last price, by ascending id.
+        """
+        last = self.contract.last
+        distance = self.N_GRIDS_CANCEL_ORDER * self.ph
+        margin = self.contract.tick / 2.0  # Candidates by price range, then the exact distance test on each of them
+        candidates = self.order_index.ids_outside(last - distance + margin, last + distance - margin)
+        order_dict = self.order_dict
+        return sorted(order_id for order_id in candidates if abs(last - order_dict[order_id].price) > distance)
+
+    def _count_far_cancels(self, order_ids):
+        label = self.metric_label()
+        for order_id in order_ids:
+            self.metrics.inc(METRIC_FAR_CANCELS, self.order_dict[order_id].tag, label)
 
     def _swing_reversal_run(self):
         # Initialize reversal orders
@@ -492,16 +532,17 @@ class SwingStrategy(Strategy):
                         retry_step=self.TREND_REVERSAL_RETRY_STEP,
                         patient_max_retry=self.TREND_REVERSAL_PATIENT_MAX_RETRY,
                         accelerated_max_retry=self.TREND_REVERSAL_ACCELERATED_MAX_RETRY,
-                        max_slippage=max_slippage)
+                        max_slippage=max_slippage,
+                        clock=self.clock)
                     self._reversal_orders.append(reversal_order)
-                    self.logger.debug("SWING_REVERSAL: Reversal order created: {}".format(reversal_order))
+                    self.logger.debug("SWING_REVERSAL: Reversal order created: %s", reversal_order)
 
         # Run reversal orders
         order_finished = []
         for reversal_order in self._reversal_orders:
             order_finished.append(self.run_adaptive_order(reversal_order))
-            self.logger.debug("SWING_REVERSAL: Reversal order run: {}".format(reversal_order))
-        self.logger.debug("SWING_REVERSAL: Reversal order finished = {}".format(order_finished))
+            self.logger.debug("SWING_REVERSAL: Reversal order run: %s", reversal_order)
+        self.logger.debug("SWING_REVERSAL: Reversal order finished = %s", order_finished)
 
         # Reversal finishes
         if all(order_finished):
@@ -511,7 +552,7 @@ class SwingStrategy(Strategy):
                 filled_price = (filled_qty * filled_price + reversal_order.filled_qty * reversal_order.filled_price) / (
                     filled_qty + reversal_order.filled_qty)
                 filled_qty += reversal_order.filled_qty
-            filled_price = round(round(filled_price / self.contract.tick) * self.contract.tick, self.contract.decimal)
+            filled_price = self.contract.round_price(filled_price)
 
             # switch to GRID_OSC state
             self._state = self.SWING_GRID_OSC
@@ -532,8 +573,7 @@ class SwingStrategy(Strategy):
 
             # Clean up reversal states
             self._reversal_orders = []
-            self.logger.debug("SWING_REVERSAL: Finished. filled_qty={}  filled_price={}".format(
-                filled_qty, filled_price))
+            self.logger.debug("SWING_REVERSAL: Finished. filled_qty=%s  filled_price=%s", filled_qty, filled_price)
             self.logger.debug("SWING_REVERSAL -> SWING_GRID_OSC")
 
     def _swing_risky_init_run(self):
@@ -558,16 +598,17 @@ class SwingStrategy(Strategy):
                         retry_step=self.RISKY_INIT_RETRY_STEP,
                         patient_max_retry=self.RISKY_INIT_PATIENT_MAX_RETRY,
                         accelerated_max_retry=self.RISKY_INIT_ACCELERATED_MAX_RETRY,
-                        max_slippage=self.RISKY_INIT_MAX_SLIPPAGE)
+                        max_slippage=self.RISKY_INIT_MAX_SLIPPAGE,
+                        clock=self.clock)
                     self._risky_init_orders.append(risky_init_order)
-                    self.logger.debug("SWING_RISKY_INIT: Risky Init order created: {}".format(risky_init_order))
+                    self.logger.debug("SWING_RISKY_INIT: Risky Init order created: %s", risky_init_order)
 
         # Run RISKY_INIT order
         order_finished = []
         for risky_init_order in self._risky_init_orders:
             order_finished.append(self.run_adaptive_order(risky_init_order))
-            self.logger.debug("SWING_RISKY_INIT: Risky Init order run: {}".format(risky_init_order))
-        self.logger.debug("SWING_RISKY_INIT: Risky Init order finished = {}".format(order_finished))
+            self.logger.debug("SWING_RISKY_INIT: Risky Init order run: %s", risky_init_order)
+        self.logger.debug("SWING_RISKY_INIT: Risky Init order finished = %s", order_finished)
 
         # RISKY_INIT finishes
         if all(order_finished):
@@ -578,13 +619,12 @@ class SwingStrategy(Strategy):
                                          risky_init_order.filled_price * risky_init_order.filled_qty) / (
                                              self._risky_cut_qty + risky_init_order.filled_qty)
                 self._risky_cut_qty += risky_init_order.filled_qty
-            self._risky_cut_price = round(
-                round(self._risky_cut_price / self.contract.tick) * self.contract.tick, self.contract.decimal)
+            self._risky_cut_price = self.contract.round_price(self._risky_cut_price)
             self._state = self.SWING_RISKY_OSC
             self._risky_init_order_qty = 0
             self._risky_init_orders = []
-            self.logger.debug("SWING_RISKY_INIT: Finished. cut_qty={} cut_price={}".format(
-                self._risky_cut_qty, self._risky_cut_price))
+            self.logger.debug("SWING_RISKY_INIT: Finished. cut_qty=%s cut_price=%s", self._risky_cut_qty,
+                              self._risky_cut_price)
             self.logger.debug("SWING_RISKY_INIT -> SWING_RISKY_OSC")
 
     def _swing_risky_osc_run(self):
@@ -616,28 +656,30 @@ class SwingStrategy(Strategy):
                 qty_base_scaling=False,
                 position_qty_cap_min=(pos_qty_after_cut, -self._risky_base_qty)[self._long_short],
                 position_qty_cap_max=(self._risky_base_qty, pos_qty_after_cut)[self._long_short])
-            self.logger.debug("SWING_RISKY_OSC _risky_osc_zone created:\n{}".format(self._risky_osc_zone))
+            self.logger.debug("SWING_RISKY_OSC _risky_osc_zone created:\n%s", self._risky_osc_zone)
+            if self.metrics is not None:
+                self.metrics.set_zone(self._risky_osc_zone)
 
         # Run RISKY zone
-        self._risky_osc_zone.on_tick_update(self.contract.last)
-        self.logger.debug("SWING_RISKY_OSC _risky_osc_zone on_tick_update:\n{}".format(self._risky_osc_zone))
+        if self._risky_osc_zone.on_tick_update(self.contract.last) and self.metrics is not None:
+            self.metrics.inc(METRIC_ZONE_EXPANSIONS, self._risky_osc_zone.tag, self.metric_label())
+        self.logger.debug("SWING_RISKY_OSC _risky_osc_zone on_tick_update:\n%s", self._risky_osc_zone)
         position_available = [
             self.portfolio_obj.get_traded_qty(self.account_id, self.contract.instrument_id, direction, real_time=False)
             for direction in (DIRECTION_LONG, DIRECTION_SHORT)
         ]
         order_params_list, _, _ = self._risky_osc_zone.on_tick_trade(self.contract.last, position_available[0],
                                                                      position_available[1])
-        self.logger.debug("SWING_RISKY_OSC order_params_list: {}".format(order_params_list))
+        self.logger.debug("SWING_RISKY_OSC order_params_list: %s", order_params_list)
         self.send_limit_order(order_params_list)
 
         # Cancel OSC orders that are far away from current price
-        orders_to_cancel = []
-        for order in self.order_dict.values():
-            if abs(self.contract.last - order.price) > self.N_GRIDS_CANCEL_ORDER * self.ph:
-                orders_to_cancel.append(order.order_id)
+        orders_to_cancel = self._far_order_ids()
         if orders_to_cancel:
             self.cancel_orders(orders_to_cancel)
-            self.logger.debug("SWING_RISKY_OSC orders_to_cancel: {}".format(orders_to_cancel))
+            self.logger.debug("SWING_RISKY_OSC orders_to_cancel: %s", orders_to_cancel)
+            if self.metrics is not None:
+                self._count_far_cancels(orders_to_cancel)
 
     def _swing_stop_run(self):
         # Initialize stop orders
@@ -654,16 +696,17 @@ class SwingStrategy(Strategy):
                         retry_step=self.STOP_RETRY_STEP,
                         patient_max_retry=self.STOP_PATIENT_MAX_RETRY,
                         accelerated_max_retry=self.STOP_ACCELERATED_MAX_RETRY,
-                        max_slippage=self.STOP_MAX_SLIPPAGE)
+                        max_slippage=self.STOP_MAX_SLIPPAGE,
+                        clock=self.clock)
                     self._stop_orders.append(stop_order)
-                    self.logger.debug("SWING_STOP: Exit stop order created: {}".format(stop_order))
+                    self.logger.debug("SWING_STOP: Exit stop order created: %s", stop_order)
 
         # Run stop orders
         order_finished = []
         for stop_order in self._stop_orders:
             order_finished.append(self.run_adaptive_order(stop_order))
-            self.logger.debug("SWING_STOP: Stop order is run: {}".format(stop_order))
-        self.logger.debug("SWING_STOP: Stop order finished = {}".format(order_finished))
+            self.logger.debug("SWING_STOP: Stop order is run: %s", stop_order)
+        self.logger.debug("SWING_STOP: Stop order finished = %s", order_finished)
 
         # Stop finishes
         if all(order_finished):
@@ -682,10 +725,10 @@ class SwingStrategy(Strategy):
             return
 
         self.logger.debug(
-            "SWING On Tick: last={} state={} long_short={} state_cleanup={} next_state={} position_qty={} cma_price={}"
-            " nlv={} gain={} order_dict={} trade_dict={}".format(
-                self.contract.last, self._state, self._long_short, self._state_cleanup, self._next_state_after_cleanup,
-                self._position_qty, self._cma_price, self._nlv, self._gain, self.order_dict, self.trade_dict))
+            "SWING On Tick: last=%s state=%s long_short=%s state_cleanup=%s next_state=%s position_qty=%s cma_price=%s"
+            " nlv=%s gain=%s order_dict=%s trade_dict=%s", self.contract.last, self._state, self._long_short,
+            self._state_cleanup, self._next_state_after_cleanup, self._position_qty, self._cma_price, self._nlv,
+            self._gain, self.order_dict, self.trade_dict)
 
         # Start up
         if self._state == self.SWING_START and not self._swing_start_run():
@@ -722,6 +765,79 @@ class SwingStrategy(Strategy):
             self.thread_lock.release()
             self.logger.info("SWING deactivated.")
 
+    def latency_label(self):
+        """
+        Latencies are labeled by strategy state.
+        """
+        return self.STATE_NAMES[self._state]
+
+    def metric_label(self):
+        """
+        Metrics are labeled by strategy state.
+        """
+        return self.STATE_NAMES[self._state]
+
+    def trace_record(self):
+        """
+        Strategy state record of the sampled per-tick trace.
+        :return: dict of JSON serializable values.
+        """
+        record = Strategy.trace_record(self)
+        record['state'] = self._state
+        record['long_short'] = self._long_short
+        record['state_cleanup'] = self._state_cleanup
+        record['active_zone'] = None if self._active_zone is None else self._active_zone.tag
+        record['active_zone_state'] = None if self._active_zone is None else self._active_zone.state
+        return record
+
+    def snapshot_state(self):
+        """
+        Strategy state for a warm restart: swing states, zones and adaptive orders besides orders and trades.
+        :return: dict of picklable immutable values.
+        """
+        state = Strategy.snapshot_state(self)
+        state[SNAPSHOT_SWING] = (
+            self._state, self._long_short, self._state_cleanup, self._next_state_after_cleanup, self._start_zone,
+            self._start_zone_mid_price, None if self._active_zone is None else self._active_zone.tag, self._dec_peak,
+            self._risky_base_val, self._risky_base_qty, self._risky_cut_qty, self._risky_cut_price,
+            self._risky_init_order_qty, self._max_gain)
+        for tag, zone in self._zones.items():
+            state[(SNAPSHOT_ZONE, tag)] = zone.snapshot()
+        state[SNAPSHOT_RISKY_OSC_ZONE] = None if self._risky_osc_zone is None else self._risky_osc_zone.snapshot()
+        state[SNAPSHOT_REVERSAL_ORDERS] = tuple(order.snapshot() for order in self._reversal_orders)
+        state[SNAPSHOT_RISKY_INIT_ORDERS] = tuple(order.snapshot() for order in self._risky_init_orders)
+        state[SNAPSHOT_STOP_ORDERS] = tuple(order.snapshot() for order in self._stop_orders)
+        return state
+
+    def restore_state(self, state):
+        """
+        Restore the strategy state returned by snapshot_state().
+        :param state: dict. Strategy state.
+        """
+        Strategy.restore_state(self, state)
+        (self._state, self._long_short, self._state_cleanup, self._next_state_after_cleanup, self._start_zone,
+         self._start_zone_mid_price, active_zone_tag, self._dec_peak, self._risky_base_val, self._risky_base_qty,
+         self._risky_cut_qty, self._risky_cut_price, self._risky_init_order_qty, self._max_gain) = state[SNAPSHOT_SWING]
+        self._zones = {}
+        for zone_name in self.ZONE_NAMES:
+            zone = state.get((SNAPSHOT_ZONE, zone_name))
+            if zone is not None:
+                self._zones[zone_name] = GridOsc.from_snapshot(self.logger, self.contract, zone)
+        self._active_zone = None if active_zone_tag is None else self._zones[active_zone_tag]
+        risky_osc_zone = state[SNAPSHOT_RISKY_OSC_ZONE]
+        self._risky_osc_zone = None if risky_osc_zone is None else GridOsc.from_snapshot(self.logger, self.contract,
+                                                                                         risky_osc_zone)
+        self._reversal_orders = [AdaptiveOrder.from_snapshot(self.contract, order, self.clock)
+                                 for order in state[SNAPSHOT_REVERSAL_ORDERS]]
+        self._risky_init_orders = [AdaptiveOrder.from_snapshot(self.contract, order, self.clock)
+                                   for order in state[SNAPSHOT_RISKY_INIT_ORDERS]]
+        self._stop_orders = [AdaptiveOrder.from_snapshot(self.contract, order, self.clock)
+                             for order in state[SNAPSHOT_STOP_ORDERS]]
+        if self.metrics is not None:
+            for zone in list(self._zones.values()) + [self._risky_osc_zone]:
+                if zone is not None:
+                    self.metrics.set_zone(zone)
+
     def strategy_rules_on_buy_success(self, order_ids):
         """
         Run strategy rules when buy action is successful.
@@ -803,6 +919,21 @@ class SwingStrategy(Strategy):
         """
         self.strategy_rules_on_buy_fail(order_tag)
 
+    def _zone_trade_update(self, zone, order, trade):
+        """
+        Update a zone with a trade of its order, and the zone metrics.
+        """
+        if self.metrics is None:
+            zone.on_trade_update(order.buy_sell, order.long_short, trade.price, trade.qty)
+            return
+        k = zone.k
+        realized_gain = zone.on_trade_update(order.buy_sell, order.long_short, trade.price, trade.qty)
+        label = self.metric_label()
+        self.metrics.inc(METRIC_REALIZED_GAIN, zone.tag, label, realized_gain)
+        if zone.k != k:
+            self.metrics.inc(METRIC_K_INCREMENTS, zone.tag, label, zone.k - k)
+        self.metrics.set_zone(zone)
+
     def strategy_rules_on_trade_update(self, order_id, trade_id):
         """
         Run strategy rules after standard trade update.
@@ -814,7 +945,7 @@ class SwingStrategy(Strategy):
         trade = self.trade_dict[trade_id]
 
         if self._state == self.SWING_GRID_OSC:
-            self._zones[order.tag].on_trade_update(order.buy_sell, order.long_short, trade.price, trade.qty)
+            self._zone_trade_update(self._zones[order.tag], order, trade)
 
         elif self._state == self.SWING_REVERSAL:
             for reversal_order in self._reversal_orders:
@@ -829,7 +960,7 @@ class SwingStrategy(Strategy):
                     break
 
         elif self._state == self.SWING_RISKY_OSC:
-            self._risky_osc_zone.on_trade_update(order.buy_sell, order.long_short, trade.price, trade.qty)
+            self._zone_trade_update(self._risky_osc_zone, order, trade)
 
         elif self._state == self.SWING_STOP:
             for stop_order in self._stop_orders:
@@ -0,0 +1,6 @@
+import os
+import sys
+
+
+# Modules live at the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
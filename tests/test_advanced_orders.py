@@ -0,0 +1,40 @@
+from constants import *
+from advanced_orders import AdaptiveOrder
+from clock import EventClock
+from strategy import Contract
+
+
+def make_contract(last=100.0):
+    contract = Contract(symbol='TEST', instrument_id='TEST', unit=1)
+    contract.set_tick(0.5)
+    contract.last, contract.bid, contract.ask = last, last - 0.5, last + 0.5
+    return contract
+
+
+class TimedOrder(AdaptiveOrder):
+    TIME_LIMIT = dict(AdaptiveOrder.TIME_LIMIT, PATIENT=2)
+
+
+def test_pending_time_limit_uses_order_clock():
+    clock = EventClock(10**9)
+    order = TimedOrder(make_contract(), BUY, DIRECTION_LONG, 1, 100.0, clock=clock)
+    assert order.on_tick()[0] == ORDER_OPEN
+    order.on_buysell_success(1, 100.0)
+
+    clock.set_ns(3 * 10**9)
+    assert order.on_tick() == (None, None)
+    clock.set_ns(3 * 10**9 + 1)
+    assert order.on_tick() == (ORDER_OPEN, {'action': 'CANCEL', 'order_id': 1})
+
+
+def test_from_snapshot_restarts_pending_time_on_new_clock():
+    order = TimedOrder(make_contract(), BUY, DIRECTION_LONG, 1, 100.0, clock=EventClock(10**9))
+    order.on_tick()
+    order.on_buysell_success(1, 100.0)
+
+    clock = EventClock(50 * 10**9)
+    restored = TimedOrder.from_snapshot(order.contract, order.snapshot(), clock=clock)
+    assert restored.clock is clock
+    assert restored.on_tick() == (None, None)
+    clock.set_ns(53 * 10**9)
+    assert restored.on_tick()[0] == ORDER_OPEN
@@ -0,0 +1,116 @@
+import asyncio
+from threading import Thread, get_ident
+from constants import *
+from events import EVENT_MARKETDATA, StrategyEvent
+from backtest import Backtester
+from swing_strategy import SwingStrategy
+from strategy import MarginRates
+from async_runtime import AsyncEventEngine, AsyncStrategyRuntime
+from benchmarks import BENCH_SYMBOL, BENCH_TICK_SIZE, BENCH_UNIT_SIZE, SWING_PARAMS, random_walk_ticks
+
+OTHER_SYMBOL = 'OTHER'
+
+
+class CountedSwingStrategy(SwingStrategy):
+    """
+    SwingStrategy recording the thread of each processed tick.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.tick_threads = []
+
+    def _process_tick(self, event, tick_start=None):
+        self.tick_threads.append(get_ident())
+        super()._process_tick(event, tick_start)
+
+
+def market_event(symbol, tick):
+    param = dict(zip((TICK_TIME, PRICE, BID, ASK, BID_VOLUME, ASK_VOLUME, HIGH_LIMIT, LOW_LIMIT), tick))
+    param.update({INSTRUMENT_SYMBOL: symbol, INSTRUMENT_ID: symbol, TICK_SIZE: BENCH_TICK_SIZE,
+                  UNIT_SIZE: BENCH_UNIT_SIZE})
+    return StrategyEvent(EVENT_MARKETDATA, param)
+
+
+def hosted_runtime(**kwargs):
+    runtime = AsyncStrategyRuntime(**kwargs)
+    for symbol in (BENCH_SYMBOL, OTHER_SYMBOL):
+        backtester = Backtester(CountedSwingStrategy, SWING_PARAMS, symbol, BENCH_TICK_SIZE, BENCH_UNIT_SIZE)
+        strategy = backtester._setup_strategy()
+        runtime.add(strategy)
+        strategy.broker.event_engine = runtime.event_engine
+    return runtime
+
+
+def test_dispatch_yields_to_loop_between_batches():
+    async def run():
+        engine = AsyncEventEngine(batch_size=4)
+        seen = []
+        engine.register(EVENT_MARKETDATA, lambda event: seen.append(event.even_param_[PRICE]))
+        engine.start()
+        for i in range(10):
+            engine.put(market_event(BENCH_SYMBOL, (i, float(i), 0, 0, 0, 0, 0, 0)))
+        assert seen == []  # dispatched by a loop callback
+        await asyncio.sleep(0)
+        assert len(seen) == 4
+        await asyncio.sleep(0)
+        assert len(seen) == 8
+        await asyncio.sleep(0)
+        assert seen == [float(i) for i in range(10)]
+        engine.stop()
+
+    asyncio.run(run())
+
+
+def test_ticks_put_from_loop_and_other_threads_are_dispatched_on_loop():
+    ticks = random_walk_ticks(500)
+
+    async def run():
+        runtime = hosted_runtime()
+        runtime.start()
+        loop_thread = get_ident()
+        engine = runtime.event_engine
+        feeder = Thread(target=lambda: [engine.put(market_event(OTHER_SYMBOL, tick)) for tick in ticks])
+        feeder.start()
+        for tick in ticks:
+            runtime.strategy(BENCH_SYMBOL).broker.on_tick(*tick[:6])
+            engine.put(market_event(BENCH_SYMBOL, tick))
+            await asyncio.sleep(0)
+        await asyncio.get_running_loop().run_in_executor(None, feeder.join)
+        while engine.qsize():
+            await asyncio.sleep(0)
+        counts = {symbol: runtime.strategy(symbol).tick_threads for symbol in (BENCH_SYMBOL, OTHER_SYMBOL)}
+        runtime.stop()
+        await runtime.wait_closed()
+        return loop_thread, counts
+
+    loop_thread, tick_threads = asyncio.run(run())
+    for threads in tick_threads.values():
+        assert len(threads) == len(ticks)
+        assert set(threads) == {loop_thread}
+
+
+def test_ticks_wait_for_valid_margin_fees():
+    async def run():
+        runtime = hosted_runtime(margin_refresh_interval=0.01)
+        other = runtime.strategy(OTHER_SYMBOL)
+        rates = other.instru_margin_comm_rate
+        saved = rates.pop(OTHER_SYMBOL)
+        runtime.start()
+        assert runtime._margin_ready == {BENCH_SYMBOL}
+        engine = runtime.event_engine
+        tick = random_walk_ticks(1)[0]
+        engine.put(market_event(OTHER_SYMBOL, tick))
+        await asyncio.sleep(0)
+        assert other.tick_threads == []  # gated until the fees of the symbol are valid
+
+        rates.set_rates(OTHER_SYMBOL, saved)
+        await asyncio.sleep(0.05)  # periodic refresh
+        assert runtime._margin_ready == {BENCH_SYMBOL, OTHER_SYMBOL}
+        engine.put(market_event(OTHER_SYMBOL, tick))
+        await asyncio.sleep(0)
+        assert len(other.tick_threads) == 1
+        runtime.stop()
+        await runtime.wait_closed()
+
+    asyncio.run(run())
@@ -0,0 +1,64 @@
+from constants import *
+from strategy import Strategy
+from backtest import Backtester, DEFAULT_MARGIN_FEE, read_csv_ticks
+
+NO_COMMISSION_FEE = dict(DEFAULT_MARGIN_FEE, **{OPEN_COMM_RATE: 0.0, CLOSE_COMM_RATE: 0.0, CLOSE_TODAY_COMM_RATE: 0.0})
+TICKS_CSV = """{},{}
+2024-01-02T09:30:00,100
+2024-01-02T09:30:01,99
+2024-01-02T09:30:02,97
+2024-01-02T09:30:03,96
+2024-01-02T09:30:04,102
+""".format(TICK_TIME, PRICE)
+
+
+class ScriptedStrategy(Strategy):
+    """
+    Strategy placing the orders and cancelling the order tags of a script by tick index.
+    """
+
+    def strategy_config_params(self, strategy_params):
+        self.script = {} if strategy_params is None else strategy_params['script']
+
+    def strategy_config_on_start(self):
+        self.n_ticks = 0
+
+    def strategy_rules_on_tick(self, event):
+        for action, direction, price, qty, tag in self.script.get(self.n_ticks, ()):
+            if action == 'CANCEL':
+                self.cancel_orders([order_id for order_id, order in self.order_dict.items() if order.tag == tag])
+            else:
+                self.send_limit_order([{'action': action, 'direction': direction, 'price': price, 'qty': qty,
+                                        'tag': tag}])
+        self.n_ticks += 1
+
+
+SCRIPT = {
+    0: [(BUY, DIRECTION_LONG, 98.0, 2, 'Entry'), (BUY, DIRECTION_LONG, 95.0, 1, 'Deep')],
+    2: [('CANCEL', None, None, None, 'Deep'), (SELL, DIRECTION_LONG, 101.0, 2, 'Exit')]
+}
+
+
+def run_script(tmp_path, **kwargs):
+    path = tmp_path / 'ticks.csv'
+    path.write_text(TICKS_CSV)
+    backtester = Backtester(ScriptedStrategy, {'script': SCRIPT}, 'TEST', 1.0, 10, margin_fee=NO_COMMISSION_FEE,
+                            **kwargs)
+    return backtester.run(read_csv_ticks(str(path)))
+
+
+def test_orders_fill_at_order_price_and_cancel(tmp_path):
+    result = run_script(tmp_path)
+    assert (result.n_ticks, result.n_orders, result.n_trades, result.n_cancels) == (5, 3, 2, 1)
+    assert result.position_qty == [0, 0]
+    assert result.pnl == (101.0 - 98.0) * 2 * 10  # filled at 98 and 101, not at the tick prices 97 and 102
+    assert result.max_drawdown == (98.0 - 96.0) * 2 * 10  # at 96 while long 2 from 98, the Deep order cancelled
+    assert not result.stopped
+
+
+def test_run_stops_beyond_max_drawdown(tmp_path):
+    result = run_script(tmp_path, max_drawdown=30.0)
+    assert result.stopped and result.n_ticks == 4
+    assert result.max_drawdown == 40.0
+    assert result.pnl == -40.0
+    assert result.position_qty == [2, 0]
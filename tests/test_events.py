@@ -0,0 +1,118 @@
+from threading import Event, Thread
+from constants import INSTRUMENT_SYMBOL
+from events import EVENT_BUY, EVENT_MARKETDATA, EVENT_SELL, StrategyEvent, EventEngine
+
+
+def test_process_dispatches_to_registered_handlers():
+    engine = EventEngine()
+    received = []
+    engine.register(EVENT_BUY, received.append)
+    engine.register(EVENT_BUY, received.append)  # registered once
+    event = StrategyEvent(EVENT_BUY, {})
+    engine.process(event)
+    engine.process(StrategyEvent(EVENT_SELL, {}))
+    assert received == [event]
+    assert engine.n_processed == 2
+
+    engine.unregister(EVENT_BUY, received.append)
+    engine.process(event)
+    assert received == [event]
+
+
+def test_handler_exceptions_are_counted():
+    engine = EventEngine()
+    received = []
+
+    def fail(event):
+        raise RuntimeError
+
+    engine.register(EVENT_BUY, fail)
+    engine.register(EVENT_BUY, received.append)
+    engine.process(StrategyEvent(EVENT_BUY, {}))
+    assert engine.n_errors == 1
+    assert len(received) == 1
+
+
+def test_process_pending_includes_events_put_by_handlers():
+    engine = EventEngine()
+    received = []
+
+    def on_buy(event):
+        received.append(event.type_)
+        engine.put(StrategyEvent(EVENT_SELL, {}))
+
+    engine.register(EVENT_BUY, on_buy)
+    engine.register(EVENT_SELL, lambda event: received.append(event.type_))
+    engine.put(StrategyEvent(EVENT_BUY, {}))
+    assert engine.process_pending() == 2
+    assert received == [EVENT_BUY, EVENT_SELL]
+    assert engine.qsize() == 0
+
+
+def test_process_pending_wakes_blocked_producer():
+    engine = EventEngine(maxsize=2)
+    engine._active = True  # bounded put() waits only while the engine is active
+    engine.put(StrategyEvent(EVENT_BUY, {}))
+    engine.put(StrategyEvent(EVENT_BUY, {}))
+    done = Event()
+
+    def produce():
+        engine.put(StrategyEvent(EVENT_SELL, {}))
+        done.set()
+
+    producer = Thread(target=produce, daemon=True)
+    producer.start()
+    assert not done.wait(0.05)  # queue full
+    engine.process_pending()
+    assert done.wait(2)
+    producer.join(2)
+    engine._active = False
+    engine.process_pending()
+    assert engine.n_processed == 3
+
+
+def test_dispatch_thread_processes_queued_events_in_order():
+    engine = EventEngine(maxsize=4, batch_size=3)
+    received = []
+    engine.register(EVENT_BUY, lambda event: received.append(event.even_param_['i']))
+    engine.start()
+    for i in range(100):
+        engine.put(StrategyEvent(EVENT_BUY, {'i': i}))
+    engine.stop()
+    assert received == list(range(100))
+    assert engine.stats()['processed'] == 100
+
+
+def tick(symbol, price):
+    return StrategyEvent(EVENT_MARKETDATA, {INSTRUMENT_SYMBOL: symbol, 'price': price})
+
+
+def test_conflation_keeps_latest_tick_per_symbol_in_order():
+    engine = EventEngine(conflate=True)
+    received = []
+    engine.register(EVENT_MARKETDATA, lambda event: received.append(
+        (event.even_param_[INSTRUMENT_SYMBOL], event.even_param_['price'])))
+    engine.register(EVENT_BUY, lambda event: received.append(EVENT_BUY))
+    for event in (tick('A', 1), StrategyEvent(EVENT_BUY, {}), tick('B', 1), tick('A', 2), StrategyEvent(EVENT_BUY, {}),
+                  tick('A', 3)):
+        engine.put(event)
+    assert engine.process_pending() == 6
+    assert received == [EVENT_BUY, ('B', 1), EVENT_BUY, ('A', 3)]
+    assert engine.n_conflated == 2 and engine.n_conflated_by_symbol == {'A': 2}
+    assert engine.stats()['conflated'] == 2
+
+    engine.put(tick('A', 4))  # the latest tick was dispatched, so a new one is not superseded
+    engine.process_pending()
+    assert received[-1] == ('A', 4)
+    assert engine.n_conflated == 2
+
+
+def test_ticks_are_not_conflated_by_default():
+    engine = EventEngine()
+    received = []
+    engine.register(EVENT_MARKETDATA, lambda event: received.append(event.even_param_['price']))
+    for price in range(3):
+        engine.put(tick('A', price))
+    engine.process_pending()
+    assert received == [0, 1, 2]
+    assert engine.n_conflated == 0
@@ -0,0 +1,147 @@
+import random
+from constants import *
+from events import EVENT_BUY, EVENT_TRADE, StrategyEvent
+from backtest import BacktestEventEngine, BacktestPortfolio, DEFAULT_MARGIN_FEE
+from fill_sim import LeanQueueBroker, QueueBroker
+
+
+def lean_broker(**kwargs):
+    fills, statuses = [], []
+    broker = LeanQueueBroker(on_fill=lambda order, price, qty: fills.append((order.order_id, price, qty)),
+                             on_status=lambda order, status: statuses.append((order.order_id, status)), **kwargs)
+    return broker, fills, statuses
+
+
+def test_order_at_best_moves_up_queue_and_is_partially_filled():
+    broker, fills, statuses = lean_broker()
+    broker.on_tick(1, 100.0, 99.5, 100.5, 3, 10)
+    order_id = broker.place(BUY, DIRECTION_LONG, 99.5, 5)
+    broker.on_tick(2, 100.0, 99.5, 100.5, 3, 10)
+    order = broker.orders[order_id]
+    assert order.booked and order.queue_ahead == 3
+
+    broker.on_tick(3, 100.0, 99.5, 100.5, 1, 10)  # 2 lots ahead left the queue
+    assert order.queue_ahead == 1 and not fills
+    broker.on_tick(4, 100.0, 99.5, 100.5, 6, 10)  # joined behind
+    assert order.queue_ahead == 1
+    broker.on_tick(5, 100.0, 99.5, 100.5, 3, 10)  # decrease of 3 beyond the lot ahead
+    assert fills == [(order_id, 99.5, 2)]
+    assert order.queue_ahead == 0 and broker.n_partial_fills == 1
+
+    broker.on_tick(6, 99.5, 99.5, 100.5, 3, 10)  # trade at its price, first in queue
+    assert fills[-1] == (order_id, 99.5, 3)
+    assert statuses == [(order_id, ORDER_CLOSED_ALIAS)]
+    assert order_id not in broker.orders and broker.position_qty == [5, 0]
+
+
+def test_order_behind_best_gets_queue_position_when_best():
+    broker, fills, _ = lean_broker()
+    broker.on_tick(1, 100.0, 99.5, 100.5, 3, 10)
+    order_id = broker.place(BUY, DIRECTION_LONG, 99.0, 1)
+    broker.on_tick(2, 100.0, 99.5, 100.5, 3, 10)
+    order = broker.orders[order_id]
+    assert order.booked and order.queue_ahead is None
+    broker.on_tick(3, 99.5, 99.0, 99.5, 8, 4)
+    assert order.queue_ahead == 8 and not fills
+    broker.on_tick(4, 99.5, 99.0, 99.5, 20, 4)
+    assert order.queue_ahead == 8
+
+
+def test_queue_ahead_never_exceeds_best_volume():
+    broker, fills, _ = lean_broker()
+    broker.on_tick(1, 100.0, 99.5, 100.5, 9, 10)
+    order_id = broker.place(BUY, DIRECTION_LONG, 99.5, 1)
+    broker.on_tick(2, 100.0, 99.5, 100.5, 9, 10)
+    broker.on_tick(3, 100.0, 99.0, 100.0, 5, 10)  # best below the order, first in queue
+    assert broker.orders[order_id].queue_ahead == 0
+    broker.on_tick(4, 100.0, 99.5, 100.5, 4, 10)
+    assert broker.orders[order_id].queue_ahead == 0 and not fills
+
+
+def test_improving_order_is_first_and_filled_by_trade_at_its_price():
+    broker, fills, _ = lean_broker()
+    broker.on_tick(1, 100.0, 99.5, 100.5, 3, 10)
+    order_id = broker.place(SELL, DIRECTION_LONG, 100.0, 2)  # ask side
+    broker.on_tick(2, 99.5, 99.5, 100.5, 3, 10)
+    assert broker.orders[order_id].queue_ahead == 0
+    broker.on_tick(3, 100.0, 99.5, 100.5, 3, 10)
+    assert fills == [(order_id, 100.0, 2)]
+    assert broker.position_qty == [-2, 0]
+
+
+def test_marketable_order_fills_up_to_opposite_volume_then_crosses():
+    broker, fills, statuses = lean_broker()
+    broker.on_tick(1, 100.0, 99.5, 100.5, 3, 4)
+    order_id = broker.place(BUY, DIRECTION_LONG, 101.0, 10)
+    broker.on_tick(2, 100.0, 99.5, 100.5, 3, 4)
+    assert fills == [(order_id, 100.5, 4)]
+    assert broker.orders[order_id].booked and broker.n_partial_fills == 1
+    broker.on_tick(3, 100.0, 99.5, 100.5, 3, 4)  # crossed by the ask
+    assert fills[-1] == (order_id, 101.0, 6)
+    assert statuses == [(order_id, ORDER_CLOSED_ALIAS)]
+
+
+def test_trade_through_fills_in_full():
+    broker, fills, _ = lean_broker()
+    broker.on_tick(1, 100.0, 99.5, 100.5, 3, 10)
+    order_id = broker.place(BUY, DIRECTION_LONG, 99.5, 7)
+    broker.on_tick(2, 100.0, 99.5, 100.5, 3, 10)
+    broker.on_tick(3, 99.0, 99.0, 99.5, 3, 10)
+    assert fills == [(order_id, 99.5, 7)]
+    assert broker.n_partial_fills == 0
+
+
+def test_ack_and_cancel_latencies():
+    broker, fills, statuses = lean_broker(ack_latency=2e-9, cancel_latency=2e-9)
+    broker.on_tick(1, 100.0, 99.5, 100.5, 3, 10)
+    cancelled_id = broker.place(BUY, DIRECTION_LONG, 99.5, 1)
+    filled_id = broker.place(BUY, DIRECTION_LONG, 99.5, 1)
+    broker.cancel_order(cancelled_id)
+    broker.on_tick(2, 99.0, 99.0, 99.5, 3, 10)  # before the ack, not filled
+    assert not fills and not statuses
+    broker.on_tick(3, 100.0, 99.5, 100.5, 3, 10)  # cancel effective before the ack
+    assert statuses == [(cancelled_id, ORDER_CANCELLED)]
+    assert broker.orders[filled_id].booked
+
+    broker.cancel_order(filled_id)
+    broker.on_tick(4, 99.0, 99.0, 99.5, 3, 10)  # filled while its cancel is in flight
+    assert fills == [(filled_id, 99.5, 1)]
+    broker.on_tick(5, 99.0, 99.0, 99.5, 3, 10)
+    assert statuses[-1] == (filled_id, ORDER_CLOSED_ALIAS) and broker.n_cancels == 1
+
+
+def test_lean_broker_matches_event_broker():
+    ticks = []
+    n = 1000
+    rng = random.Random(3)
+    for i in range(3000):
+        n += rng.choice((-1, 0, 1))
+        ticks.append((i, n * 0.5, n * 0.5 - 0.5, n * 0.5 + 0.5, rng.randint(0, 20), rng.randint(0, 20)))
+    fee = {DIRECTION_LONG: DEFAULT_MARGIN_FEE, DIRECTION_SHORT: DEFAULT_MARGIN_FEE}
+    portfolio = BacktestPortfolio(1e12, 10, fee)
+    portfolio.position_qty = [10**9, 10**9]  # sells are accepted
+    engine = BacktestEventEngine()
+    broker = QueueBroker(engine, portfolio, 'S', 'S', ack_latency=2e-9, cancel_latency=1e-9)
+    lean, lean_fills, _ = lean_broker(ack_latency=2e-9, cancel_latency=1e-9)
+    event_fills = []
+    rng = random.Random(5)
+    for tick in ticks:
+        broker.on_tick(*tick)
+        lean.on_tick(*tick)
+        for _ in range(rng.randint(0, 3)):
+            action, direction = rng.choice((BUY, SELL)), rng.choice((DIRECTION_LONG, DIRECTION_SHORT))
+            price, qty = tick[1] + rng.randint(-3, 3) * 0.5, rng.randint(1, 30)
+            param = {ORDER_ACTION: action, DIRECTION: direction, PRICE: price, QTY: qty}
+            broker.submit(StrategyEvent(EVENT_BUY, param))
+            lean.place(action, direction, price, qty)
+        if broker.orders and rng.random() < 0.4:
+            order_id = rng.choice(list(broker.orders))
+            broker.cancel({CANCEL_TYPE: CANCEL_ORDERS, ORDER_IDS: [order_id]})
+            lean.cancel_order(order_id)
+        event_fills += [(event.even_param_[ORDER_ID], event.even_param_[PRICE], event.even_param_[QTY])
+                        for event in engine._queue if event.type_ == EVENT_TRADE]
+        engine._queue.clear()
+    assert broker.n_trades > 1000 and broker.n_partial_fills > 100
+    assert lean_fills == event_fills
+    assert (lean.n_orders, lean.n_trades, lean.n_partial_fills, lean.n_cancels) == (
+        broker.n_orders, broker.n_trades, broker.n_partial_fills, broker.n_cancels)
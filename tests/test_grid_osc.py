@@ -0,0 +1,86 @@
+import logging
+import random
+import pytest
+from constants import *
+from strategy import REQ, Contract
+from grid_osc_strategy import GridOsc
+
+
+def make_zone(low_ext=True, high_ext=True, trail_amt=0.4, qty_base_scaling=True):
+    contract = Contract('TEST', 1, 0.2, 10.0)
+    logger = logging.getLogger('test_grid_osc')
+    logger.setLevel(logging.WARNING)
+    return GridOsc(logger, 'Osc', contract, 96.0, 20, 0.8, low_ext, high_ext, trail_amt, 2, 3, 1, 1, 100.0, 0,
+                   qty_base_scaling=qty_base_scaling, position_qty_cap_min=-60, position_qty_cap_max=60)
+
+
+def evaluate_per_tick(zone, prices, position_long, position_short):
+    # The per tick calls that GridOsc.evaluate_ticks batches, with orders traded at their trigger price.
+    fills = []
+    for index, price in enumerate(prices):
+        zone.on_tick_update(price)
+        last_order_price, peak = zone.last_order_price, list(zone.peak)
+        order_params_list, position_long, position_short = zone.on_tick_trade(price, position_long, position_short)
+        if not order_params_list:
+            continue
+        direction = int(price > last_order_price)
+        fills.append((index, direction, sum(order_params['qty'] for order_params in order_params_list),
+                      peak[direction]))
+        for order_params in order_params_list:
+            qty = order_params['qty']
+            if not qty:
+                continue
+            zone.on_buy_sell_success(price)
+            zone.on_trade_update(int(order_params['action'] == SELL),
+                                 int(order_params['direction'] == DIRECTION_SHORT), price, qty)
+            if order_params['action'] == BUY:
+                if order_params['direction'] == DIRECTION_LONG:
+                    position_long += qty
+                else:
+                    position_short += qty
+    return fills, position_long, position_short
+
+
+def random_walk(rng, n, start=100.0, tick=0.2, max_step=3):
+    t = int(round(start / tick))
+    prices = []
+    for _ in range(n):
+        t = max(1, t + rng.randint(-max_step, max_step))
+        prices.append(round(t * tick, 1))
+    return prices
+
+
+@pytest.mark.parametrize('seed', range(8))
+@pytest.mark.parametrize('zone_kwargs', [{}, {'low_ext': False, 'high_ext': False}, {'trail_amt': 0.0},
+                                         {'qty_base_scaling': False, 'trail_amt': 1.6}])
+def test_evaluate_ticks_matches_per_tick_calls(seed, zone_kwargs):
+    rng = random.Random(seed)
+    prices = random_walk(rng, 5000, max_step=rng.choice((1, 2, 5)))
+    batch_zone, tick_zone = make_zone(**zone_kwargs), make_zone(**zone_kwargs)
+    assert batch_zone.evaluate_ticks(prices, 5, 5) == evaluate_per_tick(tick_zone, prices, 5, 5)
+    assert repr(batch_zone) == repr(tick_zone)
+
+
+def test_evaluate_ticks_waiting_for_submission_only_tracks_peaks():
+    batch_zone, tick_zone = make_zone(), make_zone()
+    batch_zone.state = tick_zone.state = REQ
+    prices = random_walk(random.Random(1), 2000)
+    assert batch_zone.evaluate_ticks(prices, 5, 5) == evaluate_per_tick(tick_zone, prices, 5, 5) == ([], 5, 5)
+    assert repr(batch_zone) == repr(tick_zone)
+
+
+def test_evaluate_ticks_without_trigger_tracks_peaks_and_expands():
+    zone = make_zone()
+    prices = [100.0, 99.8, 99.6] * 100 + [120.0, 119.8]
+    assert zone.evaluate_ticks(prices) == ([], 0, 0)
+    assert zone.peak == [99.6, 120.0]
+    assert zone.bounds[1] >= 120.0
+
+
+def test_public_states_follow_trades():
+    zone = make_zone()
+    assert (zone.position_qty, zone.cma_price, zone.k, zone.k_profit) == (0, 0.0, 0, 0.0)
+    zone.on_trade_update(0, 0, 99.0, 3)  # buy long
+    assert (zone.position_qty, zone.cma_price) == (3, 99.0)
+    with pytest.raises(AttributeError):
+        zone.k = 1
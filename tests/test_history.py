@@ -0,0 +1,71 @@
+from constants import *
+from strategy import OrderRecord, TradeRecord
+from clock import EventClock
+from history import TradeHistory
+from backtest import Backtester
+from swing_strategy import SwingStrategy
+from benchmarks import BENCH_SYMBOL, BENCH_TICK_SIZE, BENCH_UNIT_SIZE, SWING_PARAMS, random_walk_ticks
+
+
+def order(order_id, tag, price=100.0, qty=2):
+    return OrderRecord(None, order_id, 0, 0, 1, 0, price, qty, tag)
+
+
+def fill(history, order_record, trade_id, price, qty):
+    order_record.filled_price = (order_record.filled_price * order_record.filled_qty + price * qty) / (
+        order_record.filled_qty + qty)
+    order_record.filled_qty += qty
+    history.on_fill(TradeRecord(trade_id, order_record.order_id, price, qty, 0), order_record)
+
+
+def test_queries_by_order_id_tag_and_time_across_chunks():
+    clock = EventClock(0)
+    history = TradeHistory(clock=clock, chunk_size=4)
+    orders = {}
+    for i in range(10):
+        clock.set_ns(i * 10)
+        orders[i] = order(i, 'Osc' if i % 2 else 'Swing', price=100.0 + i)
+        history.on_order(orders[i])
+        clock.set_ns(i * 10 + 5)
+        fill(history, orders[i], 100 + i, 100.0 + i, 1)
+        fill(history, orders[i], 200 + i, 100.0 + i, 1)
+    history.on_order_finished(orders[3], ORDER_CLOSED_ALIAS)
+
+    assert len(history.fill_rows) == 20 and len(history.order_rows) == 10
+    assert [row['trade_id'] for row in history.fills(order_id=7)] == [107, 207]
+    assert [row['order_id'] for row in history.fills(tag='Osc')] == [1, 1, 3, 3, 5, 5, 7, 7, 9, 9]
+    assert [row['trade_id'] for row in history.fills(tag='Osc', order_id=5)] == [105, 205]
+    assert [row['order_id'] for row in history.fills(start_ns=25, stop_ns=55)] == [2, 2, 3, 3, 4, 4]
+    assert [row['order_id'] for row in history.fills(tag='Swing', start_ns=25, stop_ns=55)] == [2, 2, 4, 4]
+    assert history.fills(tag='Unknown') == []
+    assert list(history.fill_column('price', start_ns=70)) == [107.0, 107.0, 108.0, 108.0, 109.0, 109.0]
+
+    order_3 = history.orders(order_id=3)[0]
+    assert order_3['tag'] == 'Osc' and order_3['status'] == ORDER_CLOSED_ALIAS
+    assert order_3['filled_qty'] == 2 and order_3['filled_price'] == 103.0 and order_3['finish_time'] == 95
+    assert history.orders(order_id=4)[0]['status'] == ORDER_OPEN
+    assert [row['order_id'] for row in history.orders(start_ns=20, stop_ns=40)] == [2, 3]
+
+
+def test_record_times_never_go_backwards():
+    clock = EventClock(100)
+    history = TradeHistory(clock=clock)
+    history.on_order(order(1, 'Osc'))
+    clock.set_ns(50)
+    history.on_order(order(2, 'Osc'))
+    assert list(history.order_rows.column('time')) == [100, 100]
+    assert [row['order_id'] for row in history.orders(start_ns=100)] == [1, 2]
+
+
+def test_backtest_history_matches_strategy_trades():
+    backtester = Backtester(SwingStrategy, SWING_PARAMS, BENCH_SYMBOL, BENCH_TICK_SIZE, BENCH_UNIT_SIZE, history=True)
+    result = backtester.run(random_walk_ticks(3000))
+    history = backtester.strategy.trade_history
+    assert result.n_orders > 0
+    assert len(history.order_rows) == result.n_orders
+    fills = history.fills()
+    assert len(fills) == result.n_trades
+    times = [row['time'] for row in fills]
+    assert times == sorted(times)
+    for row in fills[:20]:
+        assert row['trade_id'] in [fill['trade_id'] for fill in history.fills(order_id=row['order_id'])]
@@ -0,0 +1,60 @@
+import pytest
+from constants import *
+from swing_strategy import SwingStrategy, OPEN_PRICE
+from backtest import Backtester
+from journal import FRAME_CALL, FRAME_CONFIG, FRAME_EVENT, EventJournal, Replayer, ReplayDivergence
+from journal import read_journal, recording_class
+from benchmarks import BENCH_SYMBOL, BENCH_TICK_SIZE, BENCH_UNIT_SIZE, SWING_PARAMS, random_walk_ticks
+
+
+def record_backtest(path, n_ticks=3000):
+    """
+    Backtest SwingStrategy on the recording platform layer with an event journal at path.
+    :return: Recorded strategy.
+    """
+    journal = EventJournal(path, flush_interval=60)
+
+    class RecordedSwingStrategy(recording_class(SwingStrategy)):
+        def __init__(self):
+            super().__init__()
+            self.event_journal = journal
+
+    backtester = Backtester(RecordedSwingStrategy, SWING_PARAMS, BENCH_SYMBOL, BENCH_TICK_SIZE, BENCH_UNIT_SIZE)
+    result = backtester.run(random_walk_ticks(n_ticks))
+    journal.close()
+    assert result.n_orders > 0
+    return backtester.strategy
+
+
+def test_replay_reproduces_recorded_strategy_state(tmp_path):
+    path = str(tmp_path / 'swing.journal')
+    recorded = record_backtest(path)
+    kinds = [kind for kind, _ in read_journal(path)]
+    assert kinds[0] == FRAME_CONFIG
+    assert FRAME_EVENT in kinds and FRAME_CALL in kinds
+
+    replayer = Replayer(SwingStrategy, path)
+    replayed = replayer.run()
+    assert replayer.n_checked > 0
+    assert replayed.snapshot_state() == recorded.snapshot_state()
+    assert replayed.trace_record() == recorded.trace_record()
+
+
+def test_replay_with_other_settings_diverges(tmp_path):
+    path = str(tmp_path / 'swing.journal')
+    record_backtest(path)
+    strategy_setting = next(value for kind, value in read_journal(path) if kind == FRAME_CONFIG)
+    strategy_setting[BENCH_SYMBOL] = dict(strategy_setting[BENCH_SYMBOL], **{OPEN_PRICE: SWING_PARAMS[OPEN_PRICE] - 20})
+    with pytest.raises(ReplayDivergence):
+        Replayer(SwingStrategy, path, strategy_setting).run()
+
+
+def test_torn_last_frame_is_ignored(tmp_path):
+    path = str(tmp_path / 'swing.journal')
+    journal = EventJournal(path, flush_interval=60)
+    journal.record_config({'a': 1})
+    journal.record_call('buy_action', 7)
+    journal.close()
+    with open(path, 'ab') as f:
+        f.write(b'\x02\xff\x00\x00\x00torn')
+    assert list(read_journal(path)) == [(FRAME_CONFIG, {'a': 1}), (FRAME_CALL, ('buy_action', 7))]
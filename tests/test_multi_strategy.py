@@ -0,0 +1,96 @@
+from constants import *
+from events import EVENT_CANCEL, EVENT_MARKETDATA, EVENT_STATUS, StrategyEvent
+from backtest import Backtester, BacktestEventEngine, DEFAULT_MARGIN_FEE
+from swing_strategy import SwingStrategy
+from multi_strategy import MultiStrategyHost
+from benchmarks import BENCH_SYMBOL, BENCH_TICK_SIZE, BENCH_UNIT_SIZE, SWING_PARAMS, random_walk_ticks
+
+OTHER_SYMBOL = 'OTHER'
+
+
+def hosted_strategies():
+    """
+    Host SwingStrategy backtests of two symbols on a shared engine, with order ids of the second from 1001.
+    :return: (host, strategy of BENCH_SYMBOL, strategy of OTHER_SYMBOL)
+    """
+    host = MultiStrategyHost(BacktestEventEngine())
+    strategies = []
+    for symbol in (BENCH_SYMBOL, OTHER_SYMBOL):
+        strategy = Backtester(SwingStrategy, SWING_PARAMS, symbol, BENCH_TICK_SIZE, BENCH_UNIT_SIZE)._setup_strategy()
+        host.add(strategy)
+        strategy.broker.event_engine = host.event_engine
+        strategies.append(strategy)
+    strategies[1].broker._next_order_id = 1001
+    host.start()
+    return (host,) + tuple(strategies)
+
+
+def run_ticks(host, n_ticks=2000):
+    """
+    Feed the same ticks to both symbols, interleaved, through the shared engine.
+    """
+    engine = host.event_engine
+    for tick in random_walk_ticks(n_ticks):
+        for symbol in (BENCH_SYMBOL, OTHER_SYMBOL):
+            host.strategy(symbol).broker.on_tick(tick[0], tick[1], tick[2], tick[3], tick[4], tick[5])
+            engine.process_pending()
+            param = dict(zip((TICK_TIME, PRICE, BID, ASK, BID_VOLUME, ASK_VOLUME, HIGH_LIMIT, LOW_LIMIT), tick))
+            param.update({INSTRUMENT_SYMBOL: symbol, INSTRUMENT_ID: symbol, TICK_SIZE: BENCH_TICK_SIZE,
+                          UNIT_SIZE: BENCH_UNIT_SIZE})
+            engine.put(StrategyEvent(EVENT_MARKETDATA, param))
+            engine.process_pending()
+
+
+def test_events_are_routed_to_their_strategy():
+    host, bench, other = hosted_strategies()
+    run_ticks(host)
+    for strategy, order_ids in ((bench, range(1, 1001)), (other, range(1001, 10**6))):
+        assert strategy.broker.n_trades > 0
+        assert strategy.order_dict and all(order_id in order_ids for order_id in strategy.order_dict)
+        assert strategy.contract.last is not None
+        assert strategy._position_qty == strategy.portfolio_obj.position_qty
+    host.stop()
+
+
+def test_order_events_without_symbol_are_routed_by_order_id():
+    host, bench, other = hosted_strategies()
+    run_ticks(host)
+    order_id = min(other.order_dict)
+    assert host._order_strategy({ORDER_ID: str(order_id)}) is other
+    assert host._order_strategies == {order_id: other}
+    assert host._order_strategy({ORDER_ID: 10**9}) is None
+    assert host._order_strategy({}) is None
+
+    # A final status without symbol is routed by order id, and evicts the order from the cache
+    other.broker.orders.pop(order_id)
+    host.event_engine.put(StrategyEvent(EVENT_STATUS, {ORDER_ID: order_id, ORDER_STATUS: ORDER_CANCELLED}))
+    host.event_engine.process_pending()
+    assert order_id not in other.order_dict
+    assert host._order_strategies == {}
+    host.stop()
+
+
+def test_cancel_without_symbol_goes_to_all_strategies():
+    host, bench, other = hosted_strategies()
+    run_ticks(host)
+    assert bench.broker.orders and other.broker.orders
+    host.event_engine.put(StrategyEvent(EVENT_CANCEL, {CANCEL_TYPE: CANCEL_ALL}))
+    host.event_engine.process_pending()
+    assert not bench.broker.orders and not other.broker.orders
+    assert not bench.order_dict and not other.order_dict
+    host.stop()
+
+
+def test_strategies_share_lead_margin_rates():
+    host, bench, other = hosted_strategies()
+    rates = bench.instru_margin_comm_rate
+    assert other.instru_margin_comm_rate is rates
+    assert set(rates) == {BENCH_SYMBOL, OTHER_SYMBOL}
+
+    rates.set_rates(OTHER_SYMBOL, {DIRECTION_LONG: dict(DEFAULT_MARGIN_FEE, **{MARGIN_RATE: 0.3}),
+                                   DIRECTION_SHORT: dict(DEFAULT_MARGIN_FEE)})
+    other._check_margin_fee()
+    bench._check_margin_fee()
+    assert other.contract.margin_fee[DIRECTION_LONG][MARGIN_RATE] == 0.3
+    assert bench.contract.margin_fee[DIRECTION_LONG][MARGIN_RATE] == DEFAULT_MARGIN_FEE[MARGIN_RATE]
+    host.stop()
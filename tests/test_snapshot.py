@@ -0,0 +1,114 @@
+import os
+import time
+from snapshot import CHECKPOINT_SUFFIX, JOURNAL_SUFFIX, StateJournal, load_state
+
+
+class FakeStrategy:
+    def __init__(self):
+        self.state = {'position': (0, 0)}
+        self.n_snapshots = 0
+
+    def snapshot_state(self):
+        self.n_snapshots += 1
+        return dict(self.state)
+
+
+def test_load_state_applies_journal_frames_on_checkpoint(tmp_path):
+    path = str(tmp_path / 'state')
+    journal = StateJournal(path, checkpoint_interval=100, flush_interval=60)
+    assert load_state(path) is None
+    journal.write({'position': (1, 0), ('order', 1): 'o1'})
+    assert journal.n_checkpoints == 1
+    assert journal.write({'position': (1, 0), ('order', 1): 'o1'}) is False  # unchanged
+    journal.write({'position': (2, 0), ('order', 2): 'o2'})
+    assert journal.n_frames == 1
+    assert load_state(path) == {'position': (2, 0), ('order', 2): 'o2'}
+    journal.close()
+
+
+def test_checkpoint_restarts_journal(tmp_path):
+    path = str(tmp_path / 'state')
+    journal = StateJournal(path, checkpoint_interval=2, flush_interval=60)
+    for i in range(6):
+        journal.write({'i': i})
+    assert journal.n_checkpoints == 2
+    assert load_state(path) == {'i': 5}
+    journal.close()
+
+
+def test_torn_frame_and_stale_journal_are_ignored(tmp_path):
+    path = str(tmp_path / 'state')
+    journal = StateJournal(path, flush_interval=60)
+    journal.write({'i': 0})
+    journal.write({'i': 1})
+    journal.close()
+    with open(path + JOURNAL_SUFFIX, 'ab') as f:
+        f.write(b'\x10\x00\x00\x00torn')
+    assert load_state(path) == {'i': 1}
+
+    # A journal left by a crash during a checkpoint replacement belongs to the previous checkpoint
+    with open(path + JOURNAL_SUFFIX, 'rb') as f:
+        stale_journal = f.read()
+    journal = StateJournal(path, flush_interval=60)
+    journal.write({'i': 2})
+    journal.close()
+    with open(path + JOURNAL_SUFFIX, 'wb') as f:
+        f.write(stale_journal)
+    assert load_state(path) == {'i': 2}
+
+
+def test_recorded_states_are_written_by_flush_and_close(tmp_path):
+    path = str(tmp_path / 'state')
+    strategy = FakeStrategy()
+    journal = StateJournal(path, tick_interval=3, flush_interval=60)
+    journal.record(strategy)
+    assert not os.path.exists(path + CHECKPOINT_SUFFIX)  # only queued
+    assert journal.flush() is True
+    assert journal.flush() is False
+    assert load_state(path) == {'position': (0, 0)}
+
+    for i in range(5):
+        strategy.state['position'] = (i, 0)
+        journal.on_tick(strategy)  # queues the state of the 3rd tick
+    journal.flush()
+    assert load_state(path) == {'position': (2, 0)}
+
+    strategy.state['position'] = (7, 0)
+    journal.record(strategy)
+    strategy.state['position'] = (8, 0)
+    journal.record(strategy)  # only marked changed, snapshot on close
+    journal.close()
+    assert journal.n_frames == 2
+    assert load_state(path) == {'position': (8, 0)}
+
+
+def test_records_take_one_snapshot_per_flush(tmp_path):
+    path = str(tmp_path / 'state')
+    strategy = FakeStrategy()
+    journal = StateJournal(path, tick_interval=1000, flush_interval=60)
+    for i in range(100):
+        strategy.state['position'] = (i, 0)
+        journal.record(strategy)
+    assert strategy.n_snapshots == 1
+    journal.flush()
+    assert load_state(path) == {'position': (0, 0)}
+
+    journal.on_tick(strategy)  # the state recorded since the last snapshot is taken on the next tick
+    assert strategy.n_snapshots == 2
+    journal.on_tick(strategy)
+    journal.flush()
+    journal.on_tick(strategy)  # nothing recorded since
+    assert strategy.n_snapshots == 2
+    assert load_state(path) == {'position': (99, 0)}
+    journal.close()
+
+
+def test_writer_thread_writes_recorded_states(tmp_path):
+    path = str(tmp_path / 'state')
+    journal = StateJournal(path, flush_interval=0.001)
+    journal.record(FakeStrategy())
+    deadline = time.monotonic() + 5
+    while load_state(path) is None and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert load_state(path) == {'position': (0, 0)}
+    journal.close()
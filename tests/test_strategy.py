@@ -0,0 +1,190 @@
+import random
+from constants import *
+from events import EVENT_BUY, EVENT_MARKETDATA, StrategyEvent
+from strategy import MarginRates, OrderIndex, OrderRecord, Strategy, calc_fee
+from swing_strategy import SwingStrategy
+from backtest import Backtester, DEFAULT_MARGIN_FEE
+from metrics import METRIC_POSITION_QTY
+from benchmarks import BENCH_SYMBOL, BENCH_TICK_SIZE, BENCH_UNIT_SIZE, SWING_PARAMS, random_walk_ticks
+
+
+class FeePlatform:
+    """
+    Platform fee calculation of a buy order, with a quadratic fee type that is not linear in the order quantity.
+    """
+
+    @staticmethod
+    def _fee(fee_type, fee_rate, param):
+        if fee_type == 'quadratic':
+            return fee_rate * param[QTY] ** 2
+        return calc_fee(fee_type, fee_rate, param[PRICE], param[QTY], param[UNIT_SIZE])
+
+    def calculate_margin(self, event):
+        param = event.even_param
+        return self._fee(param[MARGIN_TYPE], param[MARGIN_RATE], param)
+
+    def calculate_open_commission_with_event(self, event):
+        param = event.even_param
+        return self._fee(param[OPEN_COMM_TYPE], param[OPEN_COMM_RATE], param)
+
+
+def unit_step_buy_qty(platform, event, remaining_cash):
+    # Sizing of on_buy before the closed form: one contract less at a time.
+    order_qty = event.even_param[QTY]
+    while event.even_param[QTY] > 0 and (remaining_cash < platform.calculate_margin(event) +
+                                         platform.calculate_open_commission_with_event(event)):
+        event.even_param[QTY] -= 1
+    qty = event.even_param[QTY]
+    event.even_param[QTY] = order_qty
+    return qty
+
+
+def test_affordable_buy_qty_matches_unit_step_loop():
+    platform = FeePlatform()
+    rng = random.Random(7)
+    fee_types = (FEE_TYPE_RATIO, FEE_TYPE_FIXED, 'quadratic')
+    for _ in range(2000):
+        param = {
+            PRICE: round(rng.uniform(0.5, 5000.0), 2),
+            QTY: rng.randint(0, 300),
+            UNIT_SIZE: rng.choice((1.0, 10.0, 100.0)),
+            MARGIN_TYPE: rng.choice(fee_types),
+            MARGIN_RATE: rng.choice((0.0, 0.05, 0.12, 3.0)),
+            OPEN_COMM_TYPE: rng.choice(fee_types),
+            OPEN_COMM_RATE: rng.choice((0.0, 0.0001, 1.5))
+        }
+        event = StrategyEvent(EVENT_BUY, param)
+        cash = rng.uniform(0.0, 2e6)
+        expected = unit_step_buy_qty(platform, event, cash)
+        order_qty = param[QTY]
+        assert Strategy._affordable_buy_qty(platform, event, cash) == expected, param
+        assert param[QTY] == order_qty
+
+
+
+class BufferedFeePlatform(FeePlatform):
+    """
+    Platform fees differing from calc_fee: a 20% margin buffer, commissions rounded up per 5 lots with a minimum.
+    """
+
+    def calculate_margin(self, event):
+        return 1.2 * super().calculate_margin(event)
+
+    def calculate_open_commission_with_event(self, event):
+        param = dict(event.even_param, **{QTY: -(-event.even_param[QTY] // 5) * 5})
+        return max(25.0, super().calculate_open_commission_with_event(StrategyEvent(EVENT_BUY, param)))
+
+
+def test_affordable_buy_qty_with_platform_fees_other_than_calc_fee():
+    platform = BufferedFeePlatform()
+    rng = random.Random(11)
+    for _ in range(2000):
+        param = {
+            PRICE: round(rng.uniform(0.5, 5000.0), 2),
+            QTY: rng.randint(0, 300),
+            UNIT_SIZE: rng.choice((1.0, 10.0, 100.0)),
+            MARGIN_TYPE: rng.choice((FEE_TYPE_RATIO, FEE_TYPE_FIXED)),
+            MARGIN_RATE: rng.choice((0.05, 0.12, 3.0)),
+            OPEN_COMM_TYPE: rng.choice((FEE_TYPE_RATIO, FEE_TYPE_FIXED)),
+            OPEN_COMM_RATE: rng.choice((0.0001, 1.5, 40.0))
+        }
+        event = StrategyEvent(EVENT_BUY, param)
+        cash = rng.uniform(0.0, 2e6)
+        assert Strategy._affordable_buy_qty(platform, event, cash) == unit_step_buy_qty(platform, event, cash), param
+
+
+def test_order_index_finds_orders_outside_price_range():
+    index = OrderIndex()
+    orders = [OrderRecord(None, order_id, None, None, 0, 0, price, 1, 'Net')
+              for order_id, price in ((1, 99.0), (2, 100.0), (3, 101.0), (4, 99.0), (5, 103.5))]
+    for order in orders:
+        index.add(order)
+    assert len(index) == 5
+    assert index.ids_outside(100.0, 101.0) == [1, 4, 5]
+    assert index.ids_outside(99.0, 103.5) == []
+
+    index.remove(orders[0])
+    index.remove(orders[0])  # removing twice has no effect
+    assert index.ids_outside(100.0, 101.0) == [4, 5]
+    index.clear()
+    assert len(index) == 0
+
+
+def test_margin_rates_versions():
+    rates = MarginRates({'A': {DIRECTION_LONG: {MARGIN_RATE: 0.1}}})
+    assert rates.version('A') == 1 and rates.version('B') == 0
+    rates['B'] = {DIRECTION_LONG: {MARGIN_RATE: 0.2}}
+    assert rates.version('B') == 1
+    assert rates.version('B') == 1  # unchanged
+
+    rates['A'][DIRECTION_LONG][MARGIN_RATE] = 0.15  # edited in place, not seen until touched
+    assert rates.version('A') == 1
+    rates.touch('A')
+    assert rates.version('A') == 2
+    rates.set_rates('A', {DIRECTION_SHORT: {MARGIN_RATE: 0.15}})
+    assert rates.version('A') == 3
+
+    rates.update(A=rates['A'])  # set again
+    assert rates.version('A') == 4
+    rates.pop('B')
+    assert rates.version('B') == 2
+
+
+def test_strategy_picks_up_touched_rates():
+    backtester = Backtester(SwingStrategy, SWING_PARAMS, BENCH_SYMBOL, BENCH_TICK_SIZE, BENCH_UNIT_SIZE,
+                            margin_fee=dict(DEFAULT_MARGIN_FEE))
+    strategy = backtester._setup_strategy()
+    strategy._check_margin_fee()
+    assert strategy.contract.margin_fee[DIRECTION_LONG][MARGIN_RATE] == DEFAULT_MARGIN_FEE[MARGIN_RATE]
+
+    strategy.instru_margin_comm_rate[BENCH_SYMBOL][DIRECTION_LONG][MARGIN_RATE] = 0.2
+    strategy.instru_margin_comm_rate.touch(BENCH_SYMBOL)
+    strategy._check_margin_fee()
+    assert strategy.contract.margin_fee[DIRECTION_LONG][MARGIN_RATE] == 0.2
+
+
+def test_swing_metrics_are_labeled_by_strategy_state():
+    backtester = Backtester(SwingStrategy, SWING_PARAMS, BENCH_SYMBOL, BENCH_TICK_SIZE, BENCH_UNIT_SIZE, metrics=True)
+    backtester.run(random_walk_ticks(3000))
+    strategy = backtester.strategy
+    counters, gauges = strategy.metrics.samples()
+    assert counters
+    assert {state for _, _, state in counters} <= set(SwingStrategy.STATE_NAMES.values())
+    for zone in strategy._zones.values():
+        assert gauges[(METRIC_POSITION_QTY, zone.tag, None)] == zone.position_qty
+
+
+class CheckedGainSwingStrategy(SwingStrategy):
+    """
+    SwingStrategy recording its incremental gain and the portfolio gain after every tick.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.profit_reconcile_interval = 50
+        self.gains = []
+
+    def _process_tick(self, event, tick_start=None):
+        super()._process_tick(event, tick_start)
+        self.gains.append((self._gain, self.portfolio_obj.gain(), self._ticks_since_reconcile))
+
+
+def test_incremental_gain_matches_portfolio_gain():
+    backtester = Backtester(CheckedGainSwingStrategy, SWING_PARAMS, BENCH_SYMBOL, BENCH_TICK_SIZE, BENCH_UNIT_SIZE)
+    result = backtester.run(random_walk_ticks(3000))
+    strategy = backtester.strategy
+    assert result.n_trades > 10
+    assert sum(1 for _, _, n_ticks in strategy.gains if n_ticks) > 2000  # mostly incremental ticks
+    for gain, portfolio_gain, _ in strategy.gains:
+        assert abs(gain - portfolio_gain) < 1e-6 * max(1.0, abs(portfolio_gain))
+
+
+def test_first_tick_without_last_price():
+    backtester = Backtester(SwingStrategy, SWING_PARAMS, BENCH_SYMBOL, BENCH_TICK_SIZE, BENCH_UNIT_SIZE)
+    strategy = backtester._setup_strategy()
+    strategy.start()
+    param = {INSTRUMENT_SYMBOL: BENCH_SYMBOL, INSTRUMENT_ID: backtester.instrument_id, TICK_SIZE: BENCH_TICK_SIZE,
+             UNIT_SIZE: BENCH_UNIT_SIZE, TICK_TIME: 0, PRICE: INVALID_VALUE, BID: None, ASK: None}
+    strategy._process_tick(StrategyEvent(EVENT_MARKETDATA, param))
+    assert strategy.contract.last is None and strategy._gain == 0.0
+    assert strategy._ticks_since_reconcile == strategy.profit_reconcile_interval  # reconciled again on next tick
@@ -0,0 +1,24 @@
+from clock import parse_time
+from sweep import SharedTicks, param_grid
+
+
+def test_shared_ticks_keep_backtest_tick_times():
+    ticks = [('2024-01-02T09:30:00', 100.0, 99.5, 100.5, 3, 4, 1e9, 0.0),
+             ('1704187800.25', 101.0, 100.5, 101.5, 0, 0, 1e9, 0.0),
+             (1704187801 * 10**9 + 1, 102.0, 101.5, 102.5, 0, 0, 1e9, 0.0)]
+    shared = SharedTicks.create(ticks)
+    try:
+        copied = list(shared)
+        assert [tick[0] for tick in copied] == [parse_time(ticks[0][0]), parse_time(ticks[1][0]), ticks[2][0]]
+        assert copied[0][1:] == (100.0, 99.5, 100.5, 3, 4, 1e9, 0.0)
+        assert list(shared.slice(1, 2)) == copied[1:2]
+        assert shared.column('time').format == 'q'
+    finally:
+        shared.close()
+
+
+def test_param_grid_sets_nested_parameters():
+    base = {'A': 1, 'B': {'x': 0, 'y': 0}}
+    params_list = param_grid(base, {'A': [1, 2], ('B', 'x'): [5, 6]})
+    assert [(p['A'], p['B']['x'], p['B']['y']) for p in params_list] == [(1, 5, 0), (1, 6, 0), (2, 5, 0), (2, 6, 0)]
+    assert base['B']['x'] == 0
@@ -0,0 +1,49 @@
+import os
+import pytest
+from backtest import NO_PRICE_LIMIT
+from tick_store import META_FILE, TickStore, TickStoreWriter
+
+
+def write_store(path, ticks, tick_size=0.01):
+    with TickStoreWriter(str(path), 'TEST', tick_size, 1.0, chunk_size=2) as writer:
+        for tick in ticks:
+            writer.append(*tick)
+    return TickStore(str(path))
+
+
+def test_round_trip_and_time_slice(tmp_path):
+    ticks = [(10, 100.01, 100.0, 100.02, 5, 6, NO_PRICE_LIMIT, 0.0),
+             (20, 100.02, 100.01, 100.03, 0, 0, NO_PRICE_LIMIT, 0.0),
+             (30, 99.99, 99.98, 100.0, 7, 3 * 10**9, NO_PRICE_LIMIT, 0.0)]
+    store = write_store(tmp_path, ticks)
+    assert list(store) == ticks
+    assert [tick[0] for tick in store.slice_time(15, 30)] == [20]
+    assert list(store.slice(1, 3)) == ticks[1:]
+    store.close()
+
+
+def test_small_tick_size_keeps_large_prices(tmp_path):
+    ticks = [(1, 600000.1234, 600000.1233, 600000.1235, 1, 1, NO_PRICE_LIMIT, 0.0)]  # 6e9 ticks
+    store = write_store(tmp_path, ticks, tick_size=0.0001)
+    assert list(store) == ticks
+    store.close()
+
+
+def test_append_rejects_values_out_of_column_range(tmp_path):
+    writer = TickStoreWriter(str(tmp_path), 'TEST', 1e-9, 1.0)
+    with pytest.raises(ValueError):
+        writer.append(1, 1e20, 1.0, 1.0, 0, 0, 2.0, 0.0)
+    with pytest.raises(ValueError):
+        writer.append(1, float('inf'), 1.0, 1.0, 0, 0, 2.0, 0.0)
+    writer.append(1, 1.0, 1.0, 1.0, 0, 0, 2.0, 0.0)
+    writer.close()
+    assert len(TickStore(str(tmp_path))) == 1
+
+
+def test_failed_write_leaves_no_readable_store(tmp_path):
+    write_store(tmp_path, [(1, 1.0, 1.0, 1.0, 0, 0, 2.0, 0.0)]).close()
+    with pytest.raises(RuntimeError):
+        with TickStoreWriter(str(tmp_path), 'TEST', 0.01, 1.0) as writer:
+            writer.append(2, 1.0, 1.0, 1.0, 0, 0, 2.0, 0.0)
+            raise RuntimeError
+    assert not os.path.exists(os.path.join(str(tmp_path), META_FILE))
@@ -0,0 +1,38 @@
+import walk_forward
+from swing_strategy import SwingStrategy, MIN_OSC_HEIGHT
+from walk_forward import windows
+from benchmarks import BENCH_SYMBOL, BENCH_TICK_SIZE, BENCH_UNIT_SIZE, SWING_PARAMS, random_walk_ticks
+
+
+def test_windows_roll_by_test_length_or_step():
+    assert windows(10, 4, 3) == [((0, 4), (4, 7)), ((3, 7), (7, 10))]
+    assert windows(11, 4, 3) == [((0, 4), (4, 7)), ((3, 7), (7, 10)), ((6, 10), (10, 11))]  # short last test
+    assert windows(10, 4, 3, step=2) == [((0, 4), (4, 7)), ((2, 6), (6, 9)), ((4, 8), (8, 10))]
+    assert windows(4, 4, 3) == []  # no tick left to test
+
+
+def test_rerun_on_longer_history_only_backtests_new_windows(tmp_path, monkeypatch):
+    n_backtests = []
+
+    def counted_run_sweep(strategy_cls, params_list, *args, **kwargs):
+        n_backtests.append(len(params_list))
+        return run_sweep(strategy_cls, params_list, *args, **kwargs)
+
+    run_sweep = walk_forward.run_sweep
+    monkeypatch.setattr(walk_forward, 'run_sweep', counted_run_sweep)
+    grid = {MIN_OSC_HEIGHT: [SWING_PARAMS[MIN_OSC_HEIGHT], SWING_PARAMS[MIN_OSC_HEIGHT] + 2]}
+
+    def run(n_ticks, **kwargs):
+        del n_backtests[:]
+        report = walk_forward.walk_forward(SwingStrategy, SWING_PARAMS, grid, random_walk_ticks(n_ticks), BENCH_SYMBOL,
+                                           BENCH_TICK_SIZE, BENCH_UNIT_SIZE, 1000, 500,
+                                           cache_dir=str(tmp_path), processes=1, **kwargs)
+        return report, sum(n_backtests)
+
+    report, n = run(2000)
+    assert len(report) == 2 and n == 2 * 2 + 2  # 2 configs trained and the best tested per window
+    longer_report, n = run(2500)
+    assert len(longer_report) == 3 and n == 2 + 1  # only the new window
+    assert longer_report[:2] == report
+    _, n = run(2500, strategy_version='2')
+    assert n == 3 * 3  # results of another strategy version are not reused
@@ -0,0 +1,240 @@
+"""
+Columnar memory-mapped tick store for market data replay.
+
+A store is a directory with a meta.json file and one binary column file per tick field:
+    time                                        int64, nanoseconds since epoch, non-decreasing
+    price, bid, ask, high_limit, low_limit      int64, prices in number of ticks of the contract tick size
+    bid_volume, ask_volume                      int64
+Column files are memory-mapped on open, so opening a store costs nothing regardless of its size, and only the pages
+of the ticks actually iterated are read.
+"""
+
+
+import json
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from clock import TIME_UNITS, parse_time
+from utils import get_number_of_decimal
+from backtest import read_csv_ticks
+
+
+META_FILE = 'meta.json'
+TIME_COLUMN = ('time', 'q')
+PRICE_COLUMNS = (('price', 'q'), ('bid', 'q'), ('ask', 'q'), ('high_limit', 'q'), ('low_limit', 'q'))
+VOLUME_COLUMNS = (('bid_volume', 'q'), ('ask_volume', 'q'))
+COLUMNS = (TIME_COLUMN,) + PRICE_COLUMNS + VOLUME_COLUMNS
+INT64_MIN, INT64_MAX = -2**63, 2**63 - 1
+
+
+class TickStoreWriter:
+    """
+    Streaming writer of a tick store. Ticks are buffered and appended to the column files in chunks.
+    """
+
+    def __init__(self, path, symbol, tick_size, unit_size, chunk_size=65536):
+        """
+        :param path: str. Store directory, created if it does not exist. An existing store in it is overwritten, and
+            only readable again once the writer is closed.
+        :param symbol: str. Contract symbol.
+        :param tick_size: float. Contract price tick size used to quantize prices.
+        :param unit_size: float. Contract unit size.
+        :param chunk_size: int. Number of buffered ticks per write.
+        """
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):  # its column files are about to be overwritten
+            os.remove(meta_path)
+        self.path = path
+        self.symbol = symbol
+        self.tick_size = tick_size
+        self.unit_size = unit_size
+        self.n_ticks = 0
+        self._chunk_size = chunk_size
+        self._buffers = [array(typecode) for _, typecode in COLUMNS]
+        self._files = [open(os.path.join(path, name + '.bin'), 'wb') for name, _ in COLUMNS]
+        self._last_time = None
+
+    def append(self, time, price, bid, ask, bid_volume, ask_volume, high_limit, low_limit):
+        """
+        Append a tick. Arguments are in the order of backtest tick tuples, time in nanoseconds since epoch.
+        Raises ValueError if a value does not fit its int64 column, e.g. a non finite price, instead of storing it.
+        """
+        if self._last_time is not None and time < self._last_time:
+            raise ValueError("Tick time {} is earlier than the previous tick time {}.".format(time, self._last_time))
+        tick_size = self.tick_size
+        try:
+            values = (int(time), int(round(price / tick_size)), int(round(bid / tick_size)),
+                      int(round(ask / tick_size)), int(round(high_limit / tick_size)),
+                      int(round(low_limit / tick_size)), int(bid_volume), int(ask_volume))
+        except OverflowError:
+            values = None
+        if values is None or not INT64_MIN <= min(values) <= max(values) <= INT64_MAX:
+            raise ValueError("Tick at time {} does not fit the int64 columns of tick store {}: {}".format(
+                time, self.path, (price, bid, ask, bid_volume, ask_volume, high_limit, low_limit)))
+        self._last_time = time
+        for buffer, value in zip(self._buffers, values):
+            buffer.append(value)
+        self.n_ticks += 1
+        if len(self._buffers[0]) >= self._chunk_size:
+            self._flush()
+
+    def _flush(self):
+        for buffer, f in zip(self._buffers, self._files):
+            buffer.tofile(f)
+            del buffer[:]
+
+    def close(self):
+        """
+        Flush buffered ticks and write the store meta data.
+        """
+        self._flush()
+        for f in self._files:
+            f.close()
+        meta = {
+            'symbol': self.symbol,
+            'tick_size': self.tick_size,
+            'unit_size': self.unit_size,
+            'n_ticks': self.n_ticks,
+            'byteorder': sys.byteorder,
+            'columns': [[name, typecode] for name, typecode in COLUMNS]
+        }
+        with open(os.path.join(self.path, META_FILE), 'w') as f:
+            json.dump(meta, f)
+
+    def abort(self):
+        """
+        Close the column files without writing the store meta data, so the partial store cannot be opened.
+        """
+        for f in self._files:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class TickStore:
+    """
+    Read-only memory-mapped tick store, or a time slice of it.
+    Iteration yields backtest tick tuples (time, price, bid, ask, bid_volume, ask_volume, high_limit, low_limit)
+    with prices converted back from ticks.
+    """
+
+    def __init__(self, path, start=0, stop=None):
+        """
+        :param path: str. Store directory.
+        :param start: int. Index of the first tick of the slice.
+        :param stop: int. Index after the last tick of the slice. End of store if None.
+        """
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        if meta['byteorder'] != sys.byteorder:
+            raise ValueError("Tick store {} has {} byte order.".format(path, meta['byteorder']))
+        self.path = path
+        self.symbol = meta['symbol']
+        self.tick_size = meta['tick_size']
+        self.unit_size = meta['unit_size']
+        self.decimal = get_number_of_decimal(self.tick_size)
+        n_ticks = meta['n_ticks']
+        self.start = max(0, min(start, n_ticks))
+        self.stop = n_ticks if stop is None else max(self.start, min(stop, n_ticks))
+        self.columns = {}  # column name -> memoryview of the whole column
+        self._mmaps = []
+        for name, typecode in meta['columns']:
+            if n_ticks == 0:
+                self.columns[name] = memoryview(array(typecode))
+                continue
+            with open(os.path.join(path, name + '.bin'), 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mmaps.append(mm)
+            self.columns[name] = memoryview(mm).cast(typecode)
+
+    def __reduce__(self):
+        # Pickled as its path and slice, e.g. to be re-opened by worker processes.
+        return self.__class__, (self.path, self.start, self.stop)
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def column(self, name):
+        """
+        :return: memoryview of a column within the slice. Prices are in ticks.
+        """
+        return self.columns[name][self.start:self.stop]
+
+    def slice(self, start, stop):
+        """
+        :return: TickStore of ticks [start, stop) relative to this slice.
+        """
+        return self.__class__(self.path, self.start + start, self.start + stop)
+
+    def slice_time(self, time_from=None, time_to=None):
+        """
+        :param time_from: int. Included lower bound of tick time in nanoseconds since epoch. No bound if None.
+        :param time_to: int. Excluded upper bound of tick time. No bound if None.
+        :return: TickStore of ticks in the time range.
+        """
+        times = self.columns['time']
+        start = self.start if time_from is None else bisect_left(times, time_from, self.start, self.stop)
+        stop = self.stop if time_to is None else bisect_left(times, time_to, start, self.stop)
+        return self.__class__(self.path, start, stop)
+
+    def __iter__(self):
+        tick, decimal = self.tick_size, self.decimal
+
+        def to_price(n_ticks):
+            return round(n_ticks * tick, decimal)
+
+        c = self.column
+        return zip(c('time'), map(to_price, c('price')), map(to_price, c('bid')), map(to_price, c('ask')),
+                   c('bid_volume'), c('ask_volume'), map(to_price, c('high_limit')), map(to_price, c('low_limit')))
+
+    def close(self):
+        self.columns = {}
+        for mm in self._mmaps:
+            try:
+                mm.close()
+            except BufferError:  # Still referenced by a column slice. Closed when released.
+                pass
+        self._mmaps = []
+
+
+def convert_csv(csv_path, store_path, symbol, tick_size, unit_size, time_unit='s'):
+    """
+    Convert a CSV tick file to a tick store, streaming row by row.
+    :param csv_path: str. CSV file in the format of backtest.read_csv_ticks().
+    :param store_path: str. Store directory.
+    :param time_unit: str. Unit of numeric tick times in the CSV file.
+    :return: int. Number of ticks converted.
+    """
+    with TickStoreWriter(store_path, symbol, tick_size, unit_size) as writer:
+        for tick in read_csv_ticks(csv_path):
+            writer.append(parse_time(tick[0], time_unit), *tick[1:])
+    return writer.n_ticks
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert a CSV tick file to a columnar tick store.')
+    parser.add_argument('csv', help='CSV tick file.')
+    parser.add_argument('store', help='Tick store directory.')
+    parser.add_argument('--symbol', required=True)
+    parser.add_argument('--tick-size', type=float, required=True)
+    parser.add_argument('--unit-size', type=float, required=True)
+    parser.add_argument('--time-unit', choices=sorted(TIME_UNITS), default='s')
+    args = parser.parse_args()
+    n_ticks = convert_csv(args.csv, args.store, args.symbol, args.tick_size, args.unit_size, args.time_unit)
+    print("{} ticks written to {}".format(n_ticks, args.store))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Sampled structured trace of the strategy state on ticks.
+"""
+
+
+import json
+from logging import INFO
+
+
+TICK_TRACE = "TICK_TRACE %s"
+
+
+class TickTracer:
+    """
+    Log a JSON record of the strategy state every sample_interval ticks.
+    Lets production follow the strategy at INFO level at the cost of one counter increment on unsampled ticks, instead
+    of formatting the full strategy state in debug logs on every tick.
+    """
+    __slots__ = ('logger', 'sample_interval', 'level', '_countdown')
+
+    def __init__(self, logger, sample_interval=1000, level=INFO):
+        """
+        :param logger: Logger of the trace records.
+        :param sample_interval: int. Number of ticks between two trace records.
+        :param level: int. Logging level of the trace records.
+        """
+        if sample_interval < 1:
+            raise ValueError("Invalid tick trace sample interval {}.".format(sample_interval))
+        self.logger = logger
+        self.sample_interval = sample_interval
+        self.level = level
+        self._countdown = 1  # trace the first tick
+
+    def __repr__(self):
+        return "TickTracer(sample_interval={}, level={})".format(self.sample_interval, self.level)
+
+    def on_tick(self, strategy):
+        """
+        Count a tick and log the strategy trace record if the tick is sampled.
+        :param strategy: Strategy. Its trace_record() is only called on sampled ticks.
+        """
+        self._countdown -= 1
+        if self._countdown:
+            return
+        self._countdown = self.sample_interval
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, TICK_TRACE, json.dumps(strategy.trace_record(), default=str))
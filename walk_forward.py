@@ -0,0 +1,288 @@
+"""
+Walk-forward optimization of strategy parameters on rolling train/test windows of tick history.
+
+Every config of a parameter grid is backtested on the train window, the best one is backtested on the following test
+window, and the window rolls forward by its test length, so test results are all out of sample. Backtests run in
+parallel worker processes as in sweep.py, and stop early once their drawdown exceeds max_drawdown, which discards
+clearly losing configs. Backtest results are cached on disk by window tick data and config, so a rerun on a longer
+history only backtests the new windows. Cache keys name the strategy class but cannot see its code: pass a new
+strategy_version (--strategy-version), e.g. the git revision, after editing the strategy, or results of the previous
+code are reused.
+
+    python walk_forward.py ticks.csv params.json grid.json --symbol rb2101 --tick-size 1 --unit-size 10 \\
+        --train-ticks 200000 --test-ticks 50000 --max-drawdown 20000 --cache-dir wf_cache
+
+with a grid of the swing zone planning and trailing parameters, e.g.:
+
+    {"MIN_OSC_HEIGHT": [4, 6, 8], "TRAIL_PRICE_TICKS": [2, 3], "OPEN_OFFSET_VOLUME.Osc": [1, 2],
+     "CLOSE_OFFSET_VOLUME.Osc": [1, 2], "RISKY_ZONE_ACTIVATE_LOSS_RATIO": [0.03, 0.05]}
+"""
+
+
+import hashlib
+import json
+import os
+from sweep import SharedTicks, param_grid, run_sweep
+from swing_strategy import OPEN_PRICE
+from tick_store import TickStore
+
+
+def windows(n_ticks, train_ticks, test_ticks, step=None):
+    """
+    Rolling train/test windows of a tick history.
+    :param n_ticks: int. Number of ticks of the history.
+    :param train_ticks: int. Number of ticks of train windows.
+    :param test_ticks: int. Number of ticks of test windows.
+    :param step: int. Number of ticks between two windows. test_ticks if None, so test windows do not overlap.
+    :return: list of ((train_start, train_stop), (test_start, test_stop)) tick index ranges. The last test window
+        may be shorter than test_ticks.
+    """
+    step = test_ticks if step is None else step
+    return [((start, start + train_ticks), (start + train_ticks, min(start + train_ticks + test_ticks, n_ticks)))
+            for start in range(0, n_ticks - train_ticks, step)]
+
+
+def window_digest(ticks, start, stop):
+    """
+    :param ticks: TickStore or SharedTicks.
+    :return: str. Digest of the tick data of a window.
+    """
+    digest = hashlib.sha1()
+    for name in SharedTicks.COLUMN_NAMES:
+        digest.update(ticks.column(name)[start:stop])
+    return digest.hexdigest()
+
+
+def _config_key(strategy_params, backtest_settings):
+    return hashlib.sha1(json.dumps([strategy_params, backtest_settings], sort_keys=True).encode()).hexdigest()
+
+
+def _encode_result(result):
+    if 'state_transitions' in result:
+        result = dict(result, state_transitions={'{}->{}'.format(*k): v for k, v in result['state_transitions'].items()})
+    return result
+
+
+class ResultCache:
+    """
+    On-disk cache of backtest results, one JSON file per window of tick data mapping config keys to results.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: str. Cache directory, created if it does not exist. No caching if None.
+        """
+        self.path = path
+        self._windows = {}  # window digest -> {config key: result}
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def __repr__(self):
+        return "ResultCache: path={} windows={}".format(self.path, len(self._windows))
+
+    def window(self, digest):
+        """
+        :return: dict. Cached results of a window by config key.
+        """
+        results = self._windows.get(digest)
+        if results is None:
+            results = self._windows[digest] = {}
+            if self.path is not None:
+                try:
+                    with open(os.path.join(self.path, digest + '.json')) as f:
+                        results.update(json.load(f))
+                except (FileNotFoundError, ValueError):
+                    pass
+        return results
+
+    def save(self, digest):
+        """
+        Write the results of a window to disk, replacing its file atomically.
+        """
+        if self.path is None:
+            return
+        file_path = os.path.join(self.path, digest + '.json')
+        with open(file_path + '.tmp', 'w') as f:
+            json.dump(self._windows[digest], f, sort_keys=True)
+        os.replace(file_path + '.tmp', file_path)
+
+
+def score(result, drawdown_penalty=0.0):
+    """
+    :return: float. Rank of a train result, higher is better. None for failed or stopped backtests.
+    """
+    if 'error' in result or result['stopped']:
+        return None
+    return result['pnl'] - drawdown_penalty * result['max_drawdown']
+
+
+def _run_cached(strategy_cls, tasks, ticks, cache, backtest_settings, processes, max_drawdown):
+    """
+    Backtest the (window digest, config key, strategy params, window) tasks missing in the cache, and cache them.
+    """
+    tasks = [task for task in tasks if task[1] not in cache.window(task[0])]
+    if not tasks:
+        return
+    pending = {}  # window digest -> number of its tasks not completed yet
+    for task in tasks:
+        pending[task[0]] = pending.get(task[0], 0) + 1
+    try:
+        for index, _, result in run_sweep(strategy_cls, [task[2] for task in tasks], ticks,
+                                          processes=processes, windows=[task[3] for task in tasks],
+                                          max_drawdown=max_drawdown, **backtest_settings):
+            digest, key = tasks[index][:2]
+            cache.window(digest)[key] = _encode_result(result)
+            pending[digest] -= 1
+            if not pending[digest]:
+                cache.save(digest)
+                del pending[digest]
+    finally:
+        for digest in pending:  # results of interrupted windows are kept too
+            cache.save(digest)
+
+
+def walk_forward(strategy_cls,
+                 base_params,
+                 grid,
+                 ticks,
+                 symbol,
+                 tick_size,
+                 unit_size,
+                 train_ticks,
+                 test_ticks,
+                 step=None,
+                 principal=1000000.0,
+                 margin_fee=None,
+                 max_drawdown=None,
+                 drawdown_penalty=0.0,
+                 anchor_open_price=True,
+                 cache_dir=None,
+                 strategy_version=None,
+                 processes=None):
+    """
+    Walk-forward optimization of the parameters of a grid.
+    :param strategy_cls: Strategy subclass, e.g. SwingStrategy. Must be importable by worker processes.
+    :param base_params: dict. Strategy parameters shared by all configs.
+    :param grid: dict. Lists of values to search by parameter name, see sweep.param_grid().
+    :param ticks: TickStore, SharedTicks, or iterable of tick tuples copied to shared memory for the run.
+    :param symbol, tick_size, unit_size, principal, margin_fee: Backtester arguments.
+    :param train_ticks, test_ticks, step: Window sizes in ticks, see windows().
+    :param max_drawdown: float. Backtests stop once their drawdown exceeds it, and stopped train configs are not
+        selected. No limit if None.
+    :param drawdown_penalty: float. Weight of the max drawdown subtracted from the pnl to rank train configs.
+    :param anchor_open_price: bool. If OPEN_PRICE is set to the first price of each window, as the strategy starts
+        there.
+    :param cache_dir: str. Directory of the result cache. No cache if None.
+    :param strategy_version: str. Version of the strategy code in the cache keys, e.g. a git revision. Results cached
+        under another version are not reused.
+    :param processes: int. Number of worker processes. Number of CPUs if None.
+    :return: list of dicts by window: train and test tick ranges, best params, its train and test results, and the
+        number of train configs stopped early. Params and test result are None if no train config completed.
+    """
+    shared_ticks = ticks if isinstance(ticks, (TickStore, SharedTicks)) else SharedTicks.create(ticks)
+    backtest_settings = {
+        'symbol': symbol,
+        'tick_size': tick_size,
+        'unit_size': unit_size,
+        'principal': principal,
+        'margin_fee': margin_fee
+    }
+    settings_key = dict(backtest_settings, strategy=strategy_cls.__module__ + '.' + strategy_cls.__qualname__,
+                        strategy_version=strategy_version, max_drawdown=max_drawdown)
+    cache = ResultCache(cache_dir)
+    params_list = param_grid(base_params, grid)
+    try:
+        plan = []
+        for train, test in windows(len(shared_ticks), train_ticks, test_ticks, step):
+            train_params = [_anchored(params, shared_ticks, train[0], anchor_open_price) for params in params_list]
+            plan.append((train, test, window_digest(shared_ticks, *train), window_digest(shared_ticks, *test),
+                         train_params, [_config_key(params, settings_key) for params in train_params]))
+
+        # Train all windows, then test the best config of each window.
+        _run_cached(strategy_cls, [(train_digest, key, params, train)
+                                   for train, _, train_digest, _, train_params, keys in plan
+                                   for params, key in zip(train_params, keys)],
+                    shared_ticks, cache, backtest_settings, processes, max_drawdown)
+        selected = []
+        for train, test, train_digest, test_digest, train_params, keys in plan:
+            results = cache.window(train_digest)
+            scores = [score(results[key], drawdown_penalty) for key in keys]
+            ranked = [i for i in range(len(keys)) if scores[i] is not None]
+            best = max(ranked, key=scores.__getitem__) if ranked else None
+            n_stopped = sum(1 for key in keys if results[key].get('stopped'))
+            test_params = None if best is None else _anchored(train_params[best], shared_ticks, test[0],
+                                                               anchor_open_price)
+            selected.append((train, test, train_digest, test_digest, best, keys, n_stopped, test_params))
+        test_tasks = [(test_digest, _config_key(test_params, settings_key), test_params, test)
+                      for _, test, _, test_digest, _, _, _, test_params in selected if test_params is not None]
+        _run_cached(strategy_cls, test_tasks, shared_ticks, cache, backtest_settings, processes, None)
+
+        report = []
+        for train, test, train_digest, test_digest, best, keys, n_stopped, test_params in selected:
+            report.append({
+                'train': list(train),
+                'test': list(test),
+                'params': test_params,
+                'train_result': None if best is None else cache.window(train_digest)[keys[best]],
+                'test_result': None if test_params is None else
+                cache.window(test_digest)[_config_key(test_params, settings_key)],
+                'n_configs': len(keys),
+                'n_stopped': n_stopped
+            })
+        return report
+    finally:
+        if shared_ticks is not ticks:
+            shared_ticks.close()
+
+
+def _anchored(strategy_params, ticks, start, anchor_open_price):
+    if not anchor_open_price or OPEN_PRICE not in strategy_params:
+        return strategy_params
+    return dict(strategy_params, **{OPEN_PRICE: next(iter(ticks.slice(start, start + 1)))[1]})
+
+
+def main():
+    import argparse
+    import sys
+    from backtest import read_csv_ticks
+    from swing_strategy import SwingStrategy
+
+    parser = argparse.ArgumentParser(description='Walk-forward optimization of SwingStrategy parameters.')
+    parser.add_argument('ticks', help='CSV tick file, or tick store directory.')
+    parser.add_argument('params', help='JSON file of base SwingStrategy parameters.')
+    parser.add_argument('grid', help='JSON file of parameter value lists. Nested parameters are "NAME.KEY".')
+    parser.add_argument('--symbol', required=True)
+    parser.add_argument('--tick-size', type=float, required=True)
+    parser.add_argument('--unit-size', type=float, required=True)
+    parser.add_argument('--principal', type=float, default=1000000.0)
+    parser.add_argument('--train-ticks', type=int, required=True)
+    parser.add_argument('--test-ticks', type=int, required=True)
+    parser.add_argument('--step', type=int, default=None, help='Ticks between two windows. --test-ticks if omitted.')
+    parser.add_argument('--max-drawdown', type=float, default=None, help='Stop backtests beyond this drawdown.')
+    parser.add_argument('--drawdown-penalty', type=float, default=0.0)
+    parser.add_argument('--no-anchor', action='store_true', help='Keep OPEN_PRICE instead of the window price.')
+    parser.add_argument('--cache-dir', default=None)
+    parser.add_argument('--strategy-version', default=None, help='Strategy code version in the result cache keys.')
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.params) as f:
+        base_params = json.load(f)
+    with open(args.grid) as f:
+        grid = {tuple(key.split('.')) if '.' in key else key: values for key, values in json.load(f).items()}
+    ticks = TickStore(args.ticks) if os.path.isdir(args.ticks) else read_csv_ticks(args.ticks)
+    report = walk_forward(SwingStrategy, base_params, grid, ticks, args.symbol, args.tick_size, args.unit_size,
+                          args.train_ticks, args.test_ticks, args.step, args.principal,
+                          max_drawdown=args.max_drawdown, drawdown_penalty=args.drawdown_penalty,
+                          anchor_open_price=not args.no_anchor, cache_dir=args.cache_dir,
+                          strategy_version=args.strategy_version, processes=args.processes)
+    for window in report:
+        json.dump(window, sys.stdout)
+        sys.stdout.write('\n')
+    test_pnl = sum(window['test_result']['pnl'] for window in report
+                   if window['test_result'] is not None and 'error' not in window['test_result'])
+    sys.stdout.write(json.dumps({'n_windows': len(report), 'test_pnl': test_pnl}) + '\n')
+
+
+if __name__ == '__main__':
+    main()